@@ -0,0 +1,338 @@
+import argparse
+import math
+import multiprocessing
+import os
+import shlex
+import subprocess
+import sys
+import time
+
+import bitbases
+import chessEngine
+import epd
+import pgn
+
+"""_Engine matches_
+
+To know if a change makes the engine stronger, we let two versions play each other:
+two UCI engines (e.g. `python uci.py` of two checkouts, or the same one with other
+options) play games at a fixed time control. Every opening of the suite is played twice
+with the colors swapped, so an unbalanced opening doesn't favor one of them.
+
+Games are independent, so they are played on a pool of processes: every worker starts
+its own two engine processes once and plays one game per task. Only one of the two
+thinks at a time, so a game needs about one core.
+
+A game ends by the rules of game_state (mate, stalemate, 50 moves, repetition, not enough
+material: get_game_end, the checks of checking_endgame), by the bitbases for 3 pieces
+(bitbases.adjudicate), after max_plies, or when an engine loses on time or plays an
+illegal move.
+"""
+
+"""_Elo and SPRT_
+
+A score s (points per game) means an Elo difference of 400 * log10(s / (1 - s)). The error
+bars come from the variance of the game results: 95% of the time the real score is
+within 1.96 standard deviations of the measured one.
+
+SPRT (sequential probability ratio test) decides between H0 "the Elo difference is elo0"
+and H1 "it is elo1" as early as the games allow. After every game we compute the log
+likelihood ratio (LLR) of the results under H1 and H0, with the normal approximation
+LLR = N * (s1 - s0) * (2 * s - s0 - s1) / (2 * variance). The match stops when the LLR
+goes under log(beta / (1 - alpha)) (H0, the change doesn't gain elo1) or over
+log((1 - beta) / alpha) (H1, it does). alpha and beta are the chances of a wrong answer.
+"""
+
+
+# Expected score of an Elo difference
+def elo_to_score(elo):
+    return 1 / (1 + 10 ** (-elo / 400))
+
+
+# Elo difference of a score (between 0 and 1, not included)
+def score_to_elo(score):
+    return 400 * math.log10(score / (1 - score))
+
+
+# Mean and variance of the score per game
+def score_stats(wins, draws, losses):
+    games = wins + draws + losses
+    score = (wins + draws / 2) / games
+    variance = (wins * (1 - score) ** 2 + draws * (0.5 - score) ** 2 + losses * score ** 2) / games
+    return score, variance
+
+
+# (Elo, 95% error margin) of the first engine, None if the results don't allow it yet
+def elo_estimate(wins, draws, losses):
+    games = wins + draws + losses
+    if games == 0 or wins + draws == 0 or losses + draws == 0:
+        return None
+    score, variance = score_stats(wins, draws, losses)
+    margin = 1.96 * math.sqrt(variance / games)
+    low = score_to_elo(max(score - margin, 1e-6))
+    high = score_to_elo(min(score + margin, 1 - 1e-6))
+    return score_to_elo(score), (high - low) / 2
+
+
+# (LLR, lower bound, upper bound) of the SPRT for elo0 against elo1
+def sprt(wins, draws, losses, elo0, elo1, alpha=0.05, beta=0.05):
+    lower = math.log(beta / (1 - alpha))
+    upper = math.log((1 - beta) / alpha)
+    games = wins + draws + losses
+    if games == 0:
+        return 0.0, lower, upper
+    score, variance = score_stats(wins, draws, losses)
+    if variance == 0:
+        return 0.0, lower, upper
+    score_0 = elo_to_score(elo0)
+    score_1 = elo_to_score(elo1)
+    llr = games * (score_1 - score_0) * (2 * score - score_0 - score_1) / (2 * variance)
+    return llr, lower, upper
+
+
+# A UCI engine in its own process
+class uci_process():
+    # command: the command line to start it, options: {name: value} for setoption
+    def __init__(self, command, options=None):
+        self.process = subprocess.Popen(shlex.split(command), stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+                                        universal_newlines=True, bufsize=1)
+        self.send("uci")
+        self.wait_for("uciok")
+        for name, value in (options or {}).items():
+            self.send("setoption name {} value {}".format(name, value))
+        self.new_game()
+
+    def send(self, line):
+        self.process.stdin.write(line + "\n")
+        self.process.stdin.flush()
+
+    # Read lines until one starts with the word, return it
+    def wait_for(self, word):
+        while True:
+            line = self.process.stdout.readline()
+            if line == "":
+                raise EOFError("engine process ended")
+            if line.split()[:1] == [word]:
+                return line.strip()
+
+    def new_game(self):
+        self.send("ucinewgame")
+        self.send("isready")
+        self.wait_for("readyok")
+
+    # Search the position ("fen moves ...", see game_state.get_position), returns (UCI move, seconds used)
+    def go(self, position, limits):
+        fen, _, moves = position.partition(" moves ")
+        self.send("position fen " + fen + (" moves " + moves if moves else ""))
+        start = time.perf_counter()
+        self.send("go " + " ".join("{} {}".format(name, value) for name, value in limits.items()))
+        line = self.wait_for("bestmove")
+        return line.split()[1] if len(line.split()) > 1 else "0000", time.perf_counter() - start
+
+    def close(self):
+        try:
+            self.send("quit")
+            self.process.wait(5)
+        except (OSError, subprocess.TimeoutExpired):
+            self.process.kill()
+
+
+# The two engines of this worker process and the match settings
+_engines = None
+_settings = None
+
+
+def init_worker(engine_configs, settings):
+    global _engines, _settings
+    _engines = [uci_process(command, options) for command, options in engine_configs]
+    _settings = settings
+
+
+def close_worker():
+    for engine in _engines:
+        engine.close()
+
+
+# Play one game. task = (game number, opening FEN, whether the first engine is white).
+# Returns a dict with the result for the first engine (1, 0.5 or 0) and how the game ended
+def play_game(task):
+    number, opening, first_is_white = task
+    settings = _settings
+    game_state = chessEngine.game_state(settings["backend"], opening)
+    players = {"w": _engines[0] if first_is_white else _engines[1], "b": _engines[1] if first_is_white else _engines[0]}
+    for engine in _engines:
+        engine.new_game()
+    clocks = {"w": settings["time"], "b": settings["time"]}
+
+    result = None
+    reason = None
+    plies = 0
+    while result is None:
+        turn = game_state.turn
+        game_end = game_state.get_game_end(game_state.get_valid_move())
+        if game_end is not None:
+            result, reason = game_end
+            break
+        if settings["adjudicate"]:
+            result = bitbases.adjudicate(game_state)
+            if result is not None:
+                reason = "bitbase"
+                break
+        if plies >= settings["max_plies"]:
+            result, reason = "1/2-1/2", "max plies"
+            break
+
+        if settings["movetime"]:
+            limits = {"movetime": settings["movetime"]}
+        else:
+            limits = {"wtime": max(int(clocks["w"]), 1), "btime": max(int(clocks["b"]), 1),
+                      "winc": settings["increment"], "binc": settings["increment"]}
+        notation, elapsed = players[turn].go(game_state.get_position(), limits)
+
+        loser = "0-1" if turn == "w" else "1-0"
+        if not settings["movetime"]:
+            clocks[turn] -= elapsed * 1000
+            if clocks[turn] < -settings["time_margin"]:
+                result, reason = loser, "time forfeit"
+                break
+            clocks[turn] = max(clocks[turn], 0) + settings["increment"]
+        move = game_state.get_uci_move(notation)
+        if move is None:
+            result, reason = loser, "illegal move " + notation
+            break
+        game_state.make_move(move)
+        plies += 1
+
+    points = {"1-0": 1.0, "0-1": 0.0, "1/2-1/2": 0.5}[result]
+    return {"number": number, "result": result, "reason": reason, "plies": plies,
+            "score": points if first_is_white else 1 - points, "first_is_white": first_is_white}
+
+
+# Opening positions (FENs) from an EPD / FEN file (one position per line) or the end positions of a PGN file
+def read_openings(path):
+    if path is None:
+        return [chessEngine.START_FEN]
+    if path.endswith(".pgn"):
+        openings = []
+        with open(path, encoding="utf-8", errors="replace") as file:
+            for tags, movetext in pgn.read_games(file):
+                game_state = chessEngine.game_state("bitboard", tags.get("FEN"))
+                for san in pgn.parse_movetext(movetext)[0]:
+                    move = game_state.get_san_move(san)
+                    if move is None:
+                        break
+                    game_state.make_move(move)
+                openings.append(game_state.get_fen())
+        return openings
+    return [epd.parse_epd(line)[0] for line in epd.read_epd_file(path)]
+
+
+# "name=value" strings to an options dict
+def parse_options(options):
+    parsed = {}
+    for option in options or []:
+        name, _, value = option.partition("=")
+        parsed[name.strip()] = value.strip()
+    return parsed
+
+
+# Time control "40+0.4" (seconds + increment) to (time, increment) in milliseconds
+def parse_time_control(time_control):
+    base, _, increment = time_control.partition("+")
+    return int(float(base) * 1000), int(float(increment or 0) * 1000)
+
+
+# Play the match, print every game and the running Elo / SPRT, returns (wins, draws, losses) of the first engine
+def run_match(engine_configs, openings, games, settings, processes, sprt_settings=None, names=("engine1", "engine2")):
+    # Every opening twice, with the colors swapped
+    tasks = ((number, openings[(number // 2) % len(openings)], number % 2 == 0) for number in range(games))
+    wins = draws = losses = 0
+    start = time.perf_counter()
+    if processes == 1:
+        init_worker(engine_configs, settings)
+        results = map(play_game, tasks)
+        pool = None
+    else:
+        pool = multiprocessing.Pool(processes, initializer=init_worker, initargs=(engine_configs, settings))
+        results = pool.imap_unordered(play_game, tasks)
+
+    try:
+        for game in results:
+            if game["score"] == 1:
+                wins += 1
+            elif game["score"] == 0:
+                losses += 1
+            else:
+                draws += 1
+            played = wins + draws + losses
+            white, black = names if game["first_is_white"] else names[::-1]
+            print("Game {:>4}: {} - {} {} ({}, {} plies)".format(
+                game["number"] + 1, white, black, game["result"], game["reason"], game["plies"]))
+
+            estimate = elo_estimate(wins, draws, losses)
+            line = "Score of {} vs {}: {} - {} - {} [{:.3f}] {}".format(
+                names[0], names[1], wins, losses, draws, (wins + draws / 2) / played, played)
+            if estimate is not None:
+                line += ", Elo {:+.1f} +/- {:.1f}".format(*estimate)
+            if sprt_settings is not None:
+                llr, lower, upper = sprt(wins, draws, losses, *sprt_settings)
+                line += ", LLR {:.2f} ({:.2f}, {:.2f})".format(llr, lower, upper)
+            print(line)
+            if sprt_settings is not None and (llr <= lower or llr >= upper):
+                print("SPRT: {} accepted".format("H1" if llr >= upper else "H0"))
+                break
+    finally:
+        if pool is None:
+            close_worker()
+        else:
+            # Stops the games still running, the engines quit when their input is closed
+            pool.terminate()
+            pool.join()
+
+    elapsed = time.perf_counter() - start
+    played = wins + draws + losses
+    print("{} games in {:.1f}s on {} processes: {:.0f} games/hour".format(
+        played, elapsed, processes, played * 3600 / max(elapsed, 1e-9)))
+    return wins, draws, losses
+
+
+def main():
+    default_engine = shlex.quote(sys.executable) + " " + shlex.quote(os.path.join(os.path.dirname(os.path.abspath(__file__)), "uci.py"))
+    parser = argparse.ArgumentParser(description="Play a match between two UCI engines, with Elo and SPRT")
+    parser.add_argument("--engine1", default=default_engine, help="command of the first engine (the one tested, default: this uci.py)")
+    parser.add_argument("--engine2", default=default_engine, help="command of the second engine (default: this uci.py)")
+    parser.add_argument("--name1", default="engine1")
+    parser.add_argument("--name2", default="engine2")
+    parser.add_argument("--option1", action="append", help="UCI option of the first engine, e.g. Hash=32 (repeatable)")
+    parser.add_argument("--option2", action="append", help="UCI option of the second engine (repeatable)")
+    parser.add_argument("--tc", default="10+0.1", help="time control in seconds + increment (default: 10+0.1)")
+    parser.add_argument("--movetime", type=int, help="fixed time per move in ms instead of a clock")
+    parser.add_argument("--games", type=int, default=100, help="most games to play (default: 100)")
+    parser.add_argument("--openings", help="EPD / FEN file (one position per line) or PGN file of openings")
+    parser.add_argument("--sprt", nargs=2, type=float, metavar=("ELO0", "ELO1"), help="stop early by SPRT for elo0 against elo1")
+    parser.add_argument("--alpha", type=float, default=0.05)
+    parser.add_argument("--beta", type=float, default=0.05)
+    parser.add_argument("--max-plies", type=int, default=400, help="draw after this many plies (default: 400)")
+    parser.add_argument("--no-adjudication", action="store_true", help="don't end 3-piece games by the bitbases")
+    parser.add_argument("--processes", type=int, default=os.cpu_count() or 1, help="games at the same time (default: all cores)")
+    args = parser.parse_args()
+
+    time_control, increment = parse_time_control(args.tc)
+    settings = {
+        "backend": "bitboard",
+        "time": time_control,
+        "increment": increment,
+        "movetime": args.movetime,
+        # Going this far over the clock is not a loss yet (the time to send the move through the pipes)
+        "time_margin": 100,
+        "max_plies": args.max_plies,
+        "adjudicate": not args.no_adjudication
+    }
+    engine_configs = [(args.engine1, parse_options(args.option1)), (args.engine2, parse_options(args.option2))]
+    sprt_settings = (args.sprt[0], args.sprt[1], args.alpha, args.beta) if args.sprt else None
+    run_match(engine_configs, read_openings(args.openings), args.games, settings, max(1, args.processes),
+              sprt_settings, (args.name1, args.name2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,167 @@
+import argparse
+import itertools
+import time
+
+import numpy as np
+
+import bitboard
+import evaluation
+
+"""_Batch evaluation_
+
+For scoring many positions at once (offline analysis) we don't go through game_state
+and evaluate() one by one. The boards are encoded into one NumPy array and the material
++ piece-square score of the whole batch is computed with a few vectorized operations.
+It gives the same scores as evaluation.evaluate() without the extra TERMS and the
+bitbases.
+
+Encodings:
+    codes   N x 64 int8, 0 = empty, 1..12 = piece index in bitboard.PIECES + 1
+    planes  N x 12 x 64 uint8, planes[n, piece, square] = 1 if the piece is on the square
+Squares are row * 8 + col like everywhere else (0 = a8).
+
+NumPy is only needed for this module, the engine itself doesn't use it.
+"""
+
+# Positions encoded and evaluated at once: the temporary arrays take about 2 KB per position
+DEFAULT_BATCH_SIZE = 65536
+
+# Piece code of every game_state piece and FEN letter
+PIECE_CODES = {piece: index + 1 for index, piece in enumerate(bitboard.PIECES)}
+PIECE_CODES["--"] = 0
+_FEN_CODES = np.zeros(256, dtype=np.int8)
+for _letter, _piece in {"P": "wp", "N": "wN", "B": "wB", "R": "wR", "Q": "wQ", "K": "wK",
+                        "p": "bp", "n": "bN", "b": "bB", "r": "bR", "q": "bQ", "k": "bK"}.items():
+    _FEN_CODES[ord(_letter)] = PIECE_CODES[_piece]
+_EXPAND_DIGITS = str.maketrans({str(n): "." * n for n in range(1, 9)})
+
+
+# Tables indexed [piece code, square], row 0 (empty) is all zeros
+def _code_table(tables):
+    table = np.zeros((13, 64), dtype=np.int32)
+    for piece, code in PIECE_CODES.items():
+        if piece != "--":
+            table[code] = tables[piece]
+    return table
+
+
+MG_TABLE = _code_table(evaluation.MG_TABLES)
+EG_TABLE = _code_table(evaluation.EG_TABLES)
+PHASE_TABLE = np.array([0] + [evaluation.PHASE_WEIGHTS[piece[1]] for piece in bitboard.PIECES], dtype=np.int32)
+SQUARES = np.arange(64)
+
+
+# FEN / EPD board field as 64 characters, one per square ("." = empty)
+def expand_fen(fen):
+    fields = fen.split(None, 2)
+    expanded = fields[0].replace("/", "").translate(_EXPAND_DIGITS)
+    if len(expanded) != 64:
+        raise ValueError("FEN board needs 64 squares: " + fields[0])
+    return expanded, 1 if len(fields) < 2 or fields[1] == "w" else -1
+
+
+# Encode a list of positions (game_states or FEN / EPD strings) into (codes N x 64 int8, sides N int8),
+# sides is 1 if white is to move and -1 if black
+def encode_positions(positions):
+    codes = np.zeros((len(positions), 64), dtype=np.int8)
+    sides = np.zeros(len(positions), dtype=np.int8)
+    fen_indexes = []
+    fen_boards = []
+    for index, position in enumerate(positions):
+        if isinstance(position, str):
+            expanded, sides[index] = expand_fen(position)
+            fen_indexes.append(index)
+            fen_boards.append(expanded)
+        else:
+            codes[index] = [PIECE_CODES[piece] for row in position.board for piece in row]
+            sides[index] = 1 if position.turn == "w" else -1
+    # All FEN boards are translated to codes at once
+    if fen_boards:
+        characters = np.frombuffer("".join(fen_boards).encode(), dtype=np.uint8).reshape(-1, 64)
+        codes[fen_indexes] = _FEN_CODES[characters]
+    return codes, sides
+
+
+# N x 64 codes to N x 12 x 64 planes
+def codes_to_planes(codes):
+    return (codes[:, None, :] == np.arange(1, 13, dtype=np.int8)[None, :, None]).astype(np.uint8)
+
+
+# N x 12 x 64 planes back to N x 64 codes
+def planes_to_codes(planes):
+    return (planes * np.arange(1, 13, dtype=np.int8)[None, :, None]).sum(axis=1, dtype=np.int8)
+
+
+# Tapered score of every position for the side to move, same formula as evaluation.evaluate
+def _taper(mg_scores, eg_scores, phases, sides):
+    phases = np.minimum(phases, evaluation.MAX_PHASE)
+    scores = mg_scores * phases + eg_scores * (evaluation.MAX_PHASE - phases)
+    return scores * sides // evaluation.MAX_PHASE
+
+
+# Scores of encoded positions (codes N x 64, sides N), returns an int32 array of N scores
+def evaluate_codes(codes, sides):
+    codes = codes.astype(np.intp)
+    mg_scores = MG_TABLE[codes, SQUARES].sum(axis=1)
+    eg_scores = EG_TABLE[codes, SQUARES].sum(axis=1)
+    phases = PHASE_TABLE[codes].sum(axis=1)
+    return _taper(mg_scores, eg_scores, phases, sides.astype(np.int32)).astype(np.int32)
+
+
+# Same with the planes encoding (N x 12 x 64)
+def evaluate_planes(planes, sides):
+    planes = planes.astype(np.int32)
+    mg_scores = np.einsum("npk,pk->n", planes, MG_TABLE[1:])
+    eg_scores = np.einsum("npk,pk->n", planes, EG_TABLE[1:])
+    phases = planes.sum(axis=2) @ PHASE_TABLE[1:]
+    return _taper(mg_scores, eg_scores, phases, sides.astype(np.int32)).astype(np.int32)
+
+
+# Yield (positions, scores) for every batch_size positions of an iterable of positions,
+# so only one batch is in memory at a time (positions can be a generator over a file)
+def iter_batches(positions, batch_size=DEFAULT_BATCH_SIZE):
+    positions = iter(positions)
+    while True:
+        batch = list(itertools.islice(positions, batch_size))
+        if not batch:
+            return
+        codes, sides = encode_positions(batch)
+        yield batch, evaluate_codes(codes, sides)
+
+
+# Score any number of positions (game_states or FEN strings), batch_size of them at a time
+def evaluate_batch(positions, batch_size=DEFAULT_BATCH_SIZE):
+    scores = [batch_scores for _, batch_scores in iter_batches(positions, batch_size)]
+    return np.concatenate(scores) if scores else np.zeros(0, dtype=np.int32)
+
+
+# Positions of a FEN / EPD file, read one line at a time (empty lines and # comments are skipped)
+def read_positions(file):
+    for line in file:
+        line = line.strip()
+        if line and not line.startswith("#"):
+            yield line
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Evaluate every FEN / EPD line of a file with the NumPy batch evaluator")
+    parser.add_argument("path", help="file with one FEN or EPD per line")
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE, help="positions per batch (default: 65536)")
+    parser.add_argument("--quiet", action="store_true", help="only print the totals")
+    args = parser.parse_args()
+
+    # The file is read one batch at a time, so the time includes reading it
+    count = 0
+    start = time.perf_counter()
+    with open(args.path) as file:
+        for positions, scores in iter_batches(read_positions(file), max(1, args.batch_size)):
+            count += len(positions)
+            if not args.quiet:
+                for position, score in zip(positions, scores):
+                    print("{:>6} {}".format(score, position))
+    elapsed = time.perf_counter() - start
+    print("{} positions in {:.2f}s ({:.0f} positions/s)".format(count, elapsed, count / max(elapsed, 1e-9)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,297 @@
+import argparse
+import mmap
+import os
+import time
+
+import chessEngine
+import bitboard
+
+"""_Endgame bitbases_
+
+For king + one piece against a lone king (KPK, KRK, KQK) we store one bit per position:
+1 if the side with the piece wins, 0 if it is a draw (the lone king can never win).
+Probing is only computing the index of the position and reading that bit from a
+memory-mapped file, so it is cheap enough to do at every evaluate() of the search.
+
+Index: the stronger side is always made white (if it is black, the board is flipped
+upside down and the colors swapped). Then the symmetries of the board store fewer
+positions: with a pawn, the pawn is put on files a-d (mirror left-right). Without a
+pawn, the white king is put in the a1-d1-d4 triangle (10 squares) by mirroring
+left-right, upside down and along the a1-h8 diagonal.
+
+    KPK:       ((side to move * 24 + pawn square) * 64 + white king) * 64 + black king
+    KRK, KQK:  ((side to move * 10 + white king) * 64 + black king) * 64 + piece square
+
+Side to move is 0 for white. Squares are row * 8 + col like in game_state (row 0 = rank 8),
+the pawn square counts from a7 (0) to d2 (23).
+
+The files (bitbases/KPK.bin, ...) are made by `python bitbases.py`. Bit i of the table is
+bit i & 7 of byte i >> 3.
+"""
+
+# Endgame name: FEN letter of the white piece
+ENDGAMES = {"KQK": "Q", "KRK": "R", "KPK": "P"}
+# Endgame of the game_state piece
+PIECE_ENDGAMES = {"Q": "KQK", "R": "KRK", "p": "KPK"}
+BITBASE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "bitbases")
+
+# Probe results for the side to move
+WIN, DRAW, LOSS = 1, 0, -1
+
+# The a1-d1-d4 triangle (col >= rank, both < 4) and the index of every square in it
+TRIANGLE = [(7 - rank) * 8 + col for rank in range(4) for col in range(rank, 4)]
+TRIANGLE_INDEX = {square: index for index, square in enumerate(TRIANGLE)}
+
+# Memory-mapped tables, opened at the first probe (None = no file)
+_tables = {}
+
+
+# Number of positions (bits) of the table of an endgame
+def table_size(endgame):
+    if endgame == "KPK":
+        return 2 * 24 * 64 * 64
+    return 2 * 10 * 64 * 64
+
+
+# Square mirrored along the a1-h8 diagonal: (rank, file) becomes (file, rank)
+def flip_diagonal(square):
+    return (7 - (square & 7)) * 8 + 7 - (square >> 3)
+
+
+# Index of a position of the endgame with the stronger side as white
+def position_index(endgame, white_to_move, white_king, black_king, piece):
+    side = 0 if white_to_move else 1
+    if endgame == "KPK":
+        if piece & 7 > 3:
+            white_king ^= 7
+            black_king ^= 7
+            piece ^= 7
+        return ((side * 24 + (piece >> 3) * 4 - 4 + (piece & 7)) * 64 + white_king) * 64 + black_king
+
+    if white_king & 7 > 3:
+        white_king ^= 7
+        black_king ^= 7
+        piece ^= 7
+    if white_king >> 3 < 4:
+        white_king ^= 56
+        black_king ^= 56
+        piece ^= 56
+    if white_king not in TRIANGLE_INDEX:
+        white_king = flip_diagonal(white_king)
+        black_king = flip_diagonal(black_king)
+        piece = flip_diagonal(piece)
+    return ((side * 10 + TRIANGLE_INDEX[white_king]) * 64 + black_king) * 64 + piece
+
+
+"""_Retrograde analysis_
+
+1. Every position of the table is set up in a game_state and the engine's own move
+   generator gives its moves. A move leads to another position of the table (we keep
+   its index), to the capture of the piece (draw), or to a promotion, which is looked
+   up in the KQK / KRK table (so these are built first; knight and bishop promotions
+   are draws).
+2. Positions with the two kings touching, or white to move with the black king in
+   check, can't happen and stay 0. A position without moves is won if the lone king
+   is mated, else a draw.
+3. Then we go over the undecided positions until nothing changes: white (the stronger
+   side) to move wins if one move leads to a won position, black to move loses if
+   every move does. Whatever is not won at the end is a draw.
+"""
+
+# Successors that are not positions of the table
+SUCCESSOR_WIN = -1
+SUCCESSOR_DRAW = -2
+
+
+# FEN of a position of the endgame
+def position_fen(endgame, white_to_move, white_king, black_king, piece):
+    cells = ["1"] * 64
+    cells[white_king] = "K"
+    cells[black_king] = "k"
+    cells[piece] = ENDGAMES[endgame]
+    board = "/".join("".join(cells[row * 8:row * 8 + 8]) for row in range(8))
+    return board + (" w" if white_to_move else " b") + " - - 0 1"
+
+
+# Every stored position: (index, white_to_move, white king, black king, piece)
+def table_positions(endgame):
+    if endgame == "KPK":
+        white_king_squares = range(64)
+        piece_squares = [row * 8 + col for row in range(1, 7) for col in range(4)]
+    else:
+        white_king_squares = TRIANGLE
+        piece_squares = range(64)
+    for white_to_move in (True, False):
+        for white_king in white_king_squares:
+            for black_king in range(64):
+                if bitboard.KING_ATTACKS[white_king] & bitboard.bit(black_king) or white_king == black_king:
+                    continue
+                for piece in piece_squares:
+                    if piece != white_king and piece != black_king:
+                        yield position_index(endgame, white_to_move, white_king, black_king, piece), \
+                            white_to_move, white_king, black_king, piece
+
+
+# Square (row * 8 + col) of the piece that is not a king, and its type, for one color
+def find_piece(game_state, color):
+    for row, col in game_state.piece_squares[color]:
+        piece = game_state.board[row][col]
+        if piece[1] != "K":
+            return row * 8 + col, piece[1]
+    return None, None
+
+
+# Build the table of an endgame as one byte (0 or 1) per position.
+# tables holds the tables already built, promotions are looked up in them
+def generate(endgame, tables, verbose=False):
+    start = time.perf_counter()
+    game_state = chessEngine.game_state("bitboard")
+    won = bytearray(table_size(endgame))
+    undecided = []
+
+    for index, white_to_move, white_king, black_king, piece in table_positions(endgame):
+        game_state.load_fen(position_fen(endgame, white_to_move, white_king, black_king, piece))
+        if white_to_move:
+            occupied = bitboard.bit(white_king) | bitboard.bit(black_king) | bitboard.bit(piece)
+            if bitboard.attackers_to(game_state.bitboards, black_king, occupied, bitboard.WHITE):
+                continue
+
+        moves = game_state.get_valid_move()
+        if len(moves) == 0:
+            won[index] = 1 if game_state.in_check else 0
+            continue
+
+        successors = []
+        for move in moves:
+            game_state.make_move(move)
+            square, piece_type = find_piece(game_state, "w")
+            successor_endgame = PIECE_ENDGAMES.get(piece_type)
+            # The piece was taken, or promoted to a knight or bishop
+            if successor_endgame is None:
+                successors.append(SUCCESSOR_DRAW)
+            else:
+                successor = position_index(successor_endgame, game_state.turn == "w",
+                                           game_state.white_king_location[0] * 8 + game_state.white_king_location[1],
+                                           game_state.black_king_location[0] * 8 + game_state.black_king_location[1],
+                                           square)
+                if successor_endgame != endgame:
+                    successors.append(SUCCESSOR_WIN if tables[successor_endgame][successor] else SUCCESSOR_DRAW)
+                else:
+                    successors.append(successor)
+            game_state.unmake_move()
+        undecided.append((index, white_to_move, successors))
+    if verbose:
+        print("{}: {} positions set up in {:.1f}s".format(endgame, len(undecided), time.perf_counter() - start))
+
+    iterations = 0
+    changed = True
+    while changed:
+        changed = False
+        iterations += 1
+        remaining = []
+        for entry in undecided:
+            index, white_to_move, successors = entry
+            if white_to_move:
+                result = any(successor == SUCCESSOR_WIN or (successor >= 0 and won[successor]) for successor in successors)
+            else:
+                result = all(successor == SUCCESSOR_WIN or (successor >= 0 and won[successor]) for successor in successors)
+            if result:
+                won[index] = 1
+                changed = True
+            else:
+                remaining.append(entry)
+        undecided = remaining
+    if verbose:
+        print("{}: {} won positions after {} iterations, {:.1f}s".format(
+            endgame, sum(won), iterations, time.perf_counter() - start))
+    return won
+
+
+# One byte per position to one bit per position
+def pack_bits(values):
+    packed = bytearray((len(values) + 7) // 8)
+    for index, value in enumerate(values):
+        if value:
+            packed[index >> 3] |= 1 << (index & 7)
+    return packed
+
+
+# Build every table and write it to directory/<endgame>.bin
+def generate_all(directory=BITBASE_DIR, verbose=False):
+    os.makedirs(directory, exist_ok=True)
+    tables = {}
+    for endgame in ENDGAMES:
+        tables[endgame] = generate(endgame, tables, verbose)
+        with open(os.path.join(directory, endgame + ".bin"), "wb") as file:
+            file.write(pack_bits(tables[endgame]))
+    close()
+
+
+# The memory-mapped table of an endgame, None if its file is missing or has the wrong size
+def get_table(endgame):
+    if endgame not in _tables:
+        table = None
+        path = os.path.join(BITBASE_DIR, endgame + ".bin")
+        if os.path.isfile(path) and os.path.getsize(path) == table_size(endgame) // 8:
+            with open(path, "rb") as file:
+                table = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        _tables[endgame] = table
+    return _tables[endgame]
+
+
+# Unmap every table (they are opened again at the next probe)
+def close():
+    for table in _tables.values():
+        if table is not None:
+            table.close()
+    _tables.clear()
+
+
+# WIN, DRAW or LOSS for the side to move, None if the position is not in a bitbase
+def probe(game_state):
+    if game_state.piece_count != 3:
+        return None
+    color = "w"
+    square, piece_type = find_piece(game_state, color)
+    if square is None:
+        color = "b"
+        square, piece_type = find_piece(game_state, color)
+    endgame = PIECE_ENDGAMES.get(piece_type)
+    if endgame is None:
+        return None
+    table = get_table(endgame)
+    if table is None:
+        return None
+
+    white_king = game_state.white_king_location[0] * 8 + game_state.white_king_location[1]
+    black_king = game_state.black_king_location[0] * 8 + game_state.black_king_location[1]
+    if color == "w":
+        index = position_index(endgame, game_state.turn == "w", white_king, black_king, square)
+    else:
+        # Black has the piece: flip the board upside down so it is white's
+        index = position_index(endgame, game_state.turn == "b", black_king ^ 56, white_king ^ 56, square ^ 56)
+    if not table[index >> 3] >> (index & 7) & 1:
+        return DRAW
+    return WIN if game_state.turn == color else LOSS
+
+
+# Game result from the bitbases: "1-0", "0-1", "1/2-1/2", or None if the position is not in one
+def adjudicate(game_state):
+    result = probe(game_state)
+    if result is None:
+        return None
+    if result == DRAW:
+        return "1/2-1/2"
+    white_wins = (result == WIN) == (game_state.turn == "w")
+    return "1-0" if white_wins else "0-1"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate the KQK, KRK and KPK bitbases by retrograde analysis")
+    parser.add_argument("--directory", default=BITBASE_DIR, help="where to write the .bin files (default: bitbases/)")
+    args = parser.parse_args()
+    generate_all(args.directory, verbose=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,501 @@
+# Bitboard move generation backend for game_state
+#
+# Squares are numbered like the game_state.board list: square = row * 8 + col,
+# so bit 0 is a8 and bit 63 is h1. Every piece type of every color has its own
+# 64-bit integer where a set bit means that piece stands on that square.
+#
+# chessEngine imports this module, so Move is imported from it inside get_move
+# (when it runs chessEngine is fully loaded)
+
+# Piece order used for the bitboard list: white pieces first, then black pieces
+PIECES = ["wp", "wN", "wB", "wR", "wQ", "wK", "bp", "bN", "bB", "bR", "bQ", "bK"]
+PIECE_INDEX = {piece: index for index, piece in enumerate(PIECES)}
+
+PAWN, KNIGHT, BISHOP, ROOK, QUEEN, KING = range(6)
+WHITE, BLACK = 0, 6
+
+# Which moves generate_legal_moves returns: all of them, only captures and promotions
+# (noisy), or only the other ones (quiet)
+ALL_MOVES, NOISY_MOVES, QUIET_MOVES = range(3)
+
+ALL_SQUARES = (1 << 64) - 1
+
+# Pieces a pawn can promote to, in the order of Move.promotion_pieces
+PROMOTION_PIECES = ("Q", "R", "B", "N")
+
+# (row, col) tuple of every square, so we don't have to divide all the time
+SQUARE_TO_COORD = [(square >> 3, square & 7) for square in range(64)]
+
+
+def bit(square):
+    return 1 << square
+
+
+# Index of the lowest set bit
+def lsb(bitboard):
+    return (bitboard & -bitboard).bit_length() - 1
+
+
+# Index of the highest set bit
+def msb(bitboard):
+    return bitboard.bit_length() - 1
+
+
+# Yield the index of every set bit
+def squares_of(bitboard):
+    while bitboard:
+        lowest = bitboard & -bitboard
+        yield lowest.bit_length() - 1
+        bitboard ^= lowest
+
+
+def count_bits(bitboard):
+    return bin(bitboard).count("1")
+
+
+"""_Precomputed attack tables_
+
+Knight, king and pawn attacks only depend on the square, so we compute them once.
+For sliding pieces we store the full ray of every direction from every square.
+To get the real attack of a ray we look for the first blocker on it: for rays
+going to higher squares it is the lowest set bit, for rays going to lower squares
+it is the highest set bit. Then we cut everything behind the blocker away by
+XOR-ing with the ray that starts at the blocker.
+"""
+
+
+def _inside(row, col):
+    return 0 <= row < 8 and 0 <= col < 8
+
+
+def _leaper_table(directions):
+    table = []
+    for square in range(64):
+        row, col = SQUARE_TO_COORD[square]
+        attacks = 0
+        for d in directions:
+            end_row = row + d[0]
+            end_col = col + d[1]
+            if _inside(end_row, end_col):
+                attacks |= bit(end_row * 8 + end_col)
+        table.append(attacks)
+    return table
+
+
+def _ray_table(d):
+    table = []
+    for square in range(64):
+        row, col = SQUARE_TO_COORD[square]
+        ray = 0
+        for i in range(1, 8):
+            end_row = row + d[0] * i
+            end_col = col + d[1] * i
+            if not _inside(end_row, end_col):
+                break
+            ray |= bit(end_row * 8 + end_col)
+        table.append(ray)
+    return table
+
+
+KNIGHT_ATTACKS = _leaper_table(((-2, -1), (-2, 1), (-1, -2), (-1, 2), (2, 1), (2, -1), (1, 2), (1, -2)))
+KING_ATTACKS = _leaper_table(((0, -1), (0, 1), (-1, 0), (1, 0), (1, 1), (1, -1), (-1, 1), (-1, -1)))
+
+# PAWN_ATTACKS[0] is for white pawns (moving up the board), PAWN_ATTACKS[1] for black pawns
+PAWN_ATTACKS = [_leaper_table(((-1, -1), (-1, 1))), _leaper_table(((1, -1), (1, 1)))]
+
+# Rays going to higher square indexes
+RAY_SOUTH = _ray_table((1, 0))
+RAY_EAST = _ray_table((0, 1))
+RAY_SOUTH_EAST = _ray_table((1, 1))
+RAY_SOUTH_WEST = _ray_table((1, -1))
+
+# Rays going to lower square indexes
+RAY_NORTH = _ray_table((-1, 0))
+RAY_WEST = _ray_table((0, -1))
+RAY_NORTH_EAST = _ray_table((-1, 1))
+RAY_NORTH_WEST = _ray_table((-1, -1))
+
+ROOK_RAYS = [RAY_SOUTH[s] | RAY_EAST[s] | RAY_NORTH[s] | RAY_WEST[s] for s in range(64)]
+BISHOP_RAYS = [RAY_SOUTH_EAST[s] | RAY_SOUTH_WEST[s] | RAY_NORTH_EAST[s] | RAY_NORTH_WEST[s] for s in range(64)]
+
+
+# Squares strictly between two squares on the same line (0 if they don't share a line)
+def _between_table():
+    table = [[0] * 64 for _ in range(64)]
+    for rays in (RAY_SOUTH, RAY_EAST, RAY_SOUTH_EAST, RAY_SOUTH_WEST,
+                 RAY_NORTH, RAY_WEST, RAY_NORTH_EAST, RAY_NORTH_WEST):
+        for start in range(64):
+            for end in squares_of(rays[start]):
+                table[start][end] = rays[start] & ~rays[end] & ~bit(end)
+    return table
+
+
+BETWEEN = _between_table()
+
+
+def _positive_ray(rays, square, occupied):
+    ray = rays[square]
+    blockers = ray & occupied
+    if blockers:
+        return ray ^ rays[(blockers & -blockers).bit_length() - 1]
+    return ray
+
+
+def _negative_ray(rays, square, occupied):
+    ray = rays[square]
+    blockers = ray & occupied
+    if blockers:
+        return ray ^ rays[blockers.bit_length() - 1]
+    return ray
+
+
+def rook_attacks(square, occupied):
+    return _positive_ray(RAY_SOUTH, square, occupied) | _positive_ray(RAY_EAST, square, occupied) | \
+           _negative_ray(RAY_NORTH, square, occupied) | _negative_ray(RAY_WEST, square, occupied)
+
+
+def bishop_attacks(square, occupied):
+    return _positive_ray(RAY_SOUTH_EAST, square, occupied) | _positive_ray(RAY_SOUTH_WEST, square, occupied) | \
+           _negative_ray(RAY_NORTH_EAST, square, occupied) | _negative_ray(RAY_NORTH_WEST, square, occupied)
+
+
+def queen_attacks(square, occupied):
+    return rook_attacks(square, occupied) | bishop_attacks(square, occupied)
+
+
+# Build the 12 bitboards from the 8x8 board of game_state
+def board_to_bitboards(board):
+    bitboards = [0] * 12
+    for row in range(8):
+        for col in range(8):
+            piece = board[row][col]
+            if piece != "--":
+                bitboards[PIECE_INDEX[piece]] |= bit(row * 8 + col)
+    return bitboards
+
+
+def occupancy(bitboards, side):
+    return bitboards[side] | bitboards[side + 1] | bitboards[side + 2] | \
+           bitboards[side + 3] | bitboards[side + 4] | bitboards[side + 5]
+
+
+# Every piece of the given side (WHITE or BLACK) attacking the square
+def attackers_to(bitboards, square, occupied, side):
+    pawn_table = PAWN_ATTACKS[1] if side == WHITE else PAWN_ATTACKS[0]
+    rook_like = bitboards[side + ROOK] | bitboards[side + QUEEN]
+    bishop_like = bitboards[side + BISHOP] | bitboards[side + QUEEN]
+    attackers = pawn_table[square] & bitboards[side + PAWN]
+    attackers |= KNIGHT_ATTACKS[square] & bitboards[side + KNIGHT]
+    attackers |= KING_ATTACKS[square] & bitboards[side + KING]
+    if ROOK_RAYS[square] & rook_like:
+        attackers |= rook_attacks(square, occupied) & rook_like
+    if BISHOP_RAYS[square] & bishop_like:
+        attackers |= bishop_attacks(square, occupied) & bishop_like
+    return attackers
+
+
+# Every square attacked by the given side
+def attacked_squares(bitboards, occupied, side):
+    attacks = 0
+    pawns = bitboards[side + PAWN]
+    pawn_table = PAWN_ATTACKS[0] if side == WHITE else PAWN_ATTACKS[1]
+    for square in squares_of(pawns):
+        attacks |= pawn_table[square]
+    for square in squares_of(bitboards[side + KNIGHT]):
+        attacks |= KNIGHT_ATTACKS[square]
+    for square in squares_of(bitboards[side + BISHOP] | bitboards[side + QUEEN]):
+        attacks |= bishop_attacks(square, occupied)
+    for square in squares_of(bitboards[side + ROOK] | bitboards[side + QUEEN]):
+        attacks |= rook_attacks(square, occupied)
+    for square in squares_of(bitboards[side + KING]):
+        attacks |= KING_ATTACKS[square]
+    return attacks
+
+
+# Piece values for the static exchange evaluation, by piece type
+SEE_VALUES = [100, 320, 330, 500, 900, 20000]
+
+
+# Type (PAWN ... KING) of the piece of the side on the square, None if there is none
+def piece_type_on(bitboards, square, side):
+    square_bit = bit(square)
+    for piece_type in range(6):
+        if bitboards[side + piece_type] & square_bit:
+            return piece_type
+    return None
+
+
+"""_Static exchange evaluation (SEE)_
+
+What a capture wins or loses if both sides keep capturing on the target square, always
+with their least valuable attacker, and each side may stop when going on would lose
+material. We remove every piece from the occupancy once it has captured, so the
+sliders behind it (x-rays) join in. gains[i] is what the side that captures at step i
+has won if the exchange stops there. Going backward, every side takes the better of
+capturing or stopping, and gains[0] is the value of the whole exchange.
+"""
+
+
+def static_exchange(bitboards, start, target, side):
+    other = BLACK if side == WHITE else WHITE
+    occupied = occupancy(bitboards, WHITE) | occupancy(bitboards, BLACK)
+    captured = piece_type_on(bitboards, target, other)
+    gains = [SEE_VALUES[captured] if captured is not None else 0]
+    attacker_value = SEE_VALUES[piece_type_on(bitboards, start, side)]
+    occupied ^= bit(start)
+    side, other = other, side
+
+    while True:
+        attackers = attackers_to(bitboards, target, occupied, side) & occupied
+        if not attackers:
+            break
+        for piece_type in range(6):
+            candidates = attackers & bitboards[side + piece_type]
+            if candidates:
+                break
+        # The king may only capture when the square is not defended any more
+        if piece_type == KING and attackers_to(bitboards, target, occupied, other) & occupied:
+            break
+        gains.append(attacker_value - gains[-1])
+        attacker_value = SEE_VALUES[piece_type]
+        occupied ^= candidates & -candidates
+        side, other = other, side
+
+    while len(gains) > 1:
+        gain = gains.pop()
+        gains[-1] = -max(-gains[-1], gain)
+    return gains[0]
+
+
+"""_How the legal move generator works_
+
+1. Find every opponent piece giving check (checkers). With two checkers only the
+   king can move. With one checker the other pieces must capture it or block the ray,
+   which gives us a mask of target squares.
+2. Find pinned pieces: an opponent slider on the same line as our king with exactly
+   one of our pieces in between. A pinned piece can only move along that line.
+3. The king can go to a square the opponent doesn't attack. Only the few squares the
+   king could go to are tested (attackers_to), without our king on the board, so the
+   king cannot step back along a checking ray.
+4. En passant is rare and tricky (two pieces leave the same rank), so we simply
+   test the position after it.
+
+kind and origins only filter what is added (the search generates captures first and
+quiet moves only when it needs them, the GUI the moves of one piece): the checks and
+pins are computed the same way every time.
+
+Building a Move reads the board and works out its flags and id, which took about as
+long as finding the move. A Move only depends on its squares, the piece moved, the
+piece on the end square and the promotion piece, and nothing changes a Move once it is
+built, so the generator keeps every Move it built in MOVE_CACHE and gives back the same
+object when the move comes again. The set bits of the target bitboards are walked
+inline, a generator per bitboard costs more than the loop body.
+"""
+
+# Every Move built by the generator, keyed by (start square, end square, piece moved,
+# piece on the end square, promotion piece)
+MOVE_CACHE = {}
+
+
+# The Move from start to end on the board (squares are row * 8 + col), from MOVE_CACHE
+def get_move(start, end, board, promotion="Q"):
+    key = (start, end, board[start >> 3][start & 7], board[end >> 3][end & 7], promotion)
+    move = MOVE_CACHE.get(key)
+    if move is None:
+        from chessEngine import Move
+        move = MOVE_CACHE[key] = Move(SQUARE_TO_COORD[start], SQUARE_TO_COORD[end], board, promotion)
+    return move
+
+
+# Get every legal move of the side to move in game_state
+# kind: ALL_MOVES, NOISY_MOVES or QUIET_MOVES, origins: only moves of the pieces on these squares
+def generate_legal_moves(state, kind=ALL_MOVES, origins=ALL_SQUARES):
+    board = state.board
+    bitboards = state.bitboards
+    if state.turn == "w":
+        us, them = WHITE, BLACK
+        forward = -8
+        double_push_row, promotion_row = 6, 0
+    else:
+        us, them = BLACK, WHITE
+        forward = 8
+        double_push_row, promotion_row = 1, 7
+
+    own = bitboards[us] | bitboards[us + 1] | bitboards[us + 2] | bitboards[us + 3] | bitboards[us + 4] | bitboards[us + 5]
+    enemy = bitboards[them] | bitboards[them + 1] | bitboards[them + 2] | \
+        bitboards[them + 3] | bitboards[them + 4] | bitboards[them + 5]
+    occupied = own | enemy
+    king_bb = bitboards[us + KING]
+    king_square = (king_bb & -king_bb).bit_length() - 1
+    moves = []
+
+    checkers = attackers_to(bitboards, king_square, occupied, them)
+    state.in_check = checkers != 0
+
+    # Target squares of the kind of moves we want (pawns are handled on their own)
+    if kind == NOISY_MOVES:
+        kind_mask = enemy
+    elif kind == QUIET_MOVES:
+        kind_mask = ~occupied
+    else:
+        kind_mask = ALL_SQUARES
+
+    # King moves, to the squares the opponent doesn't attack once our king is gone
+    if king_bb & origins:
+        without_king = occupied ^ king_bb
+        targets = KING_ATTACKS[king_square] & ~own & kind_mask
+        while targets:
+            low = targets & -targets
+            targets ^= low
+            target = low.bit_length() - 1
+            if not attackers_to(bitboards, target, without_king, them):
+                moves.append(get_move(king_square, target, board))
+
+    # Double check: only the king can move
+    if checkers & (checkers - 1):
+        return moves
+
+    if checkers:
+        target_mask = BETWEEN[king_square][(checkers & -checkers).bit_length() - 1] | checkers
+    else:
+        target_mask = ALL_SQUARES
+        if kind != NOISY_MOVES and king_bb & origins:
+            generate_castling_moves(state, us, them, occupied, king_square, moves)
+
+    # Pinned pieces and the line each one may still move on
+    pinned = 0
+    pin_lines = {}
+    rook_like = bitboards[them + ROOK] | bitboards[them + QUEEN]
+    bishop_like = bitboards[them + BISHOP] | bitboards[them + QUEEN]
+    snipers = (ROOK_RAYS[king_square] & rook_like) | (BISHOP_RAYS[king_square] & bishop_like)
+    while snipers:
+        low = snipers & -snipers
+        snipers ^= low
+        sniper = low.bit_length() - 1
+        between = BETWEEN[king_square][sniper] & occupied
+        if between and not (between & (between - 1)) and between & own:
+            pinned |= between
+            pin_lines[between.bit_length() - 1] = BETWEEN[king_square][sniper] | low
+
+    allowed = ~own & kind_mask & target_mask
+    cache = MOVE_CACHE
+
+    # Knights (a pinned knight can never move), bishops, rooks and queens
+    for piece_type in (KNIGHT, BISHOP, ROOK, QUEEN):
+        piece = PIECES[us + piece_type]
+        pieces = bitboards[us + piece_type] & origins
+        if piece_type == KNIGHT:
+            pieces &= ~pinned
+        while pieces:
+            low = pieces & -pieces
+            pieces ^= low
+            square = low.bit_length() - 1
+            if piece_type == KNIGHT:
+                targets = KNIGHT_ATTACKS[square] & allowed
+            elif piece_type == BISHOP:
+                targets = bishop_attacks(square, occupied) & allowed
+            elif piece_type == ROOK:
+                targets = rook_attacks(square, occupied) & allowed
+            else:
+                targets = queen_attacks(square, occupied) & allowed
+            if pinned & low:
+                targets &= pin_lines[square]
+            while targets:
+                target_bit = targets & -targets
+                targets ^= target_bit
+                target = target_bit.bit_length() - 1
+                move = cache.get((square, target, piece, board[target >> 3][target & 7], "Q"))
+                if move is None:
+                    move = get_move(square, target, board)
+                moves.append(move)
+
+    # Pawns
+    pawn_table = PAWN_ATTACKS[0] if us == WHITE else PAWN_ATTACKS[1]
+    if state.en_passant[0]:
+        en_passant_square = state.en_passant[1][0] * 8 + state.en_passant[1][1]
+    else:
+        en_passant_square = -1
+    pawns = bitboards[us + PAWN] & origins
+    while pawns:
+        low = pawns & -pawns
+        pawns ^= low
+        square = low.bit_length() - 1
+        pawn_allowed = target_mask
+        if pinned & low:
+            pawn_allowed &= pin_lines[square]
+        promotion = (square >> 3) + forward // 8 == promotion_row
+        push = square + forward
+        # A push is noisy only when it promotes, captures are always noisy
+        if not occupied >> push & 1 and kind != (QUIET_MOVES if promotion else NOISY_MOVES):
+            if pawn_allowed >> push & 1:
+                add_pawn_move(square, push, board, promotion, moves)
+            double_push = push + forward
+            if square >> 3 == double_push_row and not occupied >> double_push & 1 and pawn_allowed >> double_push & 1:
+                moves.append(get_move(square, double_push, board))
+        if kind == QUIET_MOVES:
+            continue
+        targets = pawn_table[square] & enemy & pawn_allowed
+        while targets:
+            target_bit = targets & -targets
+            targets ^= target_bit
+            add_pawn_move(square, target_bit.bit_length() - 1, board, promotion, moves)
+        if en_passant_square >= 0 and pawn_table[square] >> en_passant_square & 1:
+            if is_legal_en_passant(bitboards, us, them, square, en_passant_square, en_passant_square - forward, occupied):
+                moves.append(get_move(square, en_passant_square, board))
+
+    return moves
+
+
+# Add a pawn move, or one move for every promotion piece when the pawn reaches the last row
+def add_pawn_move(start, end, board, promotion, moves):
+    if promotion:
+        for piece in PROMOTION_PIECES:
+            moves.append(get_move(start, end, board, piece))
+    else:
+        moves.append(get_move(start, end, board))
+
+
+# Test en passant on the position after the capture
+def is_legal_en_passant(bitboards, us, them, start, target, captured, occupied):
+    occupied_after = occupied ^ bit(start) ^ bit(target) ^ bit(captured)
+    king_square = lsb(bitboards[us + KING])
+    rook_like = bitboards[them + ROOK] | bitboards[them + QUEEN]
+    bishop_like = bitboards[them + BISHOP] | bitboards[them + QUEEN]
+    if rook_attacks(king_square, occupied_after) & rook_like:
+        return False
+    if bishop_attacks(king_square, occupied_after) & bishop_like:
+        return False
+    # The captured pawn may be the one giving check, any other checker stays
+    other_checkers = KNIGHT_ATTACKS[king_square] & bitboards[them + KNIGHT]
+    pawn_table = PAWN_ATTACKS[0] if us == WHITE else PAWN_ATTACKS[1]
+    other_checkers |= pawn_table[king_square] & bitboards[them + PAWN] & ~bit(captured)
+    return other_checkers == 0
+
+
+# Castling (only called when the king is not in check)
+def generate_castling_moves(state, us, them, occupied, king_square, moves):
+    if us == WHITE:
+        if state.white_king_moved:
+            return
+        row = 7
+        king_side = not state.white_king_rook_moved
+        queen_side = not state.white_queen_rook_moved
+    else:
+        if state.black_king_moved:
+            return
+        row = 0
+        king_side = not state.black_king_rook_moved
+        queen_side = not state.black_queen_rook_moved
+    if king_square != row * 8 + 4:
+        return
+    bitboards = state.bitboards
+    rook = bitboards[us + ROOK]
+    board = state.board
+    base = row * 8
+    # The king may not cross or land on an attacked square
+    if king_side and rook & bit(base + 7) and not occupied & (bit(base + 5) | bit(base + 6)):
+        if not attackers_to(bitboards, base + 5, occupied, them) and not attackers_to(bitboards, base + 6, occupied, them):
+            moves.append(get_move(king_square, base + 6, board))
+    if queen_side and rook & bit(base) and not occupied & (bit(base + 1) | bit(base + 2) | bit(base + 3)):
+        if not attackers_to(bitboards, base + 3, occupied, them) and not attackers_to(bitboards, base + 2, occupied, them):
+            moves.append(get_move(king_square, base + 2, board))
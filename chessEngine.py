@@ -1,7 +1,21 @@
-import pygame
+import bitboard
+import evaluation
+import zobrist
+
+# Move generation backends that game_state can be built with
+BACKENDS = ("board", "bitboard")
+
+# FEN of the starting position
+START_FEN = "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1"
+
+# FEN letter of every piece and back
+FEN_PIECES = {"p": "bp", "n": "bN", "b": "bB", "r": "bR", "q": "bQ", "k": "bK",
+              "P": "wp", "N": "wN", "B": "wB", "R": "wR", "Q": "wQ", "K": "wK"}
+PIECE_TO_FEN = {value: key for key, value in FEN_PIECES.items()}
 
 class game_state():
-    def __init__(self):
+    # fen: start from this position instead of the initial one
+    def __init__(self, backend="board", fen=None):
         # Game board
         self.board = [
             ["bR", "bN", "bB", "bQ", "bK", "bB", "bN", "bR"],
@@ -14,17 +28,8 @@ class game_state():
             ["wR", "wN", "wB", "wQ", "wK", "wB", "wN", "wR"]
         ]
         
-        # This board is for testing
-        # self.board = [
-        #     ["--", "--", "--", "--", "--", "--", "--", "--"],
-        #     ["--", "--", "bp", "--", "--", "--", "--", "--"],
-        #     ["--", "--", "--", "--", "--", "--", "--", "--"],
-        #     ["wK", "wp", "--", "--", "--", "--", "--", "bR"],
-        #     ["wR", "--", "--", "--", "bp", "--", "bp", "bK"],
-        #     ["--", "--", "--", "--", "--", "--", "--", "--"],
-        #     ["--", "--", "--", "--", "--", "wp", "--", "--"],
-        #     ["--", "--", "--", "--", "--", "--", "--", "--"]
-        # ]
+        # For testing another position, pass its FEN, e.g.
+        # game_state(fen="8/2p5/8/KP5r/R3p1pk/8/5P2/8 w - - 0 1")
         
         # Function list for getting possible move from any piece type
         self.get_move = {
@@ -36,12 +41,21 @@ class game_state():
             "N": self.knight_move
         }
         
+        # Move generation backend: "board" scans self.board, "bitboard" uses 64-bit integers
+        if backend not in BACKENDS:
+            raise ValueError("Unknown move generation backend: " + str(backend))
+        self.backend = backend
+        self.bitboards = bitboard.board_to_bitboards(self.board) if backend == "bitboard" else []
+        
         # Store the current turn: w = white, b = black
         self.turn = "w"
         
         # Store the move log (for many purposes like castling, en passant...)
         self.move_log = []
         
+        # Undo records of make_move, one for each move in the move log
+        self.undo_log = []
+        
         # Store the current king location for checkmate, pin checking
         self.white_king_location = (7, 4)
         self.black_king_location = (0, 4)
@@ -50,13 +64,11 @@ class game_state():
         self.in_check = False
         self.pins = []
         self.checks = []
+        self.attacked_squares = [[False] * 8 for _ in range(8)]
         
         # EN PASSANT
         self.en_passant = [False, (-1, -1), (-1, -1)]
         
-        # For pawn promotion
-        self.pawn_promotion = [False, (-1, -1)] 
-        
         # For castling (kinda tricky ngl)
         self.black_queen_rook_moved = False
         self.black_king_rook_moved = False
@@ -66,19 +78,203 @@ class game_state():
         self.white_king_rook_moved = False
         self.white_king_moved = False
         
-        # For checking endgame
-        self.move_count_without_capture = 0
+        # For checking endgame: plies since the last capture or pawn move (50-move rule)
+        self.halfmove_clock = 0
         self.piece_count = 32
-        self.move_count_without_pawn_move = 0
+        
+        # Squares of every piece of each side, number of every piece type, and number of
+        # bishops on light (0) and dark (1) squares. Kept up to date by make_move and unmake_move
+        self.piece_squares = {"w": set(), "b": set()}
+        self.piece_counts = {}
+        self.bishop_square_colors = [0, 0]
+        self.count_pieces()
+        
+        # Zobrist key of the position, updated by make_move (see zobrist.py)
+        self.zobrist_key = zobrist.compute_key(self)
+        
+        # How many times every position key was reached in this game, for repetition draws
+        self.position_count = {self.zobrist_key: 1}
+        
+        # Position the game started from and plies played before it (from the FEN move number)
+        self.start_fen = START_FEN
+        self.start_ply = 0
+        
+        # Valid moves of the current position for the move stages of the board backend and the
+        # GUI (see get_valid_move_cache / get_move_cache), None = not computed yet
+        self.move_cache = None
+        self.destination_cache = None
+        
+        if fen is not None:
+            self.load_fen(fen)
+    
+    # Load a position from a FEN string, e.g. "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1"
+    # The halfmove clock and move number may be missing (EPD), a broken FEN raises ValueError
+    def load_fen(self, fen):
+        fields = fen.split()
+        if len(fields) < 4:
+            raise ValueError("FEN needs at least 4 fields: " + fen)
+        ranks = fields[0].split("/")
+        if len(ranks) != 8:
+            raise ValueError("FEN board needs 8 ranks: " + fields[0])
+        
+        board = []
+        king_locations = {"w": [], "b": []}
+        for rank in ranks:
+            row = []
+            for char in rank:
+                if char in "12345678":
+                    row.extend(["--"] * int(char))
+                elif char in FEN_PIECES:
+                    piece = FEN_PIECES[char]
+                    if piece[1] == "K":
+                        king_locations[piece[0]].append((len(board), len(row)))
+                    row.append(piece)
+                else:
+                    raise ValueError("Unknown piece in FEN: " + char)
+            if len(row) != 8:
+                raise ValueError("FEN rank needs 8 cells: " + rank)
+            board.append(row)
+        if len(king_locations["w"]) != 1 or len(king_locations["b"]) != 1:
+            raise ValueError("FEN needs exactly one king of each color: " + fields[0])
+        if fields[1] not in ("w", "b"):
+            raise ValueError("FEN side to move must be w or b: " + fields[1])
+        
+        self.board = board
+        self.white_king_location = king_locations["w"][0]
+        self.black_king_location = king_locations["b"][0]
+        self.turn = fields[1]
+        
+        # FEN stores castling rights, we store whether the king or rook has moved
+        # (a right also needs the king and rook on their squares)
+        castling = fields[2]
+        self.white_king_rook_moved = "K" not in castling or board[7][4] != "wK" or board[7][7] != "wR"
+        self.white_queen_rook_moved = "Q" not in castling or board[7][4] != "wK" or board[7][0] != "wR"
+        self.white_king_moved = self.white_king_rook_moved and self.white_queen_rook_moved
+        self.black_king_rook_moved = "k" not in castling or board[0][4] != "bK" or board[0][7] != "bR"
+        self.black_queen_rook_moved = "q" not in castling or board[0][4] != "bK" or board[0][0] != "bR"
+        self.black_king_moved = self.black_king_rook_moved and self.black_queen_rook_moved
+        
+        # En passant: the passed cell and the location of the pawn that can be captured
+        # The square is on the 6th rank with white to move (3rd with black), empty, and the
+        # enemy pawn that just moved two squares stands in front of it
+        en_passant = fields[3]
+        if en_passant != "-":
+            if len(en_passant) != 2 or en_passant[0] not in Move.file_to_col or en_passant[1] != ("6" if self.turn == "w" else "3"):
+                raise ValueError("Bad en passant square in FEN: " + en_passant)
+            row = Move.rank_to_row[en_passant[1]]
+            col = Move.file_to_col[en_passant[0]]
+            pawn_row = row + 1 if row == 2 else row - 1
+            enemy_pawn = ("b" if self.turn == "w" else "w") + "p"
+            if board[row][col] != "--" or board[pawn_row][col] != enemy_pawn:
+                raise ValueError("No pawn can be taken en passant on " + en_passant + " in FEN: " + fields[0])
+            self.en_passant = [True, (row, col), (pawn_row, col)]
+        else:
+            self.en_passant = [False, (-1, -1), (-1, -1)]
+        
+        self.halfmove_clock = int(fields[4]) if len(fields) > 4 else 0
+        fullmove_number = int(fields[5]) if len(fields) > 5 else 1
+        self.start_ply = (max(fullmove_number, 1) - 1) * 2 + (1 if self.turn == "b" else 0)
+        self.start_fen = " ".join(fields[:4] + [str(self.halfmove_clock), str(fullmove_number)])
+        self.count_pieces()
+        
+        self.in_check = False
+        self.pins = []
+        self.checks = []
+        self.move_log = []
+        self.undo_log = []
+        if self.backend == "bitboard":
+            self.bitboards = bitboard.board_to_bitboards(self.board)
+        self.zobrist_key = zobrist.compute_key(self)
+        self.position_count = {self.zobrist_key: 1}
+        self.move_cache = None
+    
+    # FEN string of the current position (the opposite of load_fen)
+    def get_fen(self):
+        ranks = []
+        for row in self.board:
+            rank = ""
+            empty = 0
+            for piece in row:
+                if piece == "--":
+                    empty += 1
+                else:
+                    if empty:
+                        rank += str(empty)
+                        empty = 0
+                    rank += PIECE_TO_FEN[piece]
+            if empty:
+                rank += str(empty)
+            ranks.append(rank)
+        
+        castling = ""
+        if not self.white_king_moved and not self.white_king_rook_moved:
+            castling += "K"
+        if not self.white_king_moved and not self.white_queen_rook_moved:
+            castling += "Q"
+        if not self.black_king_moved and not self.black_king_rook_moved:
+            castling += "k"
+        if not self.black_king_moved and not self.black_queen_rook_moved:
+            castling += "q"
+        
+        if self.en_passant[0]:
+            en_passant = Move.col_to_file[self.en_passant[1][1]] + Move.row_to_rank[self.en_passant[1][0]]
+        else:
+            en_passant = "-"
+        
+        fullmove_number = (self.start_ply + len(self.move_log)) // 2 + 1
+        return " ".join(["/".join(ranks), self.turn, castling or "-", en_passant,
+                         str(self.halfmove_clock), str(fullmove_number)])
+    
+    """_Position string_
+    
+    get_position() gives the game as a short string: the FEN it started from and the moves
+    played since, like the UCI position command, e.g.
+    "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1 moves e2e4 e7e5". It is what
+    worker processes get instead of a pickled game_state: it is small, and replaying the
+    moves gives the worker the same repetition history.
+    """
+    
+    def get_position(self):
+        if not self.move_log:
+            return self.start_fen
+        return self.start_fen + " moves " + " ".join(move.get_uci_notation() for move in self.move_log)
+    
+    # Load a string made by get_position, raises ValueError if a move is not valid
+    def load_position(self, position):
+        fen, _, moves = position.partition(" moves ")
+        self.load_fen(fen)
+        for notation in moves.split():
+            move = self.get_uci_move(notation)
+            if move is None:
+                raise ValueError("Invalid move in position: " + notation)
+            self.make_move(move)
+    
+    # Build the piece lists and counters from the board (make_move keeps them up to date after that)
+    def count_pieces(self):
+        self.piece_squares = {"w": set(), "b": set()}
+        self.piece_counts = {color + piece_type: 0 for color in "wb" for piece_type in "pNBRQK"}
+        self.bishop_square_colors = [0, 0]
+        for row in range(8):
+            for col in range(8):
+                piece = self.board[row][col]
+                if piece != "--":
+                    self.piece_squares[piece[0]].add((row, col))
+                    self.piece_counts[piece] += 1
+                    if piece[1] == "B":
+                        self.bishop_square_colors[(row + col) % 2] += 1
+        self.piece_count = sum(self.piece_counts.values())
+        
+        # Running evaluation scores (see evaluation.py), also kept up to date by make_move
+        self.mg_score, self.eg_score, self.phase = evaluation.compute_scores(self.board)
     
     # This function get every valid move
     def get_valid_move(self):
+        if self.backend == "bitboard":
+            return self.get_valid_move_bitboard()
+        
         # Storing valid moves
         moves = []
         
-        # To check checking, pinning
-        self.in_check, self.pins, self.checks = self.check_for_pins_or_check(self.board)
-        
         # Get the king location
         if self.turn == "w":
             king_row = self.white_king_location[0]
@@ -87,6 +283,13 @@ class game_state():
             king_row = self.black_king_location[0]
             king_col = self.black_king_location[1]
         
+        # Squares attacked by the opponent, for king moves, castling and check detection
+        self.attacked_squares = self.get_attacked_squares()
+        self.in_check = self.attacked_squares[king_row][king_col]
+        
+        # To check pinning, and where the check comes from
+        trash, self.pins, self.checks = self.check_for_pins_or_check(self.board)
+        
         # If the king is checked
         if self.in_check:
             
@@ -111,6 +314,9 @@ class game_state():
                 
                 for i in range(len(moves) - 1, -1, -1):
                     if moves[i].piece_moved[1] != "K":
+                        # En passant can capture the checking pawn without landing on its square
+                        if moves[i].is_en_passant_move and (moves[i].start_row, moves[i].end_col) == (check_row, check_col):
+                            continue
                         if not (moves[i].end_row, moves[i].end_col) in valid_squares:
                             moves.remove(moves[i])
             else:
@@ -120,15 +326,126 @@ class game_state():
             
         return moves
     
+    # Same as get_valid_move but with the bitboard backend
+    def get_valid_move_bitboard(self, kind=bitboard.ALL_MOVES, origins=bitboard.ALL_SQUARES):
+        # The bitboard generator handles pins itself, the piece functions used by the GUI don't need them
+        self.pins = []
+        self.checks = []
+        return bitboard.generate_legal_moves(self, kind, origins)
+    
+    # Valid captures and promotions. The board backend can only generate every move: it does
+    # it once per position (get_valid_move_cache) and every stage takes its moves from there
+    def get_noisy_moves(self):
+        if self.backend == "bitboard":
+            return self.get_valid_move_bitboard(bitboard.NOISY_MOVES)
+        return [move for move in self.get_valid_move_cache().values() if move.piece_captured != "--" or move.is_pawn_promotion]
+    
+    # Valid moves that are not captures or promotions
+    def get_quiet_moves(self):
+        if self.backend == "bitboard":
+            return self.get_valid_move_bitboard(bitboard.QUIET_MOVES)
+        return [move for move in self.get_valid_move_cache().values() if move.piece_captured == "--" and not move.is_pawn_promotion]
+    
+    # Valid moves of the piece on (row, col)
+    def get_valid_move_from(self, row, col):
+        if self.backend == "bitboard":
+            return self.get_valid_move_bitboard(origins=bitboard.bit(row * 8 + col))
+        return [move for move in self.get_valid_move_cache().values() if move.start_row == row and move.start_col == col]
+    
+    # The valid move with this move id, or None (e.g. to check a move from the transposition table)
+    def get_valid_move_by_id(self, move_id):
+        if self.backend != "bitboard":
+            return self.get_valid_move_cache().get(move_id)
+        start = move_id & 63
+        for move in self.get_valid_move_from(start >> 3, start & 7):
+            if move.move_id == move_id:
+                return move
+        return None
+    
+    # Valid moves keyed by move id, to look a move up in O(1) instead of scanning the list
+    def get_valid_move_dict(self):
+        return {move.move_id: move for move in self.get_valid_move()}
+    
+    # Valid moves of the position keyed by move id (in generation order), generated once and
+    # kept until make_move / unmake_move (in_check, pins and checks are the ones of this position)
+    def get_valid_move_cache(self):
+        if self.move_cache is None:
+            self.move_cache = {move.move_id: move for move in self.get_valid_move()}
+            self.destination_cache = None
+        return self.move_cache
+    
+    # For the GUI: (moves keyed by move id, set of end squares keyed by start square), kept like above
+    def get_move_cache(self):
+        moves = self.get_valid_move_cache()
+        if self.destination_cache is None:
+            self.destination_cache = {}
+            for move in moves.values():
+                self.destination_cache.setdefault((move.start_row, move.start_col), set()).add((move.end_row, move.end_col))
+        return moves, self.destination_cache
+    
+    # End squares of the valid moves of the piece on (row, col), from the cache
+    def get_destinations(self, row, col):
+        return self.get_move_cache()[1].get((row, col), set())
+    
+    # Static exchange evaluation of a capture: material won (or lost if negative) when both
+    # sides keep capturing on the target square (see bitboard.static_exchange)
+    def static_exchange(self, move):
+        bitboards = self.bitboards if self.backend == "bitboard" else bitboard.board_to_bitboards(self.board)
+        side = bitboard.WHITE if move.piece_moved[0] == "w" else bitboard.BLACK
+        return bitboard.static_exchange(bitboards, move.start_row * 8 + move.start_col, move.end_row * 8 + move.end_col, side)
+    
+    # Find the valid move written in UCI notation (e.g. "e2e4", "e7e8q"), None if it is not valid
+    def get_uci_move(self, notation):
+        for move in self.get_valid_move():
+            if move.get_uci_notation() == notation:
+                return move
+        return None
+    
+    # Find the valid move written in SAN (e.g. "Nf3", "exd5", "O-O", "e8=Q+"), None if it is not valid or ambiguous
+    def get_san_move(self, san):
+        san = san.rstrip("+#!?")
+        moves = self.get_valid_move()
+        if san in ("O-O", "0-0", "O-O-O", "0-0-0"):
+            end_col = 6 if len(san) == 3 else 2
+            for move in moves:
+                if move.is_castle_move and move.end_col == end_col:
+                    return move
+            return None
+        
+        promotion = ""
+        if "=" in san:
+            san, promotion = san.split("=", 1)
+        elif len(san) > 2 and san[-1] in "QRBN" and san[0] in Move.file_to_col:
+            san, promotion = san[:-1], san[-1]
+        piece_type = san[0] if san[:1] in ("K", "Q", "R", "B", "N") else "p"
+        if piece_type != "p":
+            san = san[1:]
+        san = san.replace("x", "").replace("-", "")
+        if len(san) < 2 or san[-2] not in Move.file_to_col or san[-1] not in Move.rank_to_row:
+            return None
+        end_row = Move.rank_to_row[san[-1]]
+        end_col = Move.file_to_col[san[-2]]
+        
+        # What is left before the end square tells apart two pieces that can go there
+        found = []
+        for move in moves:
+            if move.piece_moved[1] != piece_type or move.end_row != end_row or move.end_col != end_col:
+                continue
+            if move.promotion != promotion:
+                continue
+            if any(char in Move.file_to_col and Move.file_to_col[char] != move.start_col or
+                   char in Move.rank_to_row and Move.rank_to_row[char] != move.start_row for char in san[:-2]):
+                continue
+            found.append(move)
+        return found[0] if len(found) == 1 else None
+    
     # Get possible move from each type of pieces    
     def get_possible_move(self):
         moves = []
-        for row in range(len(self.board)):
-            for col in range(len(self.board[row])):
-                current_turn = self.board[row][col][0]
-                if (current_turn == self.turn):
-                    piece = self.board[row][col][1]
-                    self.get_move[piece](row, col, moves)   
+        # Only the squares of the side to move, not the whole board
+        for row, col in self.piece_squares[self.turn]:
+            piece = self.board[row][col][1]
+            self.get_move[piece](row, col, moves)   
         return moves
     
         """_This is description of how to generate possible from each pieces_
@@ -155,46 +472,54 @@ class game_state():
         if self.turn == "w":
             if row - 1 >= 0:
                 if self.board[row - 1][col] == "--":
-                    if not piece_pinned or pin_direction == (-1, 0):
-                        moves.append(Move((row, col), (row - 1, col), self.board))
+                    if not piece_pinned or pin_direction in ((-1, 0), (1, 0)):
+                        self.add_pawn_move((row, col), (row - 1, col), moves)
                         if row == 6 and self.board[row - 2][col] == "--":
-                            moves.append(Move((row, col), (row - 2, col), self.board))
+                            self.add_pawn_move((row, col), (row - 2, col), moves)
                 if col - 1 >= 0:
-                    if self.board[row - 1][col - 1][0] == 'b' or (self.en_passant[0] and (row - 1, col - 1) == self.en_passant[1]):
-                        if not piece_pinned or pin_direction == (-1, -1):
-                            moves.append(Move((row, col), (row - 1, col - 1), self.board))
+                    if self.board[row - 1][col - 1][0] == 'b':
+                        if not piece_pinned or pin_direction in ((-1, -1), (1, 1)):
+                            self.add_pawn_move((row, col), (row - 1, col - 1), moves)
                     if self.en_passant[0] and (row - 1, col - 1) == self.en_passant[1]:
                         if self.is_legal_en_passant_move(row, col, row, col - 1):
-                            moves.append(Move((row, col), (row - 1, col - 1), self.board))
+                            self.add_pawn_move((row, col), (row - 1, col - 1), moves)
                 if col + 1 < len(self.board[row]):
                     if self.board[row - 1][col + 1][0] == 'b':
-                        if not piece_pinned or pin_direction == (-1, 1):
-                            moves.append(Move((row, col), (row - 1, col + 1), self.board))
+                        if not piece_pinned or pin_direction in ((-1, 1), (1, -1)):
+                            self.add_pawn_move((row, col), (row - 1, col + 1), moves)
                     if self.en_passant[0] and (row - 1, col + 1) == self.en_passant[1]:
                         if self.is_legal_en_passant_move(row, col, row, col + 1):
-                            moves.append(Move((row, col), (row - 1, col + 1), self.board))
+                            self.add_pawn_move((row, col), (row - 1, col + 1), moves)
                     
         elif self.turn == "b":
             if row + 1 < len(self.board):
-                if not piece_pinned or pin_direction == (1, 0):
+                if not piece_pinned or pin_direction in ((1, 0), (-1, 0)):
                     if self.board[row + 1][col] == "--":
-                        moves.append(Move((row, col), (row + 1, col), self.board))
+                        self.add_pawn_move((row, col), (row + 1, col), moves)
                         if row == 1 and self.board[row + 2][col] == "--":
-                            moves.append(Move((row, col), (row + 2, col), self.board))
+                            self.add_pawn_move((row, col), (row + 2, col), moves)
                 if col - 1 >= 0:
-                    if not piece_pinned or pin_direction == (1, -1):
+                    if not piece_pinned or pin_direction in ((1, -1), (-1, 1)):
                         if self.board[row + 1][col - 1][0] == 'w':
-                            moves.append(Move((row, col), (row + 1, col - 1), self.board))
+                            self.add_pawn_move((row, col), (row + 1, col - 1), moves)
                     if self.en_passant[0] and (row + 1, col - 1) == self.en_passant[1]:
                         if self.is_legal_en_passant_move(row, col, row, col - 1):
-                            moves.append(Move((row, col), (row + 1, col - 1), self.board))
+                            self.add_pawn_move((row, col), (row + 1, col - 1), moves)
                 if col + 1 < len(self.board[row]):
-                    if not piece_pinned or pin_direction == (1, 1):
+                    if not piece_pinned or pin_direction in ((1, 1), (-1, -1)):
                         if self.board[row + 1][col + 1][0] == 'w':
-                            moves.append(Move((row, col), (row + 1, col + 1), self.board))
+                            self.add_pawn_move((row, col), (row + 1, col + 1), moves)
                     if self.en_passant[0] and (row + 1, col + 1) == self.en_passant[1]:
                         if self.is_legal_en_passant_move(row, col, row, col + 1):
-                            moves.append(Move((row, col), (row + 1, col + 1), self.board))
+                            self.add_pawn_move((row, col), (row + 1, col + 1), moves)
+    
+    # Add a pawn move, a pawn reaching the last row gives one move for every promotion piece
+    def add_pawn_move(self, start_square, end_square, moves):
+        if end_square[0] == 0 or end_square[0] == 7:
+            for piece in Move.promotion_pieces:
+                moves.append(Move(start_square, end_square, self.board, piece))
+        else:
+            moves.append(Move(start_square, end_square, self.board))
     
     # Get every rook possible move
     def rook_move(self, row, col, moves):
@@ -281,32 +606,80 @@ class game_state():
         self.rook_move(row, col, moves)
         self.bishop_move(row, col, moves)
     
-    # Get every King move
+    # Get every King move (uses the attack map computed by get_valid_move)
     def king_move(self, row, col, moves):
         direction = ((0, -1), (0, 1), (-1, 0), (1, 0), (1, 1), (1, -1), (-1, 1), (-1, -1))
         ally = "w" if self.turn == "w" else "b"
+        attacked = self.attacked_squares
         for d in direction:
             end_row = row + d[0]
             end_col = col + d[1]
             if 0 <= end_row and end_row < 8 and 0 <= end_col and end_col < 8:
                 end_piece = self.board[end_row][end_col]
-                if end_piece[0] != ally:
-                    if ally == "w":
-                        self.white_king_location = (end_row, end_col)
-                    else: 
-                        self.black_king_location = (end_row, end_col)
-                    in_check, pins, checks = self.check_for_pins_or_check(self.board)
-                    if not in_check:
-                        moves.append(Move((row, col), (end_row, end_col), self.board))
-                    if ally == "w":
-                        self.white_king_location = (row, col)
-                    else:
-                        self.black_king_location = (row, col)
-                    if self.check_castling_king_side(row, col):
-                        moves.append(Move((row, col), (row, col + 2), self.board))
-                    if self.check_castling_queen_side(row, col):
-                        moves.append(Move((row, col), (row, col - 2), self.board))
+                if end_piece[0] != ally and not attacked[end_row][end_col]:
+                    moves.append(Move((row, col), (end_row, end_col), self.board))
+        
+        # Castling only once per call, and never out of check
+        if not attacked[row][col]:
+            if self.check_castling_king_side(row, col):
+                moves.append(Move((row, col), (row, col + 2), self.board))
+            if self.check_castling_queen_side(row, col):
+                moves.append(Move((row, col), (row, col - 2), self.board))
         
+        """_Attack map_
+        
+        Instead of moving the king to every square and scanning 8 rays from there, we
+        compute once per get_valid_move every square the opponent attacks. Our own king
+        is not a blocker in that map, otherwise the king could step back along the line
+        of a rook or bishop that is checking it. King moves, castling and check detection
+        all just look the square up.
+        """
+    
+    # Every square attacked by the opponent of the side to move, as an 8x8 list of booleans
+    def get_attacked_squares(self):
+        board = self.board
+        opponent = "b" if self.turn == "w" else "w"
+        own_king = self.turn + "K"
+        attacked = [[False] * 8 for _ in range(8)]
+        for row, col in self.piece_squares[opponent]:
+            piece = board[row][col]
+            piece_type = piece[1]
+            if piece_type == "p":
+                end_row = row + 1 if opponent == "b" else row - 1
+                if 0 <= end_row < 8:
+                    if col > 0:
+                        attacked[end_row][col - 1] = True
+                    if col < 7:
+                        attacked[end_row][col + 1] = True
+            elif piece_type == "N" or piece_type == "K":
+                if piece_type == "N":
+                    directions = ((-2, -1), (-2, 1), (-1, -2), (-1, 2), (2, 1), (2, -1), (1, 2), (1, -2))
+                else:
+                    directions = ((0, -1), (0, 1), (-1, 0), (1, 0), (1, 1), (1, -1), (-1, 1), (-1, -1))
+                for d in directions:
+                    end_row = row + d[0]
+                    end_col = col + d[1]
+                    if 0 <= end_row < 8 and 0 <= end_col < 8:
+                        attacked[end_row][end_col] = True
+            else:
+                if piece_type == "R":
+                    directions = ((-1, 0), (0, -1), (1, 0), (0, 1))
+                elif piece_type == "B":
+                    directions = ((-1, -1), (-1, 1), (1, -1), (1, 1))
+                else:
+                    directions = ((-1, 0), (0, -1), (1, 0), (0, 1), (-1, -1), (-1, 1), (1, -1), (1, 1))
+                for d in directions:
+                    end_row = row + d[0]
+                    end_col = col + d[1]
+                    while 0 <= end_row < 8 and 0 <= end_col < 8:
+                        attacked[end_row][end_col] = True
+                        end_piece = board[end_row][end_col]
+                        if end_piece != "--" and end_piece != own_king:
+                            break
+                        end_row += d[0]
+                        end_col += d[1]
+        return attacked
+    
         """_Algorithm to check for pins and checks_
 
         1. First get every possible pinned pieces: they are pieces that stand alone with KING
@@ -389,18 +762,6 @@ class game_state():
         
         return in_check, pins, checks
     
-    # Check if we can make EN PASSANT move or not
-    def check_en_passant(self):
-        # If the previous move is pawn and they make 2-cell move, then it en passant
-        piece_type = self.move_log[-1].get_chess_notation()[:2]
-        start_row = self.move_log[-1].rank_to_row[self.move_log[-1].get_chess_notation()[3]]
-        start_col = self.move_log[-1].file_to_col[self.move_log[-1].get_chess_notation()[2]]
-        end_row = self.move_log[-1].rank_to_row[self.move_log[-1].get_chess_notation()[5]]
-        end_col = self.move_log[-1].file_to_col[self.move_log[-1].get_chess_notation()[4]]
-        if piece_type[1] == "p" and ((start_row == 6 and end_row == 4) or (start_row == 1 and end_row == 3)):
-            # Store the en passant captured location, captured pawn location
-            self.en_passant = [True, ((start_row + end_row) // 2, start_col), (end_row, end_col)]
-    
     def is_legal_en_passant_move(self, row_1, col_1, row_2, col_2):
         temp_board = [[i for i in j] for j in self.board]
         temp_board[row_1][col_1] = '--'
@@ -414,27 +775,6 @@ class game_state():
             return False
         return True
     
-    def en_passant_move(self):
-        if self.en_passant[0]:
-            # If there is en passant move
-            piece_type = self.move_log[-1].get_chess_notation()[:2]
-            end_row = self.move_log[-1].rank_to_row[self.move_log[-1].get_chess_notation()[5]]
-            end_col = self.move_log[-1].file_to_col[self.move_log[-1].get_chess_notation()[4]]
-            if piece_type[1] == "p" and (end_row, end_col) == self.en_passant[1]:
-                self.board[self.en_passant[2][0]][self.en_passant[2][1]] = "--"
-                
-            # Even if the player didn't capture en passant, we still change it to false as en passant only last 1 turn
-            self.en_passant = (False, (-1, -1), (-1, -1))
-    
-    # Check if we can promote our pawn or not
-    def check_promotion(self):
-        # Promotion is easy as we just need to check if the pawn move to the last row
-        piece_type = self.move_log[-1].get_chess_notation()[1]
-        end_row = self.move_log[-1].rank_to_row[self.move_log[-1].get_chess_notation()[5]]
-        end_col = self.move_log[-1].file_to_col[self.move_log[-1].get_chess_notation()[4]]
-        if piece_type == "p" and (end_row == 7 or end_row == 0):
-            self.pawn_promotion = [True, (end_row, end_col)]
-    
         """_Castlling rule_
 
         We cannot castle if there is one of the following conditions:
@@ -455,225 +795,420 @@ class game_state():
     
     #Apply those rules to check the castle from queen side and king side
      
-    # Check if we can castle queen side    
+    # Check if we can castle queen side (the king is not in check, king_move checks it)
     def check_castling_queen_side(self, row, col):
         if self.turn == "w":
             if self.white_king_moved or self.white_queen_rook_moved:
                 return False
-            in_check, trash, trash = self.check_for_pins_or_check(self.board)
-            if in_check:
-                return False
-            for i in range(1, 3):
-                self.white_king_location = (row, col - i)
-                in_check, trash, trash = self.check_for_pins_or_check(self.board)
-                if self.board[row][col - i] != "--" or in_check:
-                    self.white_king_location = (row, col)
-                    return False
-            self.white_king_location = (row, col)
-            return True
-            
-        if self.turn == "b":
+        else:
             if self.black_king_moved or self.black_queen_rook_moved:
                 return False
-            in_check, trash, trash = self.check_for_pins_or_check(self.board)
-            if in_check:
+        # The rook passes the b-file, so it must be empty too
+        if self.board[row][col - 3] != "--":
+            return False
+        for i in range(1, 3):
+            if self.board[row][col - i] != "--" or self.attacked_squares[row][col - i]:
                 return False
-            for i in range(1, 3):
-                self.black_king_location = (row, col - i)
-                in_check, trash, trash = self.check_for_pins_or_check(self.board)
-                if self.board[row][col - i] != "--" or in_check:
-                    self.black_king_location = (row, col)
-                    return False
-            self.black_king_location = (row, col)
-            return True
+        return True
      
-    # Check if we can castle king side    
+    # Check if we can castle king side (the king is not in check, king_move checks it)
     def check_castling_king_side(self, row, col):
         if self.turn == "w":
             if self.white_king_moved or self.white_king_rook_moved:
                 return False
-            in_check, trash, trash = self.check_for_pins_or_check(self.board)
-            if in_check:
-                return False
-            for i in range(1, 3):
-                self.white_king_location = (row, col + i)
-                in_check, trash, trash = self.check_for_pins_or_check(self.board)
-                if self.board[row][col + i] != "--" or in_check:
-                    self.white_king_location = (row, col)
-                    return False
-            self.white_king_location = (row, col)
-            return True
-            
-        if self.turn == "b":
+        else:
             if self.black_king_moved or self.black_king_rook_moved:
                 return False
-            in_check, trash, trash = self.check_for_pins_or_check(self.board)
-            if in_check:
+        for i in range(1, 3):
+            if self.board[row][col + i] != "--" or self.attacked_squares[row][col + i]:
                 return False
-            for i in range(1, 3):
-                self.black_king_location = (row, col + i)
-                in_check, trash, trash = self.check_for_pins_or_check(self.board)
-                if self.board[row][col + i] != "--" or in_check:
-                    self.black_king_location = (row, col)
-                    return False
-            self.black_king_location = (row, col)
-            return True
-    
-    # Make the castle move
-    def castling_move(self):
-        piece_type = self.move_log[-1].get_chess_notation()[:2]
-        start_col = self.move_log[-1].file_to_col[self.move_log[-1].get_chess_notation()[2]]
-        end_col = self.move_log[-1].file_to_col[self.move_log[-1].get_chess_notation()[4]]
-                
-        if piece_type == "wK" and start_col == 4 and end_col == 6:
-            self.board[7][7] = "--"
-            self.board[7][5] = "wR"
-            self.white_king_rook_moved = True
-                
-        if piece_type == "wK" and start_col == 4 and end_col == 2:
-            self.board[7][0] = "--"
-            self.board[7][3] = "wR"
-            self.white_queen_rook_moved = True
-                
-        if piece_type == "bK" and start_col == 4 and end_col == 6:
-            self.board[0][7] = "--"
-            self.board[0][5] = "bR"
-            self.black_king_rook_moved = True
-                
-        if piece_type == "bK" and start_col == 4 and end_col == 2:
-            self.board[0][0] = "--"
-            self.board[0][3] = "bR"
-            self.black_queen_rook_moved = True
+        return True
     
-    # To make a move, store the move into the move_log and other checking for castling stuff        
+    # Castling flags in one tuple, so they can be stored in the undo record
+    def get_castling_flags(self):
+        return (self.white_king_moved, self.white_king_rook_moved, self.white_queen_rook_moved,
+                self.black_king_moved, self.black_king_rook_moved, self.black_queen_rook_moved)
+    
+    def set_castling_flags(self, flags):
+        (self.white_king_moved, self.white_king_rook_moved, self.white_queen_rook_moved,
+         self.black_king_moved, self.black_king_rook_moved, self.black_queen_rook_moved) = flags
+    
+        """_How make_move and unmake_move work_
+        
+        make_move does everything a move changes: moving the piece, removing the captured piece
+        (also for en passant), moving the rook when castling, promoting the pawn, and updating
+        the king location, castling flags, en passant state, the counters for the endgame,
+        the piece lists and the Zobrist key.
+        
+        Before that, it pushes an undo record with everything that cannot be computed back
+        from the move itself (castling flags, en passant state, counters, Zobrist key).
+        make_move also counts the new position key in position_count and unmake_move
+        takes it out again, so repetitions are a dictionary lookup. unmake_move pops
+        the last move and its record and puts everything back, so a search can walk a line
+        with make_move / unmake_move instead of copying the whole game_state.
+        """
+    
+    # To make a move, store the move into the move_log and the undo record into the undo_log
     def make_move(self, move):
-        self.board[move.start_row][move.start_col] = "--"
-        self.board[move.end_row][move.end_col] = move.piece_moved
-        self.move_log.append(move)
-        piece_type = self.move_log[-1].get_chess_notation()[:2]
-        if self.board[0][4] != "bK" and not self.black_king_moved:
-            self.black_king_moved = True
-        if self.board[7][4] != "wK" and not self.white_king_moved:
-            self.white_king_moved = True
-        if self.board[0][7] != "bR" and not self.black_king_rook_moved:
-            self.black_king_rook_moved = True
-        if self.board[0][0] != "bR" and not self.black_queen_rook_moved:
-            self.black_queen_rook_moved = True
-        if self.board[7][7] != "wR" and not self.white_king_rook_moved:
-            self.white_king_rook_moved = True
-        if self.board[7][0] != "wR" and not self.white_queen_rook_moved:
-            self.white_queen_rook_moved = True
-
+        castling_flags = self.get_castling_flags()
+        self.undo_log.append((castling_flags, self.en_passant, self.halfmove_clock, self.piece_count, self.zobrist_key,
+                              self.mg_score, self.eg_score, self.phase))
+        self.move_cache = None
+        board = self.board
+        start_row, start_col = move.start_row, move.start_col
+        end_row, end_col = move.end_row, move.end_col
+        piece_type = move.piece_moved[1]
+        
+        # Zobrist key: remove the old castling / en passant state and the moving piece, switch the side
+        piece_keys = zobrist.PIECE_KEYS
+        key = self.zobrist_key ^ zobrist.CASTLING_KEYS[castling_flags] ^ zobrist.en_passant_key(board, self.en_passant)
+        key ^= zobrist.BLACK_TO_MOVE ^ piece_keys[move.piece_moved][start_row * 8 + start_col]
+        
+        board[start_row][start_col] = "--"
+        if move.is_pawn_promotion:
+            board[end_row][end_col] = move.piece_moved[0] + move.promotion
+        else:
+            board[end_row][end_col] = move.piece_moved
+        key ^= piece_keys[board[end_row][end_col]][end_row * 8 + end_col]
+        
+        # The pawn captured by en passant is not on the end square
+        if move.is_en_passant_move:
+            board[start_row][end_col] = "--"
+            key ^= piece_keys[move.piece_captured][start_row * 8 + end_col]
+        elif move.piece_captured != "--":
+            key ^= piece_keys[move.piece_captured][end_row * 8 + end_col]
+        
+        self.update_piece_lists(move, True)
+        self.update_evaluation(move)
+        
+        # Castle: the rook jumps over the king
+        if move.is_castle_move:
+            rook_keys = piece_keys[move.piece_moved[0] + "R"]
+            if end_col == 6:
+                board[end_row][5] = board[end_row][7]
+                board[end_row][7] = "--"
+                key ^= rook_keys[end_row * 8 + 7] ^ rook_keys[end_row * 8 + 5]
+            else:
+                board[end_row][3] = board[end_row][0]
+                board[end_row][0] = "--"
+                key ^= rook_keys[end_row * 8] ^ rook_keys[end_row * 8 + 3]
         
+        if piece_type == "K":
+            if move.piece_moved[0] == "w":
+                self.white_king_location = (end_row, end_col)
+                self.white_king_moved = True
+            else:
+                self.black_king_location = (end_row, end_col)
+                self.black_king_moved = True
+        
+        # A rook that moves or is captured loses its castling right
+        for row, col in ((start_row, start_col), (end_row, end_col)):
+            if row == 7 and col == 7:
+                self.white_king_rook_moved = True
+            elif row == 7 and col == 0:
+                self.white_queen_rook_moved = True
+            elif row == 0 and col == 7:
+                self.black_king_rook_moved = True
+            elif row == 0 and col == 0:
+                self.black_queen_rook_moved = True
+        
+        # A pawn 2-cell move allows en passant: store the passed cell and the pawn location
+        if piece_type == "p" and abs(end_row - start_row) == 2:
+            self.en_passant = [True, ((start_row + end_row) // 2, start_col), (end_row, end_col)]
+        else:
+            self.en_passant = [False, (-1, -1), (-1, -1)]
+        
+        # Counters for the 50-move rule and insufficient material
+        if move.piece_captured != "--":
+            self.piece_count -= 1
+            self.halfmove_clock = 0
+        elif piece_type == "p":
+            self.halfmove_clock = 0
+        else:
+            self.halfmove_clock += 1
+        
+        # Zobrist key: add the new castling / en passant state
+        key ^= zobrist.CASTLING_KEYS[self.get_castling_flags()] ^ zobrist.en_passant_key(board, self.en_passant)
+        self.zobrist_key = key
+        self.position_count[key] = self.position_count.get(key, 0) + 1
+        
+        if self.backend == "bitboard":
+            self.update_bitboards(move)
+        
+        self.move_log.append(move)
         self.turn = "w" if self.turn == "b" else "b"
-
-    # Checking 50 moves without capture rule
-    def check_50_move_without_capture(self):
-        count = 0
-        for row in self.board:
-            count += len([i for i in row if i != "--"])
-        if self.piece_count > count:
-            self.piece_count = count
-            self.move_count_without_capture = 0
+    
+    # Take back the last move
+    def unmake_move(self):
+        move = self.move_log.pop()
+        self.move_cache = None
+        count = self.position_count[self.zobrist_key]
+        if count == 1:
+            del self.position_count[self.zobrist_key]
         else:
-            self.move_count_without_capture += 1
-        if self.move_count_without_capture == 100:
-            return True
-        return False
+            self.position_count[self.zobrist_key] = count - 1
+        (castling_flags, self.en_passant, self.halfmove_clock, self.piece_count, self.zobrist_key,
+         self.mg_score, self.eg_score, self.phase) = self.undo_log.pop()
+        self.set_castling_flags(castling_flags)
+        self.turn = move.piece_moved[0]
+        
+        board = self.board
+        start_row, start_col = move.start_row, move.start_col
+        end_row, end_col = move.end_row, move.end_col
+        
+        board[start_row][start_col] = move.piece_moved
+        if move.is_en_passant_move:
+            board[end_row][end_col] = "--"
+            board[start_row][end_col] = move.piece_captured
+        else:
+            board[end_row][end_col] = move.piece_captured
+        
+        if move.is_castle_move:
+            if end_col == 6:
+                board[end_row][7] = board[end_row][5]
+                board[end_row][5] = "--"
+            else:
+                board[end_row][0] = board[end_row][3]
+                board[end_row][3] = "--"
+        
+        if move.piece_moved == "wK":
+            self.white_king_location = (start_row, start_col)
+        elif move.piece_moved == "bK":
+            self.black_king_location = (start_row, start_col)
+        
+        self.update_piece_lists(move, False)
+        
+        if self.backend == "bitboard":
+            self.update_bitboards(move)
     
-    # Checking 50 moves without pawn move
-    def check_50_move_without_pawn_move(self):
-        piece_type = self.move_log[-1].get_chess_notation()[1]
-        if piece_type != "p":
-            self.move_count_without_pawn_move += 1
+    # Add the change of the evaluation scores by the move (unmake_move takes the old scores from the undo record)
+    def update_evaluation(self, move):
+        mg_tables = evaluation.MG_TABLES
+        eg_tables = evaluation.EG_TABLES
+        start = move.start_row * 8 + move.start_col
+        end = move.end_row * 8 + move.end_col
+        piece = move.piece_moved
+        new_piece = piece[0] + move.promotion if move.is_pawn_promotion else piece
+        mg_score = mg_tables[new_piece][end] - mg_tables[piece][start]
+        eg_score = eg_tables[new_piece][end] - eg_tables[piece][start]
+        
+        if move.piece_captured != "--":
+            captured_square = move.start_row * 8 + move.end_col if move.is_en_passant_move else end
+            mg_score -= mg_tables[move.piece_captured][captured_square]
+            eg_score -= eg_tables[move.piece_captured][captured_square]
+            self.phase -= evaluation.PHASE_WEIGHTS[move.piece_captured[1]]
+        if move.is_pawn_promotion:
+            self.phase += evaluation.PHASE_WEIGHTS[move.promotion]
+        if move.is_castle_move:
+            rook = piece[0] + "R"
+            row_start = move.end_row * 8
+            rook_start, rook_end = (row_start + 7, row_start + 5) if move.end_col == 6 else (row_start, row_start + 3)
+            mg_score += mg_tables[rook][rook_end] - mg_tables[rook][rook_start]
+            eg_score += eg_tables[rook][rook_end] - eg_tables[rook][rook_start]
+        
+        self.mg_score += mg_score
+        self.eg_score += eg_score
+    
+    # Update the piece lists and counters for a move (made = False to take it back)
+    def update_piece_lists(self, move, made):
+        color = move.piece_moved[0]
+        start = (move.start_row, move.start_col)
+        end = (move.end_row, move.end_col)
+        own_squares = self.piece_squares[color]
+        if made:
+            own_squares.remove(start)
+            own_squares.add(end)
         else:
-            self.move_count_without_pawn_move = 0
-        if self.move_count_without_pawn_move == 100:
-            return True
-        return False
+            own_squares.remove(end)
+            own_squares.add(start)
+        change = -1 if made else 1
+        
+        if move.piece_captured != "--":
+            captured_square = (move.start_row, move.end_col) if move.is_en_passant_move else end
+            if made:
+                self.piece_squares[move.piece_captured[0]].remove(captured_square)
+            else:
+                self.piece_squares[move.piece_captured[0]].add(captured_square)
+            self.piece_counts[move.piece_captured] += change
+            if move.piece_captured[1] == "B":
+                self.bishop_square_colors[(captured_square[0] + captured_square[1]) % 2] += change
+        
+        if move.is_pawn_promotion:
+            self.piece_counts[move.piece_moved] += change
+            self.piece_counts[color + move.promotion] -= change
+            if move.promotion == "B":
+                self.bishop_square_colors[(move.end_row + move.end_col) % 2] -= change
+        
+        if move.is_castle_move:
+            row = move.end_row
+            rook_start, rook_end = ((row, 7), (row, 5)) if move.end_col == 6 else ((row, 0), (row, 3))
+            if made:
+                own_squares.remove(rook_start)
+                own_squares.add(rook_end)
+            else:
+                own_squares.remove(rook_end)
+                own_squares.add(rook_start)
+    
+    # Apply a move to the bitboards. Every change is a XOR, so the same call also takes it back
+    def update_bitboards(self, move):
+        bitboards = self.bitboards
+        start = bitboard.bit(move.start_row * 8 + move.start_col)
+        end = bitboard.bit(move.end_row * 8 + move.end_col)
+        moved = bitboard.PIECE_INDEX[move.piece_moved]
+        if move.is_pawn_promotion:
+            bitboards[moved] ^= start
+            bitboards[bitboard.PIECE_INDEX[move.piece_moved[0] + move.promotion]] ^= end
+        else:
+            bitboards[moved] ^= start | end
+        if move.is_en_passant_move:
+            bitboards[bitboard.PIECE_INDEX[move.piece_captured]] ^= bitboard.bit(move.start_row * 8 + move.end_col)
+        elif move.piece_captured != "--":
+            bitboards[bitboard.PIECE_INDEX[move.piece_captured]] ^= end
+        if move.is_castle_move:
+            row = move.end_row * 8
+            rook = bitboard.PIECE_INDEX[move.piece_moved[0] + "R"]
+            if move.end_col == 6:
+                bitboards[rook] ^= bitboard.bit(row + 7) | bitboard.bit(row + 5)
+            else:
+                bitboards[rook] ^= bitboard.bit(row) | bitboard.bit(row + 3)
+
+    # Checking 50 moves without capture or pawn move (the clock is updated by make_move)
+    def check_50_move_rule(self):
+        return self.halfmove_clock >= 100
     
-    # Checking repetitive move
+    # How many times the current position was reached in this game
+    def count_repetition(self):
+        return self.position_count.get(self.zobrist_key, 0)
+    
+    # Checking repetitive move: the same position (same key) for the third time
     def check_3_repetitive_move(self):
-        count = 1
-        if len(self.move_log) >= 9: 
-            move_type = self.move_log[-1].get_chess_notation()
-            for index in range(-5, -10, -4):
-                move_type_2 = self.move_log[index].get_chess_notation()
-                if move_type == move_type_2:
-                    count += 1
-        if count == 3:
-            return True
-        return False
+        return self.count_repetition() >= 3
     
-    # Check insufficient piece
+    # Check insufficient piece (from the counters kept by make_move)
     def checking_insufficient(self):
-        count_white_knight_left = 0
-        count_black_knight_left = 0
-        count_black_cell_bishop = 0
-        count_white_cell_bishop = 0
-        for row in range(len(self.board)):
-            for col in range(len(self.board[row])):
-                if self.board[row][col] == "bN":
-                    count_black_knight_left += 1
-                elif self.board[row][col] == "wN":
-                    count_white_knight_left += 1
-                elif self.board[row][col][1] == "B" and (row + col) % 2 == 0:
-                    count_white_cell_bishop += 1
-                elif self.board[row][col][1] == "B" and (row + col) % 2 == 1:
-                    count_black_cell_bishop += 1
+        knights = self.piece_counts["wN"] + self.piece_counts["bN"]
         if self.piece_count == 3:
-            if count_white_knight_left == 1 or count_black_knight_left == 1 or count_black_cell_bishop == 1 or count_white_cell_bishop == 1:
+            if knights == 1 or self.bishop_square_colors[0] == 1 or self.bishop_square_colors[1] == 1:
                 return True
         if self.piece_count == 4:
-            if count_white_cell_bishop == 2 or count_black_cell_bishop == 2:
+            if self.bishop_square_colors[0] == 2 or self.bishop_square_colors[1] == 2:
                 return True
         return False
     
-    # Checking endgame
-    def checking_endgame(self, valid_move_list):
+    # How the game ends in this position: (result, reason), e.g. ("1-0", "checkmate"), None if it goes on
+    def get_game_end(self, valid_move_list):
         if len(valid_move_list) == 0:
-            in_check, trash, trash = self.check_for_pins_or_check(self.board)
-            if in_check:
-                winner = "White" if self.turn == "b" else "Black"
-                print("Gameover!", winner, "won!") 
-            else:
-                print("Stalemate!")
-            return True 
+            # in_check was set by get_valid_move for this position
+            if self.in_check:
+                return ("1-0" if self.turn == "b" else "0-1"), "checkmate"
+            return "1/2-1/2", "stalemate"
         
-        check1 = self.check_50_move_without_capture() 
-        check2 = self.check_50_move_without_pawn_move()
+        # A dead position ends the game by itself, before the draws that have to be claimed
+        if self.checking_insufficient() or self.piece_count == 2:
+            return "1/2-1/2", "insufficient materials"
         
-        if check1 and check2:
-            print("Draw due to 50-move rule!")
-            return True 
+        if self.check_50_move_rule():
+            return "1/2-1/2", "50-move rule"
         
         if self.check_3_repetitive_move():
-            print("Draw due to 3 repetitive moves!")
-            return True
+            return "1/2-1/2", "3 repetitive moves"
         
-        if self.checking_insufficient() or self.piece_count == 2:
-            print("Draw due to insufficient materials!")
-            return True
+        return None
+    
+    # Checking endgame
+    def checking_endgame(self, valid_move_list):
+        game_end = self.get_game_end(valid_move_list)
+        if game_end is None:
+            return False
         
-        return False
+        result, reason = game_end
+        if reason == "checkmate":
+            winner = "White" if result == "1-0" else "Black"
+            print("Gameover!", winner, "won!") 
+        elif reason == "stalemate":
+            print("Stalemate!")
+        else:
+            print("Draw due to " + reason + "!")
+        return True
+    
+    # Count the leaf nodes of the move tree, to test and benchmark the move generator
+    def perft(self, depth):
+        if depth == 0:
+            return 1
+        moves = self.get_valid_move()
+        if depth == 1:
+            return len(moves)
+        nodes = 0
+        for move in moves:
+            self.make_move(move)
+            nodes += self.perft(depth - 1)
+            self.unmake_move()
+        return nodes
+    
+    # Perft split by root move (in UCI notation), to find which move a wrong count comes from
+    def perft_divide(self, depth):
+        result = {}
+        for move in self.get_valid_move():
+            self.make_move(move)
+            result[move.get_uci_notation()] = self.perft(depth - 1)
+            self.unmake_move()
+        return result
 
 
 # This class to define a move, including (start_row, start_col), (end_row, end_col)      
 class Move():
+    # No per-instance dict: search creates a lot of moves
+    __slots__ = ("start_row", "start_col", "end_row", "end_col", "piece_moved", "piece_captured",
+                 "is_pawn_promotion", "is_en_passant_move", "is_castle_move", "promotion", "move_id")
+    
     rank_to_row = {"1": 7, "2": 6, "3": 5, "4": 4, "5": 3, "6": 2, "7": 1, "8": 0}
     row_to_rank = {value: key for key, value in rank_to_row.items()}
     
     file_to_col = {"h": 7, "g": 6, "f": 5, "e": 4, "d": 3, "c": 2, "b": 1, "a": 0}
     col_to_file = {value: key for key, value in file_to_col.items()}
     
-    def __init__(self, start_square, end_square, board):
+    # Pieces a pawn can promote to, the index is part of the move id
+    promotion_pieces = ("Q", "R", "B", "N")
+    
+    # Flags in the top 4 bits of the move id
+    EN_PASSANT_FLAG = 1
+    CASTLE_FLAG = 2
+    PROMOTION_FLAG = 4
+    
+    def __init__(self, start_square, end_square, board, promotion="Q"):
         self.start_row = start_square[0]
         self.start_col = start_square[1]
         self.end_row = end_square[0]
         self.end_col = end_square[1]
         self.piece_moved = board[self.start_row][self.start_col]
         self.piece_captured = board[self.end_row][self.end_col]
-        self.move_id = self.start_row * 1000 + self.start_col * 100 + self.end_row * 10 + self.end_col
+        
+        # Special moves: they are known from the board before the move, so the GUI's Move is the same as the engine's
+        self.is_pawn_promotion = self.piece_moved[1] == "p" and (self.end_row == 0 or self.end_row == 7)
+        self.is_en_passant_move = self.piece_moved[1] == "p" and self.start_col != self.end_col and self.piece_captured == "--"
+        self.is_castle_move = self.piece_moved[1] == "K" and abs(self.end_col - self.start_col) == 2
+        if self.is_en_passant_move:
+            self.piece_captured = board[self.start_row][self.end_col]
+        self.promotion = promotion if self.is_pawn_promotion else ""
+        
+        self.move_id = (self.start_row * 8 + self.start_col) | (self.end_row * 8 + self.end_col) << 6
+        if self.is_pawn_promotion:
+            self.move_id |= (self.PROMOTION_FLAG | self.promotion_pieces.index(promotion)) << 12
+        elif self.is_en_passant_move:
+            self.move_id |= self.EN_PASSANT_FLAG << 12
+        elif self.is_castle_move:
+            self.move_id |= self.CASTLE_FLAG << 12
+        
+        """_Move id_
+        
+        The move id packs the move into 16 bits: bits 0-5 the start square (row * 8 + col),
+        bits 6-11 the end square, bits 12-15 the flags (en passant, castle, or promotion
+        flag + index of the promotion piece). Equal moves have equal ids, the id is the hash,
+        and it is what the transposition table stores.
+        """
+    
+    def __hash__(self):
+        return self.move_id
     
     # overriding equality     
     def __eq__(self, other):
@@ -683,7 +1218,11 @@ class Move():
     
     # To get chess notation to store in move_log
     def get_chess_notation(self):
-        return self.piece_moved + self.get_rank_file(self.start_row, self.start_col) + self.get_rank_file(self.end_row, self.end_col)
+        return self.piece_moved + self.get_rank_file(self.start_row, self.start_col) + self.get_rank_file(self.end_row, self.end_col) + self.promotion
+        
+    # Notation used by UCI and perft divide, e.g. "e2e4" or "e7e8q"
+    def get_uci_notation(self):
+        return self.get_rank_file(self.start_row, self.start_col) + self.get_rank_file(self.end_row, self.end_col) + self.promotion.lower()
         
     def get_rank_file(self, row, col):
         return self.col_to_file[col] + self.row_to_rank[row]
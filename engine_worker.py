@@ -0,0 +1,124 @@
+import multiprocessing
+import threading
+
+import chessEngine
+import search
+
+"""_Engine worker_
+
+To play against the engine in the GUI, the search runs in another process: on a thread
+it would hold the GIL and the window would freeze while the engine thinks. The worker
+is started once and waits for work. For every search it gets the position string
+(start FEN + moves, see game_state.get_position) and the limits, and answers on the
+result queue:
+    ("info", search_id, info)          after every finished depth, info is search_engine.get_info()
+                                       with the PV in UCI notation
+    ("bestmove", search_id, notation)  at the end, the move in UCI notation (None without legal move)
+
+A reader thread in the GUI process takes the messages off the queue and gives them to a
+callback (the GUI turns them into pygame events, so its loop can keep waiting for events).
+
+Every search has an id. stop_id is shared with the worker: the search with that id (or
+an older one) stops at its next check_limits. move_now() stops the current search, which
+still sends its best move. cancel() also gives up the id, so what the search still sends
+is dropped.
+"""
+
+
+# Search engine of the worker: also stops when the GUI sets stop_id to its search
+class worker_search_engine(search.search_engine):
+    def __init__(self, hash_mb, stop_id):
+        super().__init__(hash_mb)
+        self.stop_id = stop_id
+        self.search_id = 0
+
+    def check_limits(self):
+        super().check_limits()
+        if self.stop_id.value >= self.search_id:
+            self.stopped = True
+
+
+# Main loop of the worker process: one search per task, None ends the process
+def worker_main(task_queue, result_queue, stop_id, hash_mb):
+    engine = worker_search_engine(hash_mb, stop_id)
+    while True:
+        task = task_queue.get()
+        if task is None:
+            break
+        search_id, backend, position, limits = task
+        engine.search_id = search_id
+        if stop_id.value >= search_id:
+            continue
+
+        game_state = chessEngine.game_state(backend)
+        game_state.load_position(position)
+
+        def send_info(info):
+            info["pv"] = [move.get_uci_notation() for move in info["pv"]]
+            result_queue.put(("info", search_id, info))
+
+        best_move = engine.search(game_state, info_callback=send_info, **limits)
+        result_queue.put(("bestmove", search_id, None if best_move is None else best_move.get_uci_notation()))
+    engine.transposition_table.close()
+
+
+class engine_worker():
+    # callback(message) is called on the reader thread for every message of the current search
+    # backend: move generator of the worker's game_state (the bitboard one is faster)
+    def __init__(self, callback, hash_mb=16, backend="bitboard"):
+        self.callback = callback
+        self.backend = backend
+        self.search_id = 0
+        self.searching = False
+        self.task_queue = multiprocessing.Queue()
+        self.result_queue = multiprocessing.Queue()
+        self.stop_id = multiprocessing.Value("q", 0, lock=False)
+        self.process = multiprocessing.Process(target=worker_main, daemon=True,
+                                               args=(self.task_queue, self.result_queue, self.stop_id, hash_mb))
+        self.process.start()
+        self.reader = threading.Thread(target=self.read_results, daemon=True)
+        self.reader.start()
+
+    # Runs on the reader thread until close()
+    def read_results(self):
+        while True:
+            message = self.result_queue.get()
+            if message is None:
+                break
+            if not self.is_current(message):
+                continue
+            if message[0] == "bestmove":
+                self.searching = False
+            self.callback(message)
+
+    # Whether a message comes from the current search (and not from a cancelled one)
+    def is_current(self, message):
+        return message[1] == self.search_id
+
+    # Start searching the position, limits are the ones of search_engine.search (movetime, depth, ...)
+    def search(self, game_state, **limits):
+        self.cancel()
+        self.search_id += 1
+        self.searching = True
+        self.task_queue.put((self.search_id, self.backend, game_state.get_position(), limits))
+        return self.search_id
+
+    # Stop thinking and play the best move found so far
+    def move_now(self):
+        if self.searching:
+            self.stop_id.value = self.search_id
+
+    # Stop thinking without playing (what the search still sends is dropped)
+    def cancel(self):
+        if self.searching:
+            self.stop_id.value = self.search_id
+            self.search_id += 1
+            self.searching = False
+
+    # End the worker process and the reader thread
+    def close(self):
+        self.cancel()
+        self.task_queue.put(None)
+        self.process.join()
+        self.result_queue.put(None)
+        self.reader.join()
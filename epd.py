@@ -0,0 +1,221 @@
+import argparse
+import multiprocessing
+import os
+import time
+
+import chessEngine
+import search
+
+"""_EPD test suites_
+
+An EPD line is the first 4 FEN fields (board, side, castling, en passant) followed by
+operations "opcode operand ...;", e.g.
+
+    r1bqkb1r/pppp1ppp/2n2n2/4p2Q/2B1P3/8/PPPP1PPP/RNB1K1NR w KQkq - bm Qxf7#; id "mate 1";
+
+bm / am are the best move(s) / move(s) to avoid in SAN, hmvc / fmvn the halfmove clock
+and move number. Perft suites use the full FEN and D1, D2, ... for the node counts:
+
+    rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1 ;D1 20 ;D2 400 ;D3 8902
+
+Every position is independent, so the runner gives them to a pool of worker processes
+(one per core by default). A task is just the EPD line, every worker builds its own
+game_state from it and keeps one search_engine for all its positions.
+"""
+
+
+# Split an EPD line into (fen, operations), operations maps the opcode to its list of operands
+def parse_epd(line):
+    fields = line.split(None, 4)
+    if len(fields) < 4:
+        raise ValueError("EPD needs at least 4 fields: " + line)
+    fen_fields = fields[:4]
+    rest = fields[4] if len(fields) > 4 else ""
+
+    # Split the operations on ";" (but not inside quoted strings)
+    segments = []
+    current = ""
+    quoted = False
+    for char in rest:
+        if char == '"':
+            quoted = not quoted
+        if char == ";" and not quoted:
+            segments.append(current)
+            current = ""
+        else:
+            current += char
+    segments.append(current)
+
+    # A full FEN (perft suites) has the halfmove clock and move number before the first ";"
+    first = segments[0].split()
+    if first and all(token.isdigit() for token in first):
+        fen_fields += first
+        segments = segments[1:]
+
+    operations = {}
+    for segment in segments:
+        tokens = segment.split()
+        if not tokens:
+            continue
+        operands = []
+        for token in tokens[1:]:
+            if operands and operands[-1].startswith('"') and not (len(operands[-1]) > 1 and operands[-1].endswith('"')):
+                operands[-1] += " " + token
+            else:
+                operands.append(token)
+        operations[tokens[0]] = [operand.strip('"') for operand in operands]
+
+    if len(fen_fields) == 4:
+        fen_fields.append(operations["hmvc"][0] if "hmvc" in operations else "0")
+        fen_fields.append(operations["fmvn"][0] if "fmvn" in operations else "1")
+    return " ".join(fen_fields), operations
+
+
+# EPD line of a game_state with the given operations (the opposite of parse_epd)
+def make_epd(game_state, operations=None):
+    line = " ".join(game_state.get_fen().split()[:4])
+    for opcode, operands in (operations or {}).items():
+        line += " " + " ".join([opcode] + [operand if " " not in operand else '"' + operand + '"' for operand in operands]) + ";"
+    return line
+
+
+# Read the non-empty, non-comment lines of an EPD file
+def read_epd_file(path):
+    with open(path) as file:
+        return [line.strip() for line in file if line.strip() and not line.startswith("#")]
+
+
+# The search engine of this worker process, kept between positions
+_engine = None
+
+
+def init_worker(hash_mb):
+    global _engine
+    _engine = search.search_engine(hash_mb)
+
+
+# Parse a bm / am operand (SAN, or UCI as some suites use)
+def find_move(game_state, notation):
+    move = game_state.get_san_move(notation)
+    if move is None:
+        move = game_state.get_uci_move(notation)
+    return move
+
+
+# Run one EPD line, returns a dict with the result (runs in a worker process)
+def run_position(task):
+    number, line, settings = task
+    result = {"number": number, "id": str(number), "kind": "skip", "solved": False,
+              "nodes": 0, "time": 0.0, "message": ""}
+    try:
+        fen, operations = parse_epd(line)
+        game_state = chessEngine.game_state(settings["backend"], fen)
+    except ValueError as error:
+        result["message"] = str(error)
+        return result
+    if "id" in operations:
+        result["id"] = " ".join(operations["id"])
+
+    start = time.perf_counter()
+    perft_depths = sorted(int(opcode[1:]) for opcode in operations if opcode[:1] == "D" and opcode[1:].isdigit())
+    if perft_depths:
+        result["kind"] = "perft"
+        result["solved"] = True
+        checked = []
+        for depth in perft_depths:
+            if depth > settings["perft_depth"]:
+                break
+            expected = int(operations["D" + str(depth)][0])
+            nodes = game_state.perft(depth)
+            result["nodes"] += nodes
+            checked.append("D{} {}".format(depth, nodes))
+            if nodes != expected:
+                result["solved"] = False
+                checked[-1] += " (expected {})".format(expected)
+                break
+        result["message"] = " ".join(checked)
+    elif "bm" in operations or "am" in operations:
+        best_moves = [find_move(game_state, notation) for notation in operations.get("bm", [])]
+        avoid_moves = [find_move(game_state, notation) for notation in operations.get("am", [])]
+        if None in best_moves or None in avoid_moves:
+            result["message"] = "unknown move in " + line
+            return result
+        result["kind"] = "search"
+        _engine.transposition_table.clear()
+        move = _engine.search(game_state, depth=settings["depth"], movetime=settings["movetime"])
+        result["nodes"] = _engine.nodes
+        result["solved"] = move is not None and (not best_moves or move in best_moves) and move not in avoid_moves
+        result["message"] = "played {} expected {}{}".format(
+            move.get_uci_notation() if move else "(none)",
+            " ".join(operations.get("bm", [])) or "-",
+            " avoid " + " ".join(operations["am"]) if "am" in operations else "")
+    else:
+        result["message"] = "no bm, am or D operation"
+    result["time"] = time.perf_counter() - start
+    return result
+
+
+# Run every line of the suite on a pool of processes, print the results and the totals
+def run_suite(lines, settings, processes, hash_mb, quiet=False):
+    tasks = [(number, line, settings) for number, line in enumerate(lines, 1)]
+    start = time.perf_counter()
+    if processes == 1:
+        init_worker(hash_mb)
+        results = map(run_position, tasks)
+        pool = None
+    else:
+        pool = multiprocessing.Pool(processes, initializer=init_worker, initargs=(hash_mb,))
+        # Small chunks: search positions all take about the same time, perft positions do not
+        results = pool.imap(run_position, tasks, chunksize=max(1, len(tasks) // (processes * 16)))
+
+    solved = 0
+    tested = 0
+    total_nodes = 0
+    cpu_time = 0
+    try:
+        for result in results:
+            if result["kind"] != "skip":
+                tested += 1
+                solved += result["solved"]
+                total_nodes += result["nodes"]
+                cpu_time += result["time"]
+            if not quiet or result["kind"] == "skip" or not result["solved"]:
+                status = "skip" if result["kind"] == "skip" else ("OK  " if result["solved"] else "FAIL")
+                print("{:>5} {} {:<24} {}".format(result["number"], status, result["id"][:24], result["message"]))
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
+
+    elapsed = time.perf_counter() - start
+    print("Solved {} / {} ({:.1f}%), {} skipped".format(
+        solved, tested, solved * 100 / max(tested, 1), len(tasks) - tested))
+    print("{} nodes in {:.2f}s on {} processes: {:.0f} nodes/s, {:.1f} positions/s ({:.0f} nodes/s per process)".format(
+        total_nodes, elapsed, processes, total_nodes / max(elapsed, 1e-9), len(tasks) / max(elapsed, 1e-9),
+        total_nodes / max(cpu_time, 1e-9)))
+    return solved, tested
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run an EPD test suite (best move or perft) on all cores")
+    parser.add_argument("path", help="EPD file")
+    parser.add_argument("--depth", type=int, help="search depth for bm / am positions")
+    parser.add_argument("--movetime", type=int, help="search time per bm / am position in milliseconds (default: 1000 if no depth)")
+    parser.add_argument("--perft-depth", type=int, default=4, help="deepest D operation checked in perft suites (default: 4)")
+    parser.add_argument("--backend", choices=chessEngine.BACKENDS, default="bitboard", help="move generation backend")
+    parser.add_argument("--processes", type=int, default=os.cpu_count() or 1, help="worker processes (default: all cores)")
+    parser.add_argument("--hash", type=int, default=16, help="transposition table size in MB per process")
+    parser.add_argument("--quiet", action="store_true", help="only print failed positions")
+    args = parser.parse_args()
+
+    settings = {
+        "backend": args.backend,
+        "depth": args.depth,
+        "movetime": args.movetime if args.movetime or args.depth else 1000,
+        "perft_depth": args.perft_depth
+    }
+    run_suite(read_epd_file(args.path), settings, max(1, args.processes), args.hash, args.quiet)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,211 @@
+# Static evaluation: material and piece-square tables, tapered between the middlegame and
+# the endgame. game_state keeps the running scores (mg_score, eg_score, phase) up to date
+# in make_move, so evaluate() doesn't have to look at the board.
+
+import bitbases
+import bitboard
+
+# Material in centipawns, middlegame and endgame
+MG_VALUES = {"p": 100, "N": 320, "B": 330, "R": 500, "Q": 900, "K": 0}
+EG_VALUES = {"p": 120, "N": 300, "B": 320, "R": 520, "Q": 920, "K": 0}
+
+# Game phase: 24 with all the pieces on the board (middlegame), 0 with only kings and pawns (endgame)
+PHASE_WEIGHTS = {"p": 0, "N": 1, "B": 1, "R": 2, "Q": 4, "K": 0}
+MAX_PHASE = 24
+
+# Piece-square tables from white's side, first row = 8th rank (same order as game_state.board)
+PAWN_MG = [
+      0,   0,   0,   0,   0,   0,   0,   0,
+     50,  50,  50,  50,  50,  50,  50,  50,
+     10,  10,  20,  30,  30,  20,  10,  10,
+      5,   5,  10,  25,  25,  10,   5,   5,
+      0,   0,   0,  20,  20,   0,   0,   0,
+      5,  -5, -10,   0,   0, -10,  -5,   5,
+      5,  10,  10, -20, -20,  10,  10,   5,
+      0,   0,   0,   0,   0,   0,   0,   0
+]
+PAWN_EG = [
+      0,   0,   0,   0,   0,   0,   0,   0,
+     80,  80,  80,  80,  80,  80,  80,  80,
+     50,  50,  50,  50,  50,  50,  50,  50,
+     30,  30,  30,  30,  30,  30,  30,  30,
+     20,  20,  20,  20,  20,  20,  20,  20,
+     10,  10,  10,  10,  10,  10,  10,  10,
+     10,  10,  10,  10,  10,  10,  10,  10,
+      0,   0,   0,   0,   0,   0,   0,   0
+]
+KNIGHT = [
+    -50, -40, -30, -30, -30, -30, -40, -50,
+    -40, -20,   0,   0,   0,   0, -20, -40,
+    -30,   0,  10,  15,  15,  10,   0, -30,
+    -30,   5,  15,  20,  20,  15,   5, -30,
+    -30,   0,  15,  20,  20,  15,   0, -30,
+    -30,   5,  10,  15,  15,  10,   5, -30,
+    -40, -20,   0,   5,   5,   0, -20, -40,
+    -50, -40, -30, -30, -30, -30, -40, -50
+]
+BISHOP = [
+    -20, -10, -10, -10, -10, -10, -10, -20,
+    -10,   0,   0,   0,   0,   0,   0, -10,
+    -10,   0,   5,  10,  10,   5,   0, -10,
+    -10,   5,   5,  10,  10,   5,   5, -10,
+    -10,   0,  10,  10,  10,  10,   0, -10,
+    -10,  10,  10,  10,  10,  10,  10, -10,
+    -10,   5,   0,   0,   0,   0,   5, -10,
+    -20, -10, -10, -10, -10, -10, -10, -20
+]
+ROOK = [
+      0,   0,   0,   0,   0,   0,   0,   0,
+      5,  10,  10,  10,  10,  10,  10,   5,
+     -5,   0,   0,   0,   0,   0,   0,  -5,
+     -5,   0,   0,   0,   0,   0,   0,  -5,
+     -5,   0,   0,   0,   0,   0,   0,  -5,
+     -5,   0,   0,   0,   0,   0,   0,  -5,
+     -5,   0,   0,   0,   0,   0,   0,  -5,
+      0,   0,   0,   5,   5,   0,   0,   0
+]
+QUEEN = [
+    -20, -10, -10,  -5,  -5, -10, -10, -20,
+    -10,   0,   0,   0,   0,   0,   0, -10,
+    -10,   0,   5,   5,   5,   5,   0, -10,
+     -5,   0,   5,   5,   5,   5,   0,  -5,
+      0,   0,   5,   5,   5,   5,   0,  -5,
+    -10,   5,   5,   5,   5,   5,   0, -10,
+    -10,   0,   5,   0,   0,   0,   0, -10,
+    -20, -10, -10,  -5,  -5, -10, -10, -20
+]
+KING_MG = [
+    -30, -40, -40, -50, -50, -40, -40, -30,
+    -30, -40, -40, -50, -50, -40, -40, -30,
+    -30, -40, -40, -50, -50, -40, -40, -30,
+    -30, -40, -40, -50, -50, -40, -40, -30,
+    -20, -30, -30, -40, -40, -30, -30, -20,
+    -10, -20, -20, -20, -20, -20, -20, -10,
+     20,  20,   0,   0,   0,   0,  20,  20,
+     20,  30,  10,   0,   0,  10,  30,  20
+]
+KING_EG = [
+    -50, -40, -30, -20, -20, -30, -40, -50,
+    -30, -20, -10,   0,   0, -10, -20, -30,
+    -30, -10,  20,  30,  30,  20, -10, -30,
+    -30, -10,  30,  40,  40,  30, -10, -30,
+    -30, -10,  30,  40,  40,  30, -10, -30,
+    -30, -10,  20,  30,  30,  20, -10, -30,
+    -30, -30,   0,   0,   0,   0, -30, -30,
+    -50, -30, -30, -30, -30, -30, -30, -50
+]
+
+_MG_PST = {"p": PAWN_MG, "N": KNIGHT, "B": BISHOP, "R": ROOK, "Q": QUEEN, "K": KING_MG}
+_EG_PST = {"p": PAWN_EG, "N": KNIGHT, "B": BISHOP, "R": ROOK, "Q": QUEEN, "K": KING_EG}
+
+
+"""_Incremental tables_
+
+MG_TABLES[piece][square] is material + piece-square value of the piece on the square
+(square = row * 8 + col), positive for white and negative for black. Black uses the
+white table upside down (square ^ 56 flips the row). The score of a position is the sum
+over its pieces, so a move changes it by table[piece][end] - table[piece][start], minus
+the captured piece, and make_move only adds that difference.
+"""
+
+
+def _build_tables(values, pst):
+    tables = {}
+    for piece_type in values:
+        tables["w" + piece_type] = [values[piece_type] + pst[piece_type][square] for square in range(64)]
+        tables["b" + piece_type] = [-values[piece_type] - pst[piece_type][square ^ 56] for square in range(64)]
+    return tables
+
+
+MG_TABLES = _build_tables(MG_VALUES, _MG_PST)
+EG_TABLES = _build_tables(EG_VALUES, _EG_PST)
+
+# Cross-check the incremental scores against a full recompute on every evaluate (slow)
+DEBUG = False
+
+# Extra terms computed from scratch at every evaluate: functions game_state -> (mg, eg) from
+# white's side. Empty by default, e.g. TERMS.append(mobility) turns mobility on
+TERMS = []
+
+# Look up positions with 3 pieces in the bitbases (see bitbases.py): a won position gets
+# BITBASE_WIN on top of its score, so the search goes for it and still finds the mate itself,
+# and a drawn position is 0
+USE_BITBASES = True
+BITBASE_WIN = 10000
+
+# Mobility bonus per attacked square
+MOBILITY_WEIGHTS = {"N": (4, 4), "B": (5, 5), "R": (2, 4), "Q": (1, 2)}
+
+
+# Middlegame score, endgame score and phase of a board, from scratch
+def compute_scores(board):
+    mg_score = 0
+    eg_score = 0
+    phase = 0
+    for row in range(8):
+        for col in range(8):
+            piece = board[row][col]
+            if piece != "--":
+                mg_score += MG_TABLES[piece][row * 8 + col]
+                eg_score += EG_TABLES[piece][row * 8 + col]
+                phase += PHASE_WEIGHTS[piece[1]]
+    return mg_score, eg_score, phase
+
+
+# Evaluation term: squares attacked by knights, bishops, rooks and queens (not counting own pieces)
+def mobility(game_state):
+    if game_state.backend == "bitboard":
+        bitboards = game_state.bitboards
+    else:
+        bitboards = bitboard.board_to_bitboards(game_state.board)
+    occupied = bitboard.occupancy(bitboards, bitboard.WHITE) | bitboard.occupancy(bitboards, bitboard.BLACK)
+    mg_score = 0
+    eg_score = 0
+    for color, side, sign in (("w", bitboard.WHITE, 1), ("b", bitboard.BLACK, -1)):
+        own = bitboard.occupancy(bitboards, side)
+        for piece_type, (mg_weight, eg_weight) in MOBILITY_WEIGHTS.items():
+            for square in bitboard.squares_of(bitboards[bitboard.PIECE_INDEX[color + piece_type]]):
+                if piece_type == "N":
+                    attacks = bitboard.KNIGHT_ATTACKS[square]
+                elif piece_type == "B":
+                    attacks = bitboard.bishop_attacks(square, occupied)
+                elif piece_type == "R":
+                    attacks = bitboard.rook_attacks(square, occupied)
+                else:
+                    attacks = bitboard.queen_attacks(square, occupied)
+                count = bitboard.count_bits(attacks & ~own)
+                mg_score += sign * mg_weight * count
+                eg_score += sign * eg_weight * count
+    return mg_score, eg_score
+
+
+# Score of the position for the side to move, in centipawns
+def evaluate(game_state):
+    mg_score = game_state.mg_score
+    eg_score = game_state.eg_score
+    phase = game_state.phase
+
+    if DEBUG:
+        expected = compute_scores(game_state.board)
+        if expected != (mg_score, eg_score, phase):
+            raise AssertionError("Incremental evaluation {} differs from recompute {} in {}".format(
+                (mg_score, eg_score, phase), expected, game_state.get_fen()))
+
+    for term in TERMS:
+        term_mg, term_eg = term(game_state)
+        mg_score += term_mg
+        eg_score += term_eg
+
+    # Tapered: blend the two scores by how much material is left (promotions can go over 24)
+    # Rounded from the side to move, so a position and its color-flipped mirror get the same score
+    phase = min(phase, MAX_PHASE)
+    score = mg_score * phase + eg_score * (MAX_PHASE - phase)
+    score = (score if game_state.turn == "w" else -score) // MAX_PHASE
+
+    if USE_BITBASES and game_state.piece_count == 3:
+        result = bitbases.probe(game_state)
+        if result == bitbases.DRAW:
+            return 0
+        if result is not None:
+            score += result * BITBASE_WIN
+    return score
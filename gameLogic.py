@@ -1,138 +1,228 @@
+import os
+
 import pygame as pg
 import chessEngine
+import engine_worker
+import opening_book
 
 # BASIC SETUP FOR GAME
 WIDTH = HEIGHT = 512
 DIMENSION = 8
 SIZE = HEIGHT // DIMENSION
-FPS = 60
 IMAGES = {}
 CLICK_COOLDOWN = False
+ASSETS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "assets")
 
-# To load the piece images
-def load_image():
-    pieces_list = ["bB", "bK", "bN", "bp", "bQ", "bR", "wB", "wK", "wN", "wp", "wQ", "wR"]
-    for piece in pieces_list:
-        IMAGES[piece] = pg.transform.scale(pg.image.load("assets/" + piece + ".png"), (SIZE, SIZE))
-
-# Draw the current game state     
-def draw_game_state(screen, game_state, selected_square, valid_move):
-    draw_board(screen, selected_square, game_state, valid_move)
-    draw_pieces(screen, game_state.board)
-
-# Draw the board, including drawing selected cells and possible move for the selected piece
-def draw_board(screen, selected_square, game_state, valid_move):
-    colors = [pg.Color("white"), pg.Color("light green")]
-    selected_color =[pg.Color("dark gray"), pg.Color("dark green")]
-    for row in range(DIMENSION):
-        for col in range(DIMENSION):
-            color = colors[(row + col) % 2]
-            pg.draw.rect(screen, color, pg.Rect(col * SIZE, row * SIZE, SIZE, SIZE)) 
+# Playing against the engine: info panel under the board, and the pygame event that
+# brings the messages of the engine worker into the main loop
+PANEL_HEIGHT = 48
+ENGINE_EVENT = pg.event.custom_type()
+
+# To load a piece image the first time it is drawn, then keep it in IMAGES
+def load_image(piece):
+    if piece not in IMAGES:
+        IMAGES[piece] = pg.transform.scale(pg.image.load(os.path.join(ASSETS_DIR, piece + ".png")), (SIZE, SIZE))
+    return IMAGES[piece]
+
+"""_Rendering_
+
+Nothing is drawn again unless it changed. The light / dark squares are drawn once into
+BOARD_SURFACE, and drawn[row][col] remembers what every square of the screen shows
+(highlighted or not, and the piece). draw_game_state only redraws the squares whose
+look changed since the last frame and returns their rects, and only these are sent to
+the screen with pg.display.update(rects).
+
+The main loop blocks in pg.event.wait() until something happens (a click, a key, the
+window being shown again), so an idle window uses no CPU.
+"""
+
+# Light and dark squares of the board, drawn once by get_board_surface
+BOARD_SURFACE = None
+
+# Draw the empty board once, then reuse it
+def get_board_surface():
+    global BOARD_SURFACE
+    if BOARD_SURFACE is None:
+        colors = [pg.Color("white"), pg.Color("light green")]
+        BOARD_SURFACE = pg.Surface((WIDTH, HEIGHT))
+        for row in range(DIMENSION):
+            for col in range(DIMENSION):
+                pg.draw.rect(BOARD_SURFACE, colors[(row + col) % 2], pg.Rect(col * SIZE, row * SIZE, SIZE, SIZE))
+    return BOARD_SURFACE
+
+# Nothing drawn yet: every square will be redrawn by the next draw_game_state
+def new_drawn_squares():
+    return [[None] * DIMENSION for _ in range(DIMENSION)]
+
+# What every square should show: (highlighted, piece). The selected piece and the end squares
+# of its moves are highlighted (they come from the game_state's move cache)
+def get_square_states(game_state, selected_square):
+    highlighted = set()
     if len(selected_square) == 2:
         row = selected_square[0]
-        col = selected_square[1]  
-        piece_color = game_state.board[row][col][0]
-        piece_type = game_state.board[row][col][1]
-        if piece_color == game_state.turn:
-            color = selected_color[(row + col) % 2]
-            pg.draw.rect(screen, color, pg.Rect(col * SIZE, row * SIZE, SIZE, SIZE))
-            possible_move = []
-            game_state.get_move[piece_type](row, col, possible_move)
-            for index in possible_move:
-                if index in valid_move:
-                    possible_move_color = selected_color[(index.end_row + index.end_col) % 2]
-                    pg.draw.rect(screen, possible_move_color, pg.Rect(index.end_col * SIZE, index.end_row * SIZE, SIZE, SIZE))
-
-# Draw the piece
-def draw_pieces(screen, board):
+        col = selected_square[1]
+        if game_state.board[row][col][0] == game_state.turn:
+            highlighted.add((row, col))
+            highlighted |= game_state.get_destinations(row, col)
+    return [[((row, col) in highlighted, game_state.board[row][col]) for col in range(DIMENSION)] for row in range(DIMENSION)]
+
+# Draw one square: the board under it, the highlight, then the piece
+def draw_square(screen, row, col, highlighted, piece):
+    selected_color = [pg.Color("dark gray"), pg.Color("dark green")]
+    rect = pg.Rect(col * SIZE, row * SIZE, SIZE, SIZE)
+    screen.blit(get_board_surface(), rect, rect)
+    if highlighted:
+        pg.draw.rect(screen, selected_color[(row + col) % 2], rect)
+    if piece != "--":
+        screen.blit(load_image(piece), rect)
+    return rect
+
+# Redraw the squares that changed since the last call, and return their rects for pg.display.update
+def draw_game_state(screen, game_state, selected_square, drawn):
+    states = get_square_states(game_state, selected_square)
+    rects = []
     for row in range(DIMENSION):
         for col in range(DIMENSION):
-            piece = board[row][col]
-            if piece != "--":
-                screen.blit(IMAGES[piece], pg.Rect(col * SIZE, row * SIZE, SIZE, SIZE))
-
-# Draw the promotion GUI            
-def draw_promotion_state(screen, game_state):
-    row = game_state.pawn_promotion[1][0]
-    col = game_state.pawn_promotion[1][1]
-    white_piece_type = {
-        0: "wQ",
-        1: "wR",
-        2: "wB",
-        3: "wN"
-    }
-    black_piece_type = {
-        0: "bQ",
-        1: "bR",
-        2: "bB",
-        3: "bN"
-    }
-    piece_selected = []
-    clock = pg.time.Clock()
-    # game_state.board[row][col] = game_state.board[row][col][0] + "Q"
+            if drawn[row][col] != states[row][col]:
+                rects.append(draw_square(screen, row, col, *states[row][col]))
+                drawn[row][col] = states[row][col]
+    return rects
+
+# Draw the promotion GUI and return the piece type the player picked (waits for the click),
+# None if the window is closed meanwhile
+def draw_promotion_state(screen, move, drawn):
+    row = move.end_row
+    col = move.end_col
+    color = "w" if row == 0 else "b"
+    # The 4 choices go from the promotion square towards the middle of the board
+    direction = 1 if row == 0 else -1
+    rects = []
+    for i, piece_type in enumerate("QRBN"):
+        rect = pg.Rect(col * SIZE, (row + direction * i) * SIZE, SIZE, SIZE)
+        pg.draw.rect(screen, "purple", rect)
+        screen.blit(load_image(color + piece_type), rect)
+        rects.append(rect)
+        # The board has to be drawn again there after the choice
+        drawn[row + direction * i][col] = None
+    pg.display.update(rects)
+    
     while True:
-        if row == 0:
-            for i in range(4):
-                pg.draw.rect(screen, "purple", pg.Rect(col * SIZE, (row + i) * SIZE, SIZE, SIZE))
-                screen.blit(IMAGES[white_piece_type[i]], pg.Rect(col * SIZE, (row + i) * SIZE, SIZE, SIZE))
-                for event in pg.event.get():
-                    if event.type == pg.MOUSEBUTTONDOWN:
-                        location = pg.mouse.get_pos()
-                        c = location[0] // SIZE
-                        r = location[1] // SIZE
-                        if ((row == 0 and 0 <= r <= 3)) and c == col:
-                            piece_selected.append(white_piece_type[r])
-        
-        elif row == 7:
-            for i in range(4):
-                pg.draw.rect(screen, "purple", pg.Rect(col * SIZE, (row - i) * SIZE, SIZE, SIZE))
-                screen.blit(IMAGES[black_piece_type[i]], pg.Rect(col * SIZE, (row - i) * SIZE, SIZE, SIZE))
-                for event in pg.event.get():
-                    if event.type == pg.MOUSEBUTTONDOWN:
-                        location = pg.mouse.get_pos()
-                        c = location[0] // SIZE
-                        r = location[1] // SIZE
-                        if (7 >= r >= 4 and row == 7) and c == col:
-                            piece_selected.append(black_piece_type[7 - r])
-            
-        if len(piece_selected) > 0:
-            game_state.board[row][col] = piece_selected[0]
-            break
-        clock.tick(FPS)
-        pg.display.flip()
-
-# MAIN FUNCTION           
-def main():
+        event = pg.event.wait()
+        if event.type == pg.QUIT:
+            return None
+        if event.type == pg.MOUSEBUTTONDOWN:
+            c = event.pos[0] // SIZE
+            r = event.pos[1] // SIZE
+            if c == col and 0 <= (r - row) * direction <= 3:
+                return "QRBN"[(r - row) * direction]
+
+# Draw the lines of the engine info panel under the board, returns its rect
+def draw_info_panel(screen, font, lines):
+    rect = pg.Rect(0, HEIGHT, WIDTH, PANEL_HEIGHT)
+    pg.draw.rect(screen, pg.Color("gray20"), rect)
+    for i, line in enumerate(lines):
+        screen.blit(font.render(line, True, pg.Color("white")), (6, HEIGHT + 4 + i * 22))
+    return rect
+
+# Info panel lines for an info of the engine (score from the engine's side, in pawns)
+def format_engine_info(info):
+    score = "mate {}".format(info["mate"]) if info["mate"] is not None else "{:+.2f}".format(info["score"] / 100)
+    return ["depth {}  score {}  nodes {}  nps {}".format(info["depth"], score, info["nodes"], info["nps"]),
+            "pv " + " ".join(info["pv"])]
+
+# MAIN FUNCTION (book_path: Polyglot opening book, press B to play a book move)
+# engine_color: "w" or "b" to play against the engine, which thinks movetime ms per move
+# in a worker process (Space: move now, Esc: cancel, G: think again)
+def main(book_path=None, engine_color=None, movetime=1000):
+    book = opening_book.opening_book(book_path) if book_path else None
     pg.init()
-    screen = pg.display.set_mode((WIDTH, HEIGHT))
-    clock = pg.time.Clock()
-    screen.fill(pg.Color("white"))
+    screen = pg.display.set_mode((WIDTH, HEIGHT + (PANEL_HEIGHT if engine_color else 0)))
     game_state = chessEngine.game_state()
-    load_image()
+    
+    # The engine worker posts its messages as pygame events (from its reader thread)
+    engine = None
+    if engine_color is not None:
+        engine = engine_worker.engine_worker(lambda message: pg.event.post(pg.event.Event(ENGINE_EVENT, message=message)))
+        font = pg.font.Font(None, 22)
+        panel_lines = ["Your move", ""]
+        panel_changed = True
+    # Set while waiting for the engine's move, and after a cancel until G is pressed
+    engine_thinking = False
+    engine_paused = False
+    
+    # What is on the screen, see _Rendering_
+    drawn = new_drawn_squares()
     
     # For selecting cell and push the valid selected cell into buffer 
     selected_square = []
     selected_buffer = []
     
-    # Load every possible move at first for opening
-    valid_move = game_state.get_valid_move()
+    # Every valid move of the position keyed by move id (cached by game_state until the next move)
+    valid_move = game_state.get_move_cache()[0]
     
     # For checking if the move is made or not
     move_made = False
     
     # For running the game
     game_running = True
-    
+
+    # First frame: the whole board, sent to the screen by an expose event (which also
+    # lets the loop start the engine's search if it plays white)
+    draw_game_state(screen, game_state, selected_square, drawn)
+    pg.event.post(pg.event.Event(pg.VIDEOEXPOSE))
+
     # MAIN GAME
     while game_running:
-        for event in pg.event.get():
+        # Sleep until the next event, then handle it with the ones that came with it
+        for event in [pg.event.wait()] + pg.event.get():
             if event.type == pg.QUIT:
                 game_running = False
+            elif event.type in (pg.VIDEOEXPOSE, pg.WINDOWEXPOSED):
+                # The window was hidden: send the whole screen again
+                pg.display.flip()
+            elif event.type == ENGINE_EVENT:
+                message = event.message
+                # Messages of a cancelled search can still be in the event queue
+                if not engine_thinking or not engine.is_current(message):
+                    continue
+                if message[0] == "info":
+                    panel_lines = format_engine_info(message[2])
+                else:
+                    engine_thinking = False
+                    move = game_state.get_uci_move(message[2]) if message[2] is not None else None
+                    if move is not None:
+                        game_state.make_move(move)
+                        move_made = True
+                panel_changed = True
+            elif event.type == pg.KEYDOWN and engine_thinking and event.key == pg.K_SPACE:
+                engine.move_now()
+            elif event.type == pg.KEYDOWN and engine_thinking and event.key == pg.K_ESCAPE:
+                engine.cancel()
+                engine_thinking = False
+                engine_paused = True
+                panel_lines = ["Cancelled, press G to let the engine think again", ""]
+                panel_changed = True
+            elif event.type == pg.KEYDOWN and engine_paused and event.key == pg.K_g:
+                engine_paused = False
+            elif engine is not None and game_state.turn == engine_color:
+                # Not the player's turn: no moves from the mouse or the book
+                continue
+            elif event.type == pg.KEYDOWN and event.key == pg.K_b and book is not None:
+                move = book.get_move(game_state)
+                if move is not None:
+                    game_state.make_move(move)
+                    move_made = True
+                else:
+                    print("No book move")
+                selected_square = []
+                selected_buffer = []
             elif event.type == pg.MOUSEBUTTONUP:
                 # Get the location of the mouse for selecting pieces
                 location = pg.mouse.get_pos()
                 col = location[0] // SIZE
                 row = location[1] // SIZE
+                if row >= DIMENSION:
+                    continue
                 piece_type = game_state.board[row][col][0]
                 
                 # If the selected piece is the same color as the player turn or there is already a cell in buffer
@@ -152,11 +242,20 @@ def main():
                         move = chessEngine.Move(selected_buffer[0], selected_buffer[1], game_state.board)
                         
                         # If the move is valid
-                        if move in valid_move:
+                        if move.move_id in valid_move:
+                            
+                            # Let the player pick the promotion piece before making the move
+                            if move.is_pawn_promotion:
+                                promotion = draw_promotion_state(screen, move, drawn)
+                                move = chessEngine.Move(selected_buffer[0], selected_buffer[1], game_state.board, promotion) if promotion else None
                             
-                            # Make the move
-                            game_state.make_move(move)
-                            move_made = True
+                            # Make the move (castling, en passant and promotion are done by make_move),
+                            # the window was closed if there is no move
+                            if move is not None:
+                                game_state.make_move(move)
+                                move_made = True
+                            else:
+                                game_running = False
                             
                         # Clear buffer anyway
                         selected_square = []
@@ -164,33 +263,30 @@ def main():
         
         # If the move is made    
         if move_made:
-            # Relocate the location of KING
-            for row in range(len(game_state.board)):
-                for col in range(len(game_state.board[row])):
-                    if game_state.board[row][col] == "bK":
-                        game_state.black_king_location = (row, col)
-                    if game_state.board[row][col] == "wK":
-                        game_state.white_king_location = (row, col)
-            
-            # For checking castle move, en passant move or promotion move
-            game_state.castling_move()
-            game_state.en_passant_move()        
-            game_state.check_promotion()
-            if game_state.pawn_promotion[0]:
-                draw_promotion_state(screen, game_state)
-                game_state.pawn_promotion = [False, (-1, -1)]
-                
-            game_state.check_en_passant()
-            
             # Get all the valid move after the move was made
-            valid_move = game_state.get_valid_move()
+            valid_move = game_state.get_move_cache()[0]
             move_made = False
             
             # For checking endgame
             game_running = not game_state.checking_endgame(valid_move)
             print(game_state.move_log[-1].get_chess_notation() + ": " + str(game_state.piece_count))
         
-        # Draw the game
-        draw_game_state(screen, game_state, selected_square, valid_move)
-        clock.tick(FPS)
-        pg.display.flip()
+        # The engine's turn: start its search, the answer comes back as an ENGINE_EVENT
+        if engine is not None and game_running and game_state.turn == engine_color and not engine_thinking and not engine_paused:
+            engine.search(game_state, movetime=movetime)
+            engine_thinking = True
+            panel_lines = ["Thinking...  (Space: move now, Esc: cancel)", ""]
+            panel_changed = True
+        
+        # Draw what changed
+        rects = draw_game_state(screen, game_state, selected_square, drawn)
+        if engine is not None and panel_changed:
+            rects.append(draw_info_panel(screen, font, panel_lines))
+            panel_changed = False
+        if rects:
+            pg.display.update(rects)
+    
+    if book is not None:
+        book.close()
+    if engine is not None:
+        engine.close()
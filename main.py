@@ -1,4 +1,11 @@
+import argparse
+
 import gameLogic
 
 if __name__ == "__main__":
-    gameLogic.main()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Chess game")
+    parser.add_argument("--book", help="Polyglot opening book (.bin), press B in the game to play a book move")
+    parser.add_argument("--engine", choices=["white", "black"], help="play against the engine, which plays this color")
+    parser.add_argument("--movetime", type=int, default=1000, help="engine thinking time per move in ms (default: 1000)")
+    args = parser.parse_args()
+    gameLogic.main(args.book, args.engine[0] if args.engine else None, args.movetime)
@@ -0,0 +1,146 @@
+import mmap
+import random
+import struct
+
+import polyglot_random
+
+"""_Polyglot opening books_
+
+A Polyglot .bin book is a list of 16-byte entries sorted by key, big-endian:
+    key     8 bytes  Polyglot Zobrist key of the position (see polyglot_key)
+    move    2 bytes  bits 0-2 to file, 3-5 to rank, 6-8 from file, 9-11 from rank,
+                     12-14 promotion (0 none, 1 knight, 2 bishop, 3 rook, 4 queen)
+    weight  2 bytes  how good / how often played the move is
+    learn   4 bytes  (not used)
+Castling is written as the king taking its own rook (e1h1, e1a1, e8h8, e8a8).
+
+The file is memory-mapped and the entries of a position are found by binary search on
+the key, so opening a big book costs no load time and no memory: the OS only reads the
+pages we touch.
+"""
+
+ENTRY_SIZE = 16
+ENTRY_FORMAT = ">QHHI"
+
+# Polyglot piece kind of every game_state piece
+PIECE_KINDS = {"bp": 0, "wp": 1, "bN": 2, "wN": 3, "bB": 4, "wB": 5,
+               "bR": 6, "wR": 7, "bQ": 8, "wQ": 9, "bK": 10, "wK": 11}
+PROMOTION_PIECES = ("", "N", "B", "R", "Q")
+
+# Polyglot castling moves (king takes rook) in our notation
+CASTLING_MOVES = {"e1h1": "e1g1", "e1a1": "e1c1", "e8h8": "e8g8", "e8a8": "e8c8"}
+
+# How to pick a move from the book entries: at random by weight, or always the heaviest
+SELECTION_MODES = ("weighted", "best")
+
+
+# Polyglot key of the position of a game_state (not the same as game_state.zobrist_key)
+def polyglot_key(game_state):
+    random64 = polyglot_random.RANDOM64
+    board = game_state.board
+    key = 0
+    for row in range(8):
+        for col in range(8):
+            piece = board[row][col]
+            if piece != "--":
+                key ^= random64[64 * PIECE_KINDS[piece] + 8 * (7 - row) + col]
+
+    if not game_state.white_king_moved and not game_state.white_king_rook_moved:
+        key ^= random64[768]
+    if not game_state.white_king_moved and not game_state.white_queen_rook_moved:
+        key ^= random64[769]
+    if not game_state.black_king_moved and not game_state.black_king_rook_moved:
+        key ^= random64[770]
+    if not game_state.black_king_moved and not game_state.black_queen_rook_moved:
+        key ^= random64[771]
+
+    # En passant only counts when a pawn of the side to move stands next to the pawn that moved
+    if game_state.en_passant[0]:
+        row, col = game_state.en_passant[2]
+        capturer = game_state.turn + "p"
+        if (col > 0 and board[row][col - 1] == capturer) or (col < 7 and board[row][col + 1] == capturer):
+            key ^= random64[772 + col]
+
+    if game_state.turn == "w":
+        key ^= random64[780]
+    return key
+
+
+# Polyglot move to UCI notation ("e2e4", "e7e8q", castling as "e1g1") in the position of board.
+# e1h1 is only castling when a king stands on e1, else it is a move of another piece (a rook)
+def decode_move(move, board):
+    from_col = move >> 6 & 7
+    from_row = 7 - (move >> 9 & 7)
+    notation = "{}{}{}{}".format("abcdefgh"[from_col], 8 - from_row, "abcdefgh"[move & 7], (move >> 3 & 7) + 1)
+    if notation in CASTLING_MOVES and board[from_row][from_col][1] == "K":
+        notation = CASTLING_MOVES[notation]
+    return notation + PROMOTION_PIECES[move >> 12 & 7].lower()
+
+
+class opening_book():
+    # mode: "weighted" or "best" (see SELECTION_MODES)
+    def __init__(self, path, mode="weighted"):
+        if mode not in SELECTION_MODES:
+            raise ValueError("Unknown book selection mode: " + str(mode))
+        self.path = path
+        self.mode = mode
+        self.random = random.Random()
+        self.file = open(path, "rb")
+        self.size = self.file.seek(0, 2) // ENTRY_SIZE
+        # An empty file can't be mapped, it's just a book without entries
+        self.data = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ) if self.size else b""
+
+    def close(self):
+        if self.size:
+            self.data.close()
+        self.file.close()
+
+    def __len__(self):
+        return self.size
+
+    def get_key(self, index):
+        return struct.unpack_from(">Q", self.data, index * ENTRY_SIZE)[0]
+
+    # Index of the first entry with this key or a bigger one
+    def find_first(self, key):
+        low, high = 0, self.size
+        while low < high:
+            middle = (low + high) // 2
+            if self.get_key(middle) < key:
+                low = middle + 1
+            else:
+                high = middle
+        return low
+
+    # Every (move in UCI notation, weight) of the book for the position
+    def get_entries(self, game_state):
+        key = polyglot_key(game_state)
+        entries = []
+        index = self.find_first(key)
+        while index < self.size:
+            entry_key, move, weight, learn = struct.unpack_from(ENTRY_FORMAT, self.data, index * ENTRY_SIZE)
+            if entry_key != key:
+                break
+            entries.append((decode_move(move, game_state.board), weight))
+            index += 1
+        return entries
+
+    # A book move for the game_state (a valid Move of it), None if the position is not in the book
+    def get_move(self, game_state):
+        entries = []
+        for notation, weight in self.get_entries(game_state):
+            move = game_state.get_uci_move(notation)
+            if move is not None:
+                entries.append((move, weight))
+        if len(entries) == 0:
+            return None
+        if self.mode == "best":
+            return max(entries, key=lambda entry: entry[1])[0]
+        total = sum(weight for move, weight in entries)
+        if total == 0:
+            return self.random.choice(entries)[0]
+        pick = self.random.randrange(total)
+        for move, weight in entries:
+            pick -= weight
+            if pick < 0:
+                return move
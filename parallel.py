@@ -0,0 +1,190 @@
+import argparse
+import multiprocessing
+import os
+import time
+
+import chessEngine
+import search
+
+"""_Root splitting_
+
+Python threads can't run move generation on two cores at once (GIL), so we use processes.
+The moves of the root position are independent subtrees: every worker process gets
+a few of them and searches them on its own game_state.
+
+Workers never get a pickled game_state, only the position string of
+game_state.get_position() (start FEN + moves) and the moves of the subtree, and they
+rebuild the position themselves. The pool is started once per call, every worker keeps
+one game_state per position and one search_engine (with its transposition table) for all
+its tasks.
+
+Perft: with few root moves for many processes the subtrees are split again at the second
+ply, so the work is cut into enough pieces to keep every core busy until the end.
+
+Search: every depth starts with the best move of the previous depth, searched alone with
+the full window. Its score is the alpha for all the other root moves, which are then
+searched at the same time: a move that can't beat alpha fails low quickly, a move that
+does gets its exact score. So we keep most of the alpha-beta cutoffs of the serial search.
+"""
+
+# Split perft at the second ply when there are less than this many root moves per process
+TASKS_PER_PROCESS = 4
+
+# State of a worker process
+_backend = "board"
+_engine = None
+_game_state = None
+_position = None
+
+
+def init_worker(backend, hash_mb):
+    global _backend, _engine
+    _backend = backend
+    _engine = search.search_engine(hash_mb)
+
+
+# The game_state of the position, rebuilt only when the worker gets a new position
+def get_worker_state(position):
+    global _game_state, _position
+    if position != _position:
+        _game_state = chessEngine.game_state(_backend)
+        _game_state.load_position(position)
+        _position = position
+    return _game_state
+
+
+# Perft of the subtree after the given moves (in UCI notation), returns (moves, nodes)
+def perft_task(task):
+    position, moves, depth = task
+    game_state = get_worker_state(position)
+    for notation in moves:
+        game_state.make_move(game_state.get_uci_move(notation))
+    nodes = game_state.perft(depth)
+    for _ in moves:
+        game_state.unmake_move()
+    return moves, nodes
+
+
+# Search one root move, returns (move, score, pv, nodes)
+def search_task(task):
+    position, notation, depth, alpha = task
+    game_state = get_worker_state(position)
+    score, pv = _engine.search_root_move(game_state, game_state.get_uci_move(notation), depth, alpha)
+    return notation, score, [move.get_uci_notation() for move in pv], _engine.nodes
+
+
+def create_pool(processes, backend, hash_mb=16):
+    return multiprocessing.Pool(processes, initializer=init_worker, initargs=(backend, hash_mb))
+
+
+# Perft of the game_state split across processes, returns {root move in UCI: nodes}
+def parallel_perft_divide(game_state, depth, processes=None):
+    processes = processes or os.cpu_count() or 1
+    position = game_state.get_position()
+    root_moves = game_state.get_valid_move()
+    if depth <= 1:
+        return {move.get_uci_notation(): 1 for move in root_moves}
+
+    tasks = []
+    for move in root_moves:
+        if len(root_moves) < processes * TASKS_PER_PROCESS and depth >= 3:
+            game_state.make_move(move)
+            for reply in game_state.get_valid_move():
+                tasks.append((position, (move.get_uci_notation(), reply.get_uci_notation()), depth - 2))
+            game_state.unmake_move()
+        else:
+            tasks.append((position, (move.get_uci_notation(),), depth - 1))
+
+    result = {move.get_uci_notation(): 0 for move in root_moves}
+    with create_pool(processes, game_state.backend) as pool:
+        for moves, nodes in pool.imap_unordered(perft_task, tasks):
+            result[moves[0]] += nodes
+    return result
+
+
+def parallel_perft(game_state, depth, processes=None):
+    return sum(parallel_perft_divide(game_state, depth, processes).values())
+
+
+# Fixed-depth search with the root moves split across processes
+# Returns (best move, score, pv in UCI notation), info_callback gets a dict after every depth
+def parallel_search(game_state, depth, processes=None, hash_mb=16, info_callback=None):
+    processes = processes or os.cpu_count() or 1
+    position = game_state.get_position()
+    root_moves = game_state.get_valid_move_dict()
+    if len(root_moves) == 0:
+        return None, 0, []
+    order = [move.get_uci_notation() for move in root_moves.values()]
+    moves_by_notation = {move.get_uci_notation(): move for move in root_moves.values()}
+    best_score = 0
+    pv = []
+    nodes = 0
+    start = time.perf_counter()
+
+    with create_pool(processes, game_state.backend, hash_mb) as pool:
+        for current_depth in range(1, depth + 1):
+            # The best move of the last depth first, alone, to get a good alpha
+            notation, best_score, pv, first_nodes = pool.apply(search_task, ((position, order[0], current_depth, -search.INFINITY),))
+            nodes += first_nodes
+            scores = {notation: best_score}
+
+            tasks = [(position, notation, current_depth, best_score) for notation in order[1:]]
+            for notation, score, move_pv, move_nodes in pool.imap_unordered(search_task, tasks):
+                nodes += move_nodes
+                scores[notation] = score
+                if score > best_score:
+                    best_score = score
+                    pv = move_pv
+
+            # Next depth: best move first, then the others by score (fail-low scores are only bounds)
+            order.sort(key=lambda notation: scores[notation], reverse=True)
+            order.remove(pv[0])
+            order.insert(0, pv[0])
+
+            if info_callback is not None:
+                elapsed = time.perf_counter() - start
+                info_callback({
+                    "depth": current_depth,
+                    "score": best_score,
+                    "nodes": nodes,
+                    "time": int(elapsed * 1000),
+                    "nps": int(nodes / elapsed) if elapsed > 0 else 0,
+                    "pv": pv
+                })
+            if search.is_mate_score(best_score) and search.MATE_SCORE - abs(best_score) <= current_depth:
+                break
+
+    return moves_by_notation[pv[0]], best_score, pv
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Perft or fixed-depth search with the root moves split across processes")
+    parser.add_argument("mode", choices=("perft", "search"))
+    parser.add_argument("--depth", type=int, default=4, help="depth (default: 4)")
+    parser.add_argument("--fen", default=chessEngine.START_FEN, help="position (default: initial position)")
+    parser.add_argument("--backend", choices=chessEngine.BACKENDS, default="bitboard", help="move generation backend")
+    parser.add_argument("--processes", type=int, default=os.cpu_count() or 1, help="worker processes (default: all cores)")
+    parser.add_argument("--hash", type=int, default=16, help="transposition table size in MB per process")
+    args = parser.parse_args()
+
+    game_state = chessEngine.game_state(args.backend, args.fen)
+    start = time.perf_counter()
+    if args.mode == "perft":
+        result = parallel_perft_divide(game_state, args.depth, args.processes)
+        for move in sorted(result):
+            print(move + ": " + str(result[move]))
+        nodes = sum(result.values())
+        elapsed = time.perf_counter() - start
+        print("\nMoves: {}\nNodes: {}\nTime: {:.2f}s ({:.0f} nodes/s on {} processes)".format(
+            len(result), nodes, elapsed, nodes / max(elapsed, 1e-9), args.processes))
+    else:
+        def print_info(info):
+            print("depth {} score {} nodes {} time {} nps {} pv {}".format(
+                info["depth"], info["score"], info["nodes"], info["time"], info["nps"], " ".join(info["pv"])))
+
+        move, score, pv = parallel_search(game_state, args.depth, args.processes, args.hash, print_info)
+        print("bestmove " + (move.get_uci_notation() if move else "(none)"))
+
+
+if __name__ == "__main__":
+    main()
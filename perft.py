@@ -0,0 +1,76 @@
+import argparse
+import time
+
+import chessEngine
+
+# Reference positions with their known perft node counts (depth 1, 2, 3, ...)
+REFERENCE_POSITIONS = [
+    ("Initial position", "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1",
+     [20, 400, 8902, 197281, 4865609, 119060324]),
+    ("Kiwipete", "r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1",
+     [48, 2039, 97862, 4085603, 193690690]),
+    ("Position 3", "8/2p5/3p4/KP5r/1R3p1k/8/4P1P1/8 w - - 0 1",
+     [14, 191, 2812, 43238, 674624, 11030083]),
+    ("Position 4", "r3k2r/Pppp1ppp/1b3nbN/nP6/BBP1P3/q4N2/Pp1P2PP/R2Q1RK1 w kq - 0 1",
+     [6, 264, 9467, 422333, 15833292]),
+    ("Position 4 mirrored", "r2q1rk1/pP1p2pp/Q4n2/bbp1p3/Np6/1B3NBn/pPPP1PPP/R3K2R b KQ - 0 1",
+     [6, 264, 9467, 422333, 15833292]),
+    ("Position 5", "rnbq1k1r/pp1Pbppp/2p5/8/2B5/8/PPP1NnPP/RNBQK2R w KQ - 1 8",
+     [44, 1486, 62379, 2103487, 89941194]),
+    ("Position 6", "r4rk1/1pp1qppp/p1np1n2/2b1p1B1/2B1P1b1/P1NP1N2/1PP1QPPP/R4RK1 w - - 0 10",
+     [46, 2079, 89890, 3894594, 164075551]),
+]
+
+
+# Run every reference position up to the given depth, return True if every count is right
+def run_suite(depth, backend):
+    total_nodes = 0
+    total_time = 0
+    all_passed = True
+    for name, fen, expected in REFERENCE_POSITIONS:
+        game_state = chessEngine.game_state(backend)
+        game_state.load_fen(fen)
+        for d in range(1, min(depth, len(expected)) + 1):
+            start = time.perf_counter()
+            nodes = game_state.perft(d)
+            elapsed = time.perf_counter() - start
+            total_nodes += nodes
+            total_time += elapsed
+            passed = nodes == expected[d - 1]
+            all_passed = all_passed and passed
+            print("{:<20} depth {} {:>10} nodes (expected {:>10}) {} {:8.2f}s {:>9.0f} nodes/s".format(
+                name, d, nodes, expected[d - 1], "OK  " if passed else "FAIL", elapsed, nodes / max(elapsed, 1e-9)))
+    print("Total: {} nodes in {:.2f}s, {:.0f} nodes/s ({} backend)".format(
+        total_nodes, total_time, total_nodes / max(total_time, 1e-9), backend))
+    print("All counts correct" if all_passed else "Some counts are WRONG")
+    return all_passed
+
+
+# Perft of a single position, split by root move
+def run_divide(fen, depth, backend):
+    game_state = chessEngine.game_state(backend)
+    game_state.load_fen(fen)
+    start = time.perf_counter()
+    result = game_state.perft_divide(depth)
+    elapsed = time.perf_counter() - start
+    for move in sorted(result):
+        print(move + ": " + str(result[move]))
+    nodes = sum(result.values())
+    print("\nMoves: {}\nNodes: {}\nTime: {:.2f}s ({:.0f} nodes/s)".format(len(result), nodes, elapsed, nodes / max(elapsed, 1e-9)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Perft correctness suite and move generation benchmark")
+    parser.add_argument("--depth", type=int, default=3, help="maximum depth (default: 3)")
+    parser.add_argument("--backend", choices=chessEngine.BACKENDS, default="board", help="move generation backend")
+    parser.add_argument("--fen", help="run perft divide on this position instead of the reference suite")
+    args = parser.parse_args()
+    
+    if args.fen:
+        run_divide(args.fen, args.depth, args.backend)
+    elif not run_suite(args.depth, args.backend):
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,199 @@
+import argparse
+import collections
+import itertools
+import multiprocessing
+import os
+import re
+import time
+
+import chessEngine
+
+"""_PGN games_
+
+A PGN file is a list of games. Every game has tag pairs, then the movetext:
+
+    [Event "Casual game"]
+    [White "A"]
+    [Black "B"]
+    [Result "1-0"]
+
+    1. e4 e5 2. Nf3 {a comment} Nc6 (2... d6 3. d4) 3. Bb5 $1 a6 1-0
+
+The movetext has move numbers, moves in SAN, comments ({...} or ; to the end of the
+line), variations in parentheses, NAGs ($1) and the result at the end. A game with a
+FEN tag starts from that position instead of the normal one.
+
+read_games reads the file one line at a time and yields one game at a time, so a file of
+any size takes the memory of one game. Every SAN move is looked up in the valid moves of
+the position (game_state.get_san_move) and played with make_move; the first move that is
+not valid ends the replay of the game with an error.
+
+Games don't depend on each other, so replay_games can give them to a pool of processes.
+The games are sent in chunks and only a few chunks are in flight at any time: the file
+is read just ahead of the workers and the memory use stays the same whatever its size.
+"""
+
+RESULTS = ("1-0", "0-1", "1/2-1/2", "*")
+# Endings of get_game_end that end the game by themselves (the draw rules have to be claimed)
+FORCED_ENDS = ("checkmate", "stalemate", "insufficient materials")
+TAG_PAIR = re.compile(r'\[\s*(\w+)\s+"((?:[^"\\]|\\.)*)"\s*\]')
+# Comment, rest-of-line comment, start or end of a variation, or a token (move number, SAN, NAG, result)
+MOVETEXT_TOKEN = re.compile(r"\{[^}]*\}|;[^\n]*|[()]|[^\s(){};]+")
+MOVE_NUMBER = re.compile(r"\d+\.+")
+
+
+# Yield (tags, movetext) for every game of an open PGN file, reading it lazily
+def read_games(file):
+    tags = {}
+    movetext = []
+    for line in file:
+        line = line.strip()
+        if line.startswith("%"):
+            continue
+        match = TAG_PAIR.match(line) if line.startswith("[") else None
+        if match:
+            # A tag after movetext starts the next game
+            if movetext:
+                yield tags, "\n".join(movetext)
+                tags = {}
+                movetext = []
+            tags[match.group(1)] = match.group(2).replace('\\"', '"').replace("\\\\", "\\")
+        elif line:
+            movetext.append(line)
+    if tags or movetext:
+        yield tags, "\n".join(movetext)
+
+
+# SAN moves of the main line and the result ("*" if missing) of a movetext
+def parse_movetext(movetext):
+    moves = []
+    result = "*"
+    variation_depth = 0
+    for token in MOVETEXT_TOKEN.findall(movetext):
+        if token[0] in "{;":
+            continue
+        if token == "(":
+            variation_depth += 1
+        elif token == ")":
+            variation_depth = max(variation_depth - 1, 0)
+        elif variation_depth > 0 or token[0] == "$":
+            continue
+        elif token in RESULTS:
+            result = token
+        else:
+            # "12." or "12..." alone, or glued to the move ("12.e4")
+            token = MOVE_NUMBER.sub("", token, count=1) if token[0].isdigit() and "." in token else token
+            if token:
+                moves.append(token)
+    return moves, result
+
+
+# Move number and SAN of a ply, e.g. "12... Nf6"
+def format_ply(ply, san):
+    return "{}{} {}".format(ply // 2 + 1, "." if ply % 2 == 0 else "...", san)
+
+
+# Replay one game (number, tags, movetext) and return a dict with what happened
+def replay_game(game, backend="bitboard"):
+    number, tags, movetext = game
+    report = {"number": number, "white": tags.get("White", "?"), "black": tags.get("Black", "?"),
+              "result": tags.get("Result", "*"), "plies": 0, "end": None, "error": None}
+    moves, movetext_result = parse_movetext(movetext)
+    if movetext_result != "*" and tags.get("Result", movetext_result) != movetext_result:
+        report["error"] = "Result tag {} but movetext ends with {}".format(tags["Result"], movetext_result)
+    if "Result" not in tags:
+        report["result"] = movetext_result
+
+    try:
+        game_state = chessEngine.game_state(backend, tags.get("FEN"))
+    except ValueError as error:
+        report["error"] = str(error)
+        return report
+
+    for san in moves:
+        move = game_state.get_san_move(san)
+        if move is None:
+            report["error"] = "illegal move " + format_ply(game_state.start_ply + report["plies"], san)
+            return report
+        game_state.make_move(move)
+        report["plies"] += 1
+
+    # How the final position ends the game, if it does (mate, stalemate, draw rules).
+    # Only the forced endings must match the result: a draw by repetition or the 50-move
+    # rule has to be claimed, the players may have played on or agreed something else
+    game_end = game_state.get_game_end(game_state.get_valid_move())
+    if game_end is not None:
+        report["end"] = game_end[1]
+        if game_end[1] in FORCED_ENDS and report["result"] not in ("*", game_end[0]) and report["error"] is None:
+            report["error"] = "Result {} but the game ended by {} ({})".format(report["result"], game_end[1], game_end[0])
+    return report
+
+
+def replay_chunk(chunk, backend):
+    return [replay_game(game, backend) for game in chunk]
+
+
+# Replay games (an iterator of (number, tags, movetext)) and yield their reports in order.
+# With processes > 1 they are replayed on a pool, chunk_size games per task
+def replay_games(games, processes=1, backend="bitboard", chunk_size=64):
+    if processes == 1:
+        for game in games:
+            yield replay_game(game, backend)
+        return
+
+    games = iter(games)
+    with multiprocessing.Pool(processes) as pool:
+        pending = collections.deque()
+        while True:
+            chunk = list(itertools.islice(games, chunk_size))
+            if not chunk:
+                break
+            pending.append(pool.apply_async(replay_chunk, (chunk, backend)))
+            # Not more than 2 chunks per process in flight, so we don't read the file too far ahead
+            while len(pending) > processes * 2:
+                yield from pending.popleft().get()
+        while pending:
+            yield from pending.popleft().get()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check and replay every game of a PGN file")
+    parser.add_argument("path", help="PGN file")
+    parser.add_argument("--backend", choices=chessEngine.BACKENDS, default="bitboard", help="move generation backend")
+    parser.add_argument("--processes", type=int, default=os.cpu_count() or 1, help="worker processes (default: all cores)")
+    parser.add_argument("--chunk-size", type=int, default=64, help="games per task sent to a worker (default: 64)")
+    parser.add_argument("--quiet", action="store_true", help="only print the games with an error")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    games = 0
+    plies = 0
+    errors = 0
+    results = collections.Counter()
+    ends = collections.Counter()
+    with open(args.path, encoding="utf-8", errors="replace") as file:
+        numbered_games = ((number, tags, movetext) for number, (tags, movetext) in enumerate(read_games(file), 1))
+        for report in replay_games(numbered_games, max(1, args.processes), args.backend, max(1, args.chunk_size)):
+            games += 1
+            plies += report["plies"]
+            results[report["result"]] += 1
+            if report["end"] is not None:
+                ends[report["end"]] += 1
+            if report["error"] is not None:
+                errors += 1
+            if not args.quiet or report["error"] is not None:
+                print("{:>7} {:<8} {} - {}, {} plies{}{}".format(
+                    report["number"], report["result"], report["white"], report["black"], report["plies"],
+                    ", " + report["end"] if report["end"] else "", ": " + report["error"] if report["error"] else ""))
+
+    elapsed = time.perf_counter() - start
+    print("{} games, {} with errors, {} plies".format(games, errors, plies))
+    print("Results: " + ", ".join("{} {}".format(result, results[result]) for result in RESULTS))
+    if ends:
+        print("Ended on the board by: " + ", ".join("{} {}".format(end, count) for end, count in ends.most_common()))
+    print("{:.2f}s on {} processes: {:.1f} games/s, {:.0f} plies/s".format(
+        elapsed, max(1, args.processes), games / max(elapsed, 1e-9), plies / max(elapsed, 1e-9)))
+
+
+if __name__ == "__main__":
+    main()
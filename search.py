@@ -0,0 +1,439 @@
+import time
+
+import evaluation
+import transposition
+
+# Scores are in centipawns from the side to move's point of view (see evaluation.py)
+# Piece values for move ordering
+PIECE_VALUES = {"p": 100, "N": 320, "B": 330, "R": 500, "Q": 900, "K": 0}
+MATE_SCORE = 100000
+INFINITY = 1000000
+MAX_PLY = 128
+
+# Check the clock every this many nodes
+NODES_BETWEEN_TIME_CHECKS = 1024
+
+# Milliseconds kept as a safety margin for the GUI / protocol overhead
+MOVE_OVERHEAD = 30
+
+
+# Mate scores get closer to zero the further away the mate is
+def is_mate_score(score):
+    return abs(score) >= MATE_SCORE - MAX_PLY
+
+
+# Mate scores are stored in the transposition table as distance from the stored node, not from the root
+def score_to_table(score, ply):
+    if score >= MATE_SCORE - MAX_PLY:
+        return score + ply
+    if score <= -MATE_SCORE + MAX_PLY:
+        return score - ply
+    return score
+
+
+def score_from_table(score, ply):
+    if score >= MATE_SCORE - MAX_PLY:
+        return score - ply
+    if score <= -MATE_SCORE + MAX_PLY:
+        return score + ply
+    return score
+
+
+"""_Time control_
+
+We use two budgets. The soft limit is checked between iterations: if it is already
+used up we don't start the next depth, because it would probably not finish anyway.
+The hard limit is checked during the search: when it is reached the search stops
+right away and we play the best move of the last finished iteration.
+
+With movetime both limits are the given time. With a clock (wtime/btime) we split
+the remaining time over the moves still to play (movestogo, or 30 if unknown), add
+most of the increment, and allow going over that by a few times for the hard limit,
+but never more than a fraction of the remaining clock.
+
+MOVE_OVERHEAD is kept back for sending the move, but never more than half of the time,
+so a very short movetime (go movetime 20) still gets a search.
+"""
+
+
+# Compute (soft, hard) limits in seconds, None means no limit
+def compute_time_limits(turn, movetime=None, wtime=None, btime=None, winc=0, binc=0, movestogo=None):
+    if movetime is not None:
+        limit = max(movetime - min(MOVE_OVERHEAD, movetime // 2), 1) / 1000
+        return limit, limit
+    time_left = wtime if turn == "w" else btime
+    if time_left is None:
+        return None, None
+    increment = winc if turn == "w" else binc
+    time_left = max(time_left - min(MOVE_OVERHEAD, time_left // 2), 1)
+    moves_to_go = movestogo if movestogo else 30
+    soft = time_left / moves_to_go + increment * 3 / 4
+    hard = min(soft * 4, time_left / 2)
+    soft = min(soft, hard)
+    return soft / 1000, hard / 1000
+
+
+# Lazy SMP helper threads skip some depths, so they don't all search the same depth at
+# the same time: helper i skips depth d when (d + SKIP_PHASE[i]) // SKIP_SIZE[i] is odd
+SKIP_SIZE = [1, 1, 2, 2, 2, 2, 3, 3, 3, 3, 3, 3, 4, 4, 4, 4, 4, 4, 4, 4]
+SKIP_PHASE = [0, 1, 0, 1, 2, 3, 0, 1, 2, 3, 4, 5, 0, 1, 2, 3, 4, 5, 6, 7]
+
+
+def skip_depth(thread_id, depth):
+    if thread_id == 0:
+        return False
+    index = (thread_id - 1) % len(SKIP_SIZE)
+    return (depth + SKIP_PHASE[index]) // SKIP_SIZE[index] % 2 == 1
+
+
+class search_engine():
+    # table: use this transposition table (e.g. a shared one) instead of making a new one
+    def __init__(self, hash_mb=16, table=None):
+        self.transposition_table = table if table is not None else transposition.transposition_table(hash_mb)
+        
+        # Set from another thread to stop the search as soon as possible
+        self.stopped = False
+
+        # Statistics and result of the last search
+        self.nodes = 0
+        self.depth = 0
+        self.best_move = None
+        self.best_score = 0
+        self.pv = []
+
+        # Move ordering: two killer move ids per ply, and the history score of every
+        # (start square, end square) for white and black (see staged_moves)
+        self.killers = [[0, 0] for _ in range(MAX_PLY)]
+        self.history = [[0] * 4096, [0] * 4096]
+
+        self.start_time = 0
+        self.soft_deadline = None
+        self.hard_deadline = None
+        self.node_limit = None
+
+    # Stop the running search, it will return the best move found so far
+    def stop(self):
+        self.stopped = True
+
+    # Time since the search started, in seconds
+    def elapsed(self):
+        return time.perf_counter() - self.start_time
+
+    # Start the soft / hard time budget from now (also used when a ponder search becomes a real one)
+    def set_time_limits(self, turn, movetime=None, wtime=None, btime=None, winc=0, binc=0, movestogo=None):
+        soft_limit, hard_limit = compute_time_limits(turn, movetime, wtime, btime, winc, binc, movestogo)
+        now = time.perf_counter()
+        self.soft_deadline = None if soft_limit is None else now + soft_limit
+        self.hard_deadline = None if hard_limit is None else now + hard_limit
+
+    """_Iterative deepening_
+
+    We search depth 1, then depth 2, 3, ... and every iteration starts with the principal
+    variation (PV) of the previous one. That gives us a best move at any time, and the
+    previous PV makes the alpha-beta cutoffs of the next iteration much better.
+    """
+
+    # Search the position and return the best move (None if there is no legal move)
+    # info_callback is called after every finished iteration with a dict of search info
+    # infinite ignores the time limits (pondering / analysis), only stop() ends the search
+    # thread_id > 0 makes it a Lazy SMP helper that skips some depths (see smp.py)
+    def search(self, game_state, depth=None, movetime=None, wtime=None, btime=None, winc=0, binc=0,
+               movestogo=None, nodes=None, infinite=False, info_callback=None, thread_id=0):
+        self.stopped = False
+        self.nodes = 0
+        self.depth = 0
+        self.best_move = None
+        self.best_score = 0
+        self.pv = []
+        self.node_limit = nodes
+        self.start_time = time.perf_counter()
+        self.transposition_table.new_search()
+        self.killers = [[0, 0] for _ in range(MAX_PLY)]
+        for history in self.history:
+            for i in range(len(history)):
+                history[i] //= 2
+
+        if infinite:
+            self.soft_deadline = None
+            self.hard_deadline = None
+        else:
+            self.set_time_limits(game_state.turn, movetime, wtime, btime, winc, binc, movestogo)
+        max_depth = depth if depth else MAX_PLY - 1
+
+        root_moves = game_state.get_valid_move()
+        if len(root_moves) == 0:
+            return None
+        self.best_move = root_moves[0]
+
+        for current_depth in range(1, max_depth + 1):
+            if skip_depth(thread_id, current_depth) and current_depth < max_depth:
+                continue
+            pv = []
+            score = self.negamax(game_state, current_depth, -INFINITY, INFINITY, 0, pv)
+
+            # An unfinished iteration is thrown away, unless it already found a better move than the last one
+            if self.stopped:
+                if pv and current_depth > 1 and score > self.best_score:
+                    self.best_move = pv[0]
+                    self.pv = pv
+                break
+
+            self.depth = current_depth
+            self.best_score = score
+            self.pv = self.complete_pv(game_state, pv, current_depth)
+            self.best_move = pv[0] if pv else root_moves[0]
+
+            if info_callback is not None:
+                info_callback(self.get_info())
+
+            if self.soft_deadline is not None and time.perf_counter() >= self.soft_deadline:
+                break
+            # No need to go deeper when we already found a mate
+            if is_mate_score(score) and MATE_SCORE - abs(score) <= current_depth:
+                break
+
+        return self.best_move
+
+    # Search one root move with the window (alpha, beta), returns its score and PV
+    # (used by the parallel root split, where every process gets some of the root moves)
+    def search_root_move(self, game_state, move, depth, alpha=-INFINITY, beta=INFINITY):
+        self.stopped = False
+        self.nodes = 0
+        self.pv = []
+        self.node_limit = None
+        self.soft_deadline = None
+        self.hard_deadline = None
+        self.start_time = time.perf_counter()
+        
+        child_pv = []
+        game_state.make_move(move)
+        score = -self.negamax(game_state, depth - 1, -beta, -alpha, 1, child_pv)
+        game_state.unmake_move()
+        return score, [move] + child_pv
+    
+    # Information about the current search, like the UCI info line
+    def get_info(self):
+        elapsed = self.elapsed()
+        return {
+            "depth": self.depth,
+            "score": self.best_score,
+            "mate": (MATE_SCORE - abs(self.best_score) + 1) // 2 * (1 if self.best_score > 0 else -1) if is_mate_score(self.best_score) else None,
+            "nodes": self.nodes,
+            "time": int(elapsed * 1000),
+            "nps": int(self.nodes / elapsed) if elapsed > 0 else 0,
+            "pv": list(self.pv)
+        }
+
+    # Transposition table cutoffs cut the PV short, so follow the hash moves to make it long again
+    def complete_pv(self, game_state, pv, depth):
+        pv = list(pv)
+        for move in pv:
+            game_state.make_move(move)
+        while len(pv) < depth:
+            entry = self.transposition_table.probe(game_state.zobrist_key)
+            if entry is None or entry[0] == 0 or game_state.count_repetition() >= 2:
+                break
+            move = game_state.get_valid_move_dict().get(entry[0])
+            if move is None:
+                break
+            game_state.make_move(move)
+            pv.append(move)
+        for _ in pv:
+            game_state.unmake_move()
+        return pv
+
+    # Check the time and node limits, and set the stop flag when they are used up
+    def check_limits(self):
+        if self.hard_deadline is not None and time.perf_counter() >= self.hard_deadline:
+            self.stopped = True
+        if self.node_limit is not None and self.nodes >= self.node_limit:
+            self.stopped = True
+
+    # Score of a capture or promotion: most valuable victim first, then least valuable attacker
+    def mvv_lva(self, move):
+        if move.piece_captured != "--":
+            return 10000 + PIECE_VALUES[move.piece_captured[1]] * 10 - PIECE_VALUES[move.piece_moved[1]] // 10
+        return 9000 + PIECE_VALUES[move.promotion]
+
+    """_Staged move generation_
+
+    Most nodes end with a cutoff after one of the first moves, so we don't build and sort
+    the whole move list up front. The moves come in stages, and a stage is only
+    generated when the ones before it didn't cause a cutoff:
+
+    1. The hash move (or the move of the previous PV), checked with get_valid_move_by_id
+       which only generates the moves of one piece.
+    2. Captures and promotions, most valuable victim / least valuable attacker first.
+    3. Killer moves: two quiet moves per ply that caused a cutoff in a sibling node.
+    4. The other quiet moves, by the history table (how often and how deep a move from
+       this square to that square caused a cutoff).
+    """
+
+    def staged_moves(self, game_state, ply, hash_move_id=0):
+        if hash_move_id == 0 and ply < len(self.pv):
+            hash_move_id = self.pv[ply].move_id
+        if hash_move_id:
+            hash_move = game_state.get_valid_move_by_id(hash_move_id)
+            if hash_move is not None:
+                yield hash_move
+            else:
+                hash_move_id = 0
+
+        noisy_moves = game_state.get_noisy_moves()
+        noisy_moves.sort(key=self.mvv_lva, reverse=True)
+        for move in noisy_moves:
+            if move.move_id != hash_move_id:
+                yield move
+
+        quiet_moves = game_state.get_quiet_moves()
+        killers = self.killers[ply]
+        for killer in killers:
+            if killer != hash_move_id:
+                for move in quiet_moves:
+                    if move.move_id == killer:
+                        yield move
+                        break
+
+        history = self.history[0 if game_state.turn == "w" else 1]
+        quiet_moves.sort(key=lambda move: history[move.move_id & 4095], reverse=True)
+        for move in quiet_moves:
+            if move.move_id != hash_move_id and move.move_id not in killers:
+                yield move
+
+    # A quiet move caused a cutoff: remember it as a killer of this ply and in the history table
+    def update_quiet_stats(self, game_state, move, ply, depth):
+        killers = self.killers[ply]
+        if killers[0] != move.move_id:
+            killers[1] = killers[0]
+            killers[0] = move.move_id
+        history = self.history[0 if game_state.turn == "w" else 1]
+        history[move.move_id & 4095] += depth * depth
+
+    """_Negamax with alpha-beta_
+
+    Negamax is minimax where the score is always from the side to move, so the score of
+    a move is minus the score of the opponent after it. Alpha is the score we are already
+    sure to get, beta is the score the opponent will not allow us to go over: as soon as
+    one move reaches beta the opponent would avoid this position, so we stop (cutoff).
+
+    The moves are made and unmade on the same game_state. When the search is stopped
+    every level returns right after unmaking its move, so the game_state is always
+    back to the root position.
+    """
+
+    def negamax(self, game_state, depth, alpha, beta, ply, pv):
+        self.nodes += 1
+        if self.nodes % NODES_BETWEEN_TIME_CHECKS == 0:
+            self.check_limits()
+        if self.stopped:
+            return 0
+
+        # A position repeated inside the search is a draw, the opponent can repeat it again
+        if ply > 0 and (game_state.check_50_move_rule() or game_state.count_repetition() >= 2):
+            return 0
+
+        if ply >= MAX_PLY - 1:
+            return evaluation.evaluate(game_state)
+        if depth <= 0:
+            return self.quiescence(game_state, alpha, beta, ply)
+
+        # A result stored for this position with at least this depth can be used right away
+        key = game_state.zobrist_key
+        hash_move_id = 0
+        entry = self.transposition_table.probe(key)
+        if entry is not None:
+            hash_move_id, table_score, table_depth, bound = entry
+            if ply > 0 and table_depth >= depth:
+                table_score = score_from_table(table_score, ply)
+                if bound == transposition.EXACT or \
+                   (bound == transposition.LOWER_BOUND and table_score >= beta) or \
+                   (bound == transposition.UPPER_BOUND and table_score <= alpha):
+                    return table_score
+
+        original_alpha = alpha
+        best_score = -INFINITY
+        best_move = None
+        for move in self.staged_moves(game_state, ply, hash_move_id):
+            child_pv = []
+            game_state.make_move(move)
+            score = -self.negamax(game_state, depth - 1, -beta, -alpha, ply + 1, child_pv)
+            game_state.unmake_move()
+            if self.stopped:
+                return best_score if best_score > -INFINITY else 0
+
+            if score > best_score:
+                best_score = score
+                best_move = move
+                if score > alpha:
+                    alpha = score
+                    pv[:] = [move] + child_pv
+                    if alpha >= beta:
+                        if move.piece_captured == "--" and not move.is_pawn_promotion:
+                            self.update_quiet_stats(game_state, move, ply, depth)
+                        break
+
+        if best_move is None:
+            # No legal move: checkmate (prefer the shortest mate) or stalemate
+            return -MATE_SCORE + ply if game_state.in_check else 0
+
+        if best_score >= beta:
+            bound = transposition.LOWER_BOUND
+        elif best_score > original_alpha:
+            bound = transposition.EXACT
+        else:
+            bound = transposition.UPPER_BOUND
+        self.transposition_table.store(key, best_move.move_id, score_to_table(best_score, ply), depth, bound)
+        return best_score
+
+    """_Quiescence search_
+
+    At depth 0 the position may be in the middle of an exchange, and the evaluation
+    would count a piece that is about to be recaptured (horizon effect). So we go on
+    with captures and promotions only, until the position is quiet.
+
+    The side to move doesn't have to capture: the static evaluation is a lower bound
+    ("stand pat"). Captures that lose material by static exchange evaluation (SEE)
+    are not searched, they can't be better than standing pat. In check we can't stand
+    pat, so every evasion is searched (and no evasion is mate).
+    """
+
+    def quiescence(self, game_state, alpha, beta, ply):
+        self.nodes += 1
+        if self.nodes % NODES_BETWEEN_TIME_CHECKS == 0:
+            self.check_limits()
+        if self.stopped:
+            return 0
+        if ply >= MAX_PLY - 1:
+            return evaluation.evaluate(game_state)
+
+        moves = game_state.get_noisy_moves()
+        in_check = game_state.in_check
+        if in_check:
+            # Every evasion (the board backend has them from get_noisy_moves already)
+            moves = list(game_state.get_valid_move_cache().values())
+            if len(moves) == 0:
+                return -MATE_SCORE + ply
+            best_score = -INFINITY
+        else:
+            best_score = evaluation.evaluate(game_state)
+            if best_score >= beta:
+                return best_score
+            alpha = max(alpha, best_score)
+
+        moves.sort(key=lambda move: self.mvv_lva(move) if move.piece_captured != "--" or move.is_pawn_promotion else 0, reverse=True)
+        for move in moves:
+            if not in_check and move.piece_captured != "--" and not move.is_en_passant_move and \
+               PIECE_VALUES[move.piece_moved[1]] > PIECE_VALUES[move.piece_captured[1]] and game_state.static_exchange(move) < 0:
+                continue
+            game_state.make_move(move)
+            score = -self.quiescence(game_state, -beta, -alpha, ply + 1)
+            game_state.unmake_move()
+            if self.stopped:
+                return 0
+            if score > best_score:
+                best_score = score
+                if score > alpha:
+                    alpha = score
+                    if alpha >= beta:
+                        break
+        return best_score
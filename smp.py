@@ -0,0 +1,166 @@
+import multiprocessing
+
+import chessEngine
+import search
+import transposition
+
+"""_Lazy SMP_
+
+All threads search the same position, there is no splitting of the work. What makes
+it faster is the shared transposition table: a helper that already searched a
+position leaves its result there, and the others find it instead of searching it again.
+The helpers also skip some depths (search.skip_depth), so at any time they are
+spread over a few depths and fill the table in front of the main thread.
+
+Python threads would all run on one core (GIL), so the helpers are processes and the
+table is in shared memory (see transposition.py). The helpers are started once and
+wait for work: for every search they get the position string (start FEN + moves) and
+the name of the table, and search without limits until the main search is done and
+sets the stop event. Then they send back their deepest finished depth, score and PV.
+
+The main thread is the normal search_engine search in this process, with the time
+limits and info lines. At the end we play the result of the thread that finished the
+deepest depth (the main thread on a tie).
+"""
+
+
+# Search engine of a helper process: stops when the main process says so, and publishes its node count
+class helper_search_engine(search.search_engine):
+    def __init__(self, thread_id, table, stop_event, node_counts):
+        super().__init__(table=table)
+        self.thread_id = thread_id
+        self.stop_event = stop_event
+        self.node_counts = node_counts
+
+    def check_limits(self):
+        self.node_counts[self.thread_id] = self.nodes
+        if self.stop_event.is_set():
+            self.stopped = True
+
+
+# Main loop of a helper process: one search per task, None ends the process
+def helper_main(thread_id, task_queue, result_queue, stop_event, node_counts):
+    engine = None
+    while True:
+        task = task_queue.get()
+        if task is None:
+            break
+        table_name, generation, backend, position = task
+        if engine is None or engine.transposition_table.get_name() != table_name:
+            if engine is not None:
+                engine.transposition_table.close()
+            table = transposition.transposition_table(name=table_name)
+            engine = helper_search_engine(thread_id, table, stop_event, node_counts)
+        engine.transposition_table.generation = generation
+
+        game_state = chessEngine.game_state(backend)
+        game_state.load_position(position)
+        engine.search(game_state, infinite=True, thread_id=thread_id)
+        node_counts[thread_id] = engine.nodes
+        result_queue.put((thread_id, engine.depth, engine.best_score, [move.get_uci_notation() for move in engine.pv]))
+    if engine is not None:
+        engine.transposition_table.close()
+
+
+class smp_search_engine(search.search_engine):
+    def __init__(self, hash_mb=16, threads=1):
+        super().__init__(hash_mb)
+        self.threads = 1
+        self.helpers = []
+        self.task_queues = []
+        self.result_queue = None
+        self.stop_event = None
+        self.node_counts = None
+        self.set_threads(threads)
+
+    # Change the number of search threads (1 = no helper processes, a normal table)
+    def set_threads(self, threads):
+        threads = max(1, threads)
+        if threads == self.threads and (threads == 1 or self.helpers):
+            return
+        self.stop_helpers()
+        if (threads > 1) != self.transposition_table.shared:
+            self.transposition_table.close()
+            self.transposition_table = transposition.transposition_table(self.transposition_table.size_mb, shared=threads > 1)
+        self.threads = threads
+        if threads == 1:
+            return
+
+        self.result_queue = multiprocessing.Queue()
+        self.stop_event = multiprocessing.Event()
+        self.node_counts = multiprocessing.Array("q", threads, lock=False)
+        for thread_id in range(1, threads):
+            task_queue = multiprocessing.Queue()
+            helper = multiprocessing.Process(target=helper_main, daemon=True,
+                                             args=(thread_id, task_queue, self.result_queue, self.stop_event, self.node_counts))
+            helper.start()
+            self.helpers.append(helper)
+            self.task_queues.append(task_queue)
+
+    def stop_helpers(self):
+        for task_queue in self.task_queues:
+            task_queue.put(None)
+        for helper in self.helpers:
+            helper.join()
+        self.helpers = []
+        self.task_queues = []
+
+    # End the helper processes and free the shared table
+    def close(self):
+        self.stop_helpers()
+        self.transposition_table.close()
+
+    def search(self, game_state, depth=None, movetime=None, wtime=None, btime=None, winc=0, binc=0,
+               movestogo=None, nodes=None, infinite=False, info_callback=None, thread_id=0):
+        if self.threads == 1:
+            return super().search(game_state, depth, movetime, wtime, btime, winc, binc, movestogo, nodes,
+                                  infinite, info_callback)
+
+        # Every search moves the table to the next generation, the helpers do it from the same one
+        self.stop_event.clear()
+        for i in range(self.threads):
+            self.node_counts[i] = 0
+        task = (self.transposition_table.get_name(), self.transposition_table.generation, game_state.backend,
+                game_state.get_position())
+        for task_queue in self.task_queues:
+            task_queue.put(task)
+
+        best_move = super().search(game_state, depth, movetime, wtime, btime, winc, binc, movestogo, nodes,
+                                   infinite, info_callback)
+
+        self.stop_event.set()
+        results = [self.result_queue.get() for _ in self.helpers]
+        if best_move is not None:
+            self.use_best_result(game_state, results)
+        self.nodes += sum(self.node_counts[1:])
+        return self.best_move
+
+    # Take the result of a helper that finished a deeper depth than the main thread
+    def use_best_result(self, game_state, results):
+        for thread_id, depth, score, pv in sorted(results, key=lambda result: (result[1], result[2]), reverse=True):
+            if depth <= self.depth or len(pv) == 0:
+                break
+            moves = []
+            for notation in pv:
+                move = game_state.get_uci_move(notation)
+                if move is None:
+                    break
+                game_state.make_move(move)
+                moves.append(move)
+            for _ in moves:
+                game_state.unmake_move()
+            if moves:
+                self.depth = depth
+                self.best_score = score
+                self.best_move = moves[0]
+                self.pv = moves
+                break
+
+    # Node counts of the helpers are added to the main thread's
+    def get_info(self):
+        info = super().get_info()
+        if self.threads > 1:
+            info["nodes"] += sum(self.node_counts[1:])
+            elapsed = self.elapsed()
+            info["nps"] = int(info["nodes"] / elapsed) if elapsed > 0 else 0
+        return info
@@ -0,0 +1,48 @@
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import bitbases
+import chessEngine
+
+# (FEN, result of probe for the side to move)
+KNOWN_POSITIONS = [
+    # KQK and KRK are won unless the lone king takes the piece at once
+    ("4k3/8/8/8/8/8/8/Q3K3 w - - 0 1", bitbases.WIN),
+    ("4k3/8/8/8/8/8/8/R3K3 b - - 0 1", bitbases.LOSS),
+    ("4k3/4Q3/8/8/8/8/8/7K b - - 0 1", bitbases.DRAW),
+    ("7k/8/8/8/8/8/8/3rK3 w - - 0 1", bitbases.DRAW),
+    ("q3k3/8/8/8/8/8/8/4K3 w - - 0 1", bitbases.LOSS),
+    # KPK: king on a key square in front of its pawn wins, with either side to move
+    ("4k3/8/4K3/4P3/8/8/8/8 w - - 0 1", bitbases.WIN),
+    ("4k3/8/4K3/4P3/8/8/8/8 b - - 0 1", bitbases.LOSS),
+    # The black king in front of the pawn with the opposition
+    ("8/8/8/8/4k3/8/4P3/4K3 w - - 0 1", bitbases.DRAW),
+    # Rook pawn with the lone king in the corner, and stalemate
+    ("k7/8/8/8/8/8/P7/K7 w - - 0 1", bitbases.DRAW),
+    ("4k3/4P3/4K3/8/8/8/8/8 b - - 0 1", bitbases.DRAW),
+]
+
+
+class bitbase_test(unittest.TestCase):
+    # The .bin files are in the repository, they have to be there
+    def test_tables_present(self):
+        for endgame in bitbases.ENDGAMES:
+            self.assertIsNotNone(bitbases.get_table(endgame), endgame)
+
+    def test_known_positions(self):
+        for fen, expected in KNOWN_POSITIONS:
+            with self.subTest(fen=fen):
+                self.assertEqual(bitbases.probe(chessEngine.game_state("bitboard", fen)), expected)
+
+    def test_adjudicate(self):
+        self.assertEqual(bitbases.adjudicate(chessEngine.game_state("bitboard", "4k3/8/8/8/8/8/8/R3K3 b - - 0 1")), "1-0")
+        self.assertEqual(bitbases.adjudicate(chessEngine.game_state("bitboard", "q3k3/8/8/8/8/8/8/4K3 w - - 0 1")), "0-1")
+        self.assertEqual(bitbases.adjudicate(chessEngine.game_state("bitboard", "k7/8/8/8/8/8/P7/K7 w - - 0 1")), "1/2-1/2")
+        self.assertIsNone(bitbases.adjudicate(chessEngine.game_state("bitboard")))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,34 @@
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import chessEngine
+
+
+class load_fen_test(unittest.TestCase):
+    # The e3 square with no white pawn on e4 in front of it: no pawn to take en passant
+    def test_en_passant_without_pawn(self):
+        for backend in chessEngine.BACKENDS:
+            with self.assertRaises(ValueError):
+                chessEngine.game_state(backend, "4k3/8/8/8/3p4/8/8/4K3 b - e3 0 1")
+
+    # The en passant square must be on the side of the player who just moved
+    def test_en_passant_wrong_rank(self):
+        for backend in chessEngine.BACKENDS:
+            with self.assertRaises(ValueError):
+                chessEngine.game_state(backend, "4k3/8/8/3pP3/8/8/8/4K3 b - d6 0 1")
+
+    def test_en_passant_capture(self):
+        for backend in chessEngine.BACKENDS:
+            game_state = chessEngine.game_state(backend, "4k3/8/8/8/3pP3/8/8/4K3 b - e3 0 1")
+            move = game_state.get_uci_move("d4e3")
+            self.assertIsNotNone(move)
+            game_state.make_move(move)
+            self.assertEqual(game_state.board[4][4], "--")
+            self.assertEqual(game_state.board[5][4], "bp")
+
+
+if __name__ == "__main__":
+    unittest.main()
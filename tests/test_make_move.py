@@ -0,0 +1,55 @@
+import copy
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import chessEngine
+
+# Double push, en passant, castling on both sides of the board, a promotion with
+# capture and an under-promotion
+FEN = "r3k2r/1P6/8/8/3p4/8/4P1p1/R3K2R w KQkq - 0 1"
+MOVES = ["e2e4", "d4e3", "e1c1", "e8g8", "b7a8q", "g2h1n", "a8a7", "e3e2"]
+
+# Everything make_move changes and unmake_move has to put back
+STATE_FIELDS = ["board", "bitboards", "turn", "white_king_location", "black_king_location", "en_passant",
+                "white_king_moved", "white_king_rook_moved", "white_queen_rook_moved",
+                "black_king_moved", "black_king_rook_moved", "black_queen_rook_moved",
+                "halfmove_clock", "piece_count", "piece_squares", "piece_counts", "bishop_square_colors",
+                "zobrist_key", "position_count", "mg_score", "eg_score", "phase"]
+
+
+def snapshot(game_state):
+    return {field: copy.deepcopy(getattr(game_state, field)) for field in STATE_FIELDS}
+
+
+class make_move_test(unittest.TestCase):
+    def test_unmake_restores_state(self):
+        for backend in chessEngine.BACKENDS:
+            game_state = chessEngine.game_state(backend, FEN)
+            snapshots = []
+            for notation in MOVES:
+                move = game_state.get_uci_move(notation)
+                self.assertIsNotNone(move, backend + " " + notation)
+                snapshots.append(snapshot(game_state))
+                game_state.make_move(move)
+            for notation in reversed(MOVES):
+                game_state.unmake_move()
+                expected = snapshots.pop()
+                for field in STATE_FIELDS:
+                    self.assertEqual(getattr(game_state, field), expected[field],
+                                     "{}: {} after unmaking {}".format(backend, field, notation))
+            self.assertEqual(game_state.get_fen(), FEN)
+
+    # The special moves are played out right on the board
+    def test_special_moves(self):
+        for backend in chessEngine.BACKENDS:
+            game_state = chessEngine.game_state(backend, FEN)
+            for notation in MOVES[:6]:
+                game_state.make_move(game_state.get_uci_move(notation))
+            self.assertEqual(game_state.get_fen().split()[0], "Q4rk1/8/8/8/8/4p3/8/2KR3n")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,45 @@
+import os
+import struct
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import chessEngine
+import opening_book
+
+
+# Polyglot move from UCI squares ("e1", "h1")
+def encode_move(start, end):
+    return (ord(end[0]) - ord("a")) | (int(end[1]) - 1) << 3 | (ord(start[0]) - ord("a")) << 6 | (int(start[1]) - 1) << 9
+
+
+class opening_book_test(unittest.TestCase):
+    # A book with one move for the position of fen, returns the move picked from it
+    def get_book_move(self, fen, start, end):
+        game_state = chessEngine.game_state("bitboard", fen)
+        handle, path = tempfile.mkstemp(suffix=".bin")
+        with os.fdopen(handle, "wb") as file:
+            file.write(struct.pack(opening_book.ENTRY_FORMAT, opening_book.polyglot_key(game_state),
+                                   encode_move(start, end), 1, 0))
+        book = opening_book.opening_book(path, "best")
+        try:
+            move = book.get_move(game_state)
+        finally:
+            book.close()
+            os.remove(path)
+        return move.get_uci_notation() if move is not None else None
+
+    # King takes own rook is castling
+    def test_castling(self):
+        self.assertEqual(self.get_book_move("4k3/8/8/8/8/8/8/4K2R w K - 0 1", "e1", "h1"), "e1g1")
+        self.assertEqual(self.get_book_move("r3k3/8/8/8/8/8/8/4K3 b q - 0 1", "e8", "a8"), "e8c8")
+
+    # A rook on e1 going to h1 is not castling (e1g1 would be a legal rook move too)
+    def test_rook_move_from_e1(self):
+        self.assertEqual(self.get_book_move("4k3/8/8/8/8/8/8/K3R3 w - - 0 1", "e1", "h1"), "e1h1")
+
+
+if __name__ == "__main__":
+    unittest.main()
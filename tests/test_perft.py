@@ -0,0 +1,34 @@
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import chessEngine
+import perft
+
+# Deep enough to go through castling, en passant, promotions and pins of the reference
+# positions, and still quick
+DEPTH = 3
+
+
+class perft_test(unittest.TestCase):
+    def test_reference_positions(self):
+        for backend in chessEngine.BACKENDS:
+            for name, fen, expected in perft.REFERENCE_POSITIONS:
+                game_state = chessEngine.game_state(backend, fen)
+                for depth in range(1, DEPTH + 1):
+                    with self.subTest(backend=backend, position=name, depth=depth):
+                        self.assertEqual(game_state.perft(depth), expected[depth - 1])
+
+    # The position is the same after perft (every move was unmade)
+    def test_position_restored(self):
+        for backend in chessEngine.BACKENDS:
+            fen = perft.REFERENCE_POSITIONS[1][1]
+            game_state = chessEngine.game_state(backend, fen)
+            game_state.perft(2)
+            self.assertEqual(game_state.get_fen(), fen)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,61 @@
+import io
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pgn
+
+GAMES = """[Event "Repetition, played on"]
+[Result "1-0"]
+
+1. Nf3 Nf6 2. Ng1 Ng8 3. Nf3 Nf6 4. Ng1 Ng8 1-0
+
+[Event "Mate with the wrong result"]
+[Result "1/2-1/2"]
+
+1. f3 e5 2. g4 Qh4# 1/2-1/2
+
+[Event "Dead position on the 100th halfmove"]
+[FEN "8/8/8/4k3/8/8/8/4KN2 w - - 99 80"]
+[Result "1-0"]
+
+80. Ng3 1-0
+
+[Event "Dead position, drawn"]
+[FEN "8/8/8/4k3/8/8/8/4KN2 w - - 99 80"]
+[Result "1/2-1/2"]
+
+80. Ng3 1/2-1/2
+"""
+
+
+class pgn_test(unittest.TestCase):
+    def setUp(self):
+        games = ((number, tags, movetext) for number, (tags, movetext) in enumerate(pgn.read_games(io.StringIO(GAMES)), 1))
+        self.reports = list(pgn.replay_games(games))
+
+    def test_read_games(self):
+        self.assertEqual(len(self.reports), 4)
+        self.assertEqual([report["plies"] for report in self.reports], [8, 4, 1, 1])
+
+    # A draw by repetition has to be claimed: any result is fine
+    def test_claimable_draw(self):
+        self.assertEqual(self.reports[0]["end"], "3 repetitive moves")
+        self.assertIsNone(self.reports[0]["error"])
+
+    def test_forced_end(self):
+        self.assertEqual(self.reports[1]["end"], "checkmate")
+        self.assertIsNotNone(self.reports[1]["error"])
+
+    # Insufficient material is found even when the 50-move rule could also be claimed
+    def test_dead_position_after_fifty_moves(self):
+        self.assertEqual(self.reports[2]["end"], "insufficient materials")
+        self.assertIsNotNone(self.reports[2]["error"])
+        self.assertEqual(self.reports[3]["end"], "insufficient materials")
+        self.assertIsNone(self.reports[3]["error"])
+
+
+if __name__ == "__main__":
+    unittest.main()
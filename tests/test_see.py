@@ -0,0 +1,50 @@
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import bitboard
+import chessEngine
+import search
+
+
+class static_exchange_test(unittest.TestCase):
+    # SEE of the move in UCI notation on both backends
+    def assert_see(self, fen, notation, expected):
+        for backend in chessEngine.BACKENDS:
+            game_state = chessEngine.game_state(backend, fen)
+            move = game_state.get_uci_move(notation)
+            self.assertEqual(game_state.static_exchange(move), expected, backend)
+
+    def test_undefended_capture(self):
+        self.assert_see("4k3/8/8/3n4/8/8/8/3RK3 w - - 0 1", "d1d5", bitboard.SEE_VALUES[bitboard.KNIGHT])
+
+    def test_defended_pawn_taken_by_queen(self):
+        self.assert_see("4k3/8/2p5/3p4/8/8/8/3QK3 w - - 0 1", "d1d5",
+                        bitboard.SEE_VALUES[bitboard.PAWN] - bitboard.SEE_VALUES[bitboard.QUEEN])
+
+    # The rook behind the first one recaptures once the first one has gone
+    def test_x_ray_recapture(self):
+        self.assert_see("3rk3/8/8/3p4/8/8/3R4/4K3 w - - 0 1", "d2d5",
+                        bitboard.SEE_VALUES[bitboard.PAWN] - bitboard.SEE_VALUES[bitboard.ROOK])
+        self.assert_see("3rk3/8/8/3p4/8/8/3R4/3RK3 w - - 0 1", "d2d5", bitboard.SEE_VALUES[bitboard.PAWN])
+
+    # The king can't take back on a square the opponent still defends
+    def test_king_recapture(self):
+        self.assert_see("8/8/8/4k3/3p4/8/8/3RK3 w - - 0 1", "d1d4",
+                        bitboard.SEE_VALUES[bitboard.PAWN] - bitboard.SEE_VALUES[bitboard.ROOK])
+        self.assert_see("8/8/8/4k3/3p4/8/1B6/3RK3 w - - 0 1", "d1d4", bitboard.SEE_VALUES[bitboard.PAWN])
+
+    # Quiescence sees that the queen would be taken back, and the search doesn't take the pawn
+    def test_search_avoids_losing_capture(self):
+        for backend in chessEngine.BACKENDS:
+            game_state = chessEngine.game_state(backend, "4k3/8/2p5/3p4/8/8/8/3QK3 w - - 0 1")
+            engine = search.search_engine(1)
+            move = engine.search(game_state, depth=1)
+            engine.transposition_table.close()
+            self.assertNotEqual(move.get_uci_notation(), "d1d5", backend)
+
+
+if __name__ == "__main__":
+    unittest.main()
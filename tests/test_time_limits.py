@@ -0,0 +1,28 @@
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import search
+
+
+class time_limits_test(unittest.TestCase):
+    def test_movetime(self):
+        self.assertEqual(search.compute_time_limits("w", movetime=1000), (0.97, 0.97))
+        # A short movetime keeps half of its time for the search
+        self.assertEqual(search.compute_time_limits("w", movetime=20), (0.01, 0.01))
+        self.assertEqual(search.compute_time_limits("b", movetime=1), (0.001, 0.001))
+
+    def test_clock(self):
+        soft, hard = search.compute_time_limits("w", wtime=60030, btime=1000)
+        self.assertAlmostEqual(soft, 2.0)
+        self.assertAlmostEqual(hard, 8.0)
+        soft, hard = search.compute_time_limits("b", wtime=60000, btime=40)
+        self.assertGreater(soft, 0)
+        self.assertLessEqual(hard, 0.02)
+        self.assertEqual(search.compute_time_limits("w"), (None, None))
+
+
+if __name__ == "__main__":
+    unittest.main()
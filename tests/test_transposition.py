@@ -0,0 +1,65 @@
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import transposition
+
+
+class transposition_table_test(unittest.TestCase):
+    def setUp(self):
+        self.table = transposition.transposition_table(1)
+        # Another key of the same slot
+        self.key = 0x123456789ABCDEF
+        self.other_key = self.key + self.table.size
+
+    def test_store_and_probe(self):
+        self.table.store(self.key, 1234, -567, 5, transposition.UPPER_BOUND)
+        self.assertEqual(self.table.probe(self.key), (1234, -567, 5, transposition.UPPER_BOUND))
+        self.assertIsNone(self.table.probe(self.key + 1))
+
+    # In the same search a shallower result doesn't replace a deeper one of another position
+    def test_keep_deeper_entry(self):
+        self.table.store(self.key, 1, 10, 8, transposition.EXACT)
+        self.table.store(self.other_key, 2, 20, 3, transposition.EXACT)
+        self.assertEqual(self.table.probe(self.key), (1, 10, 8, transposition.EXACT))
+        self.assertIsNone(self.table.probe(self.other_key))
+        # Deeper or as deep replaces it
+        self.table.store(self.other_key, 2, 20, 8, transposition.EXACT)
+        self.assertEqual(self.table.probe(self.other_key), (2, 20, 8, transposition.EXACT))
+        self.assertIsNone(self.table.probe(self.key))
+
+    # Entries of an older search are replaced whatever their depth
+    def test_replace_older_search(self):
+        self.table.store(self.key, 1, 10, 8, transposition.EXACT)
+        self.table.new_search()
+        self.table.store(self.other_key, 2, 20, 1, transposition.LOWER_BOUND)
+        self.assertEqual(self.table.probe(self.other_key), (2, 20, 1, transposition.LOWER_BOUND))
+
+    # The same position is always replaced, and keeps its best move if the new result has none
+    def test_same_position(self):
+        self.table.store(self.key, 77, 10, 8, transposition.EXACT)
+        self.table.store(self.key, 0, -30, 2, transposition.UPPER_BOUND)
+        self.assertEqual(self.table.probe(self.key), (77, -30, 2, transposition.UPPER_BOUND))
+
+    # A torn write (the data of another entry under this key) doesn't match key XOR data
+    def test_torn_entry(self):
+        self.table.store(self.key, 1, 10, 4, transposition.EXACT)
+        index = (self.key & self.table.mask) << 1
+        self.table.table[index + 1] = transposition.pack(2, 99, 6, transposition.LOWER_BOUND, self.table.generation)
+        self.assertIsNone(self.table.probe(self.key))
+
+    def test_shared_table(self):
+        table = transposition.transposition_table(1, shared=True)
+        attached = transposition.transposition_table(name=table.get_name())
+        try:
+            table.store(self.key, 5, 42, 7, transposition.EXACT)
+            self.assertEqual(attached.probe(self.key), (5, 42, 7, transposition.EXACT))
+        finally:
+            attached.close()
+            table.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,55 @@
+import os
+import random
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import chessEngine
+import perft
+import zobrist
+
+
+class zobrist_test(unittest.TestCase):
+    # The key kept up to date by make_move / unmake_move is the one computed from scratch
+    def test_incremental_key(self):
+        rng = random.Random(2004)
+        for backend in chessEngine.BACKENDS:
+            for name, fen, expected in perft.REFERENCE_POSITIONS:
+                game_state = chessEngine.game_state(backend, fen)
+                played = 0
+                for _ in range(40):
+                    moves = game_state.get_valid_move()
+                    if len(moves) == 0:
+                        break
+                    game_state.make_move(rng.choice(moves))
+                    played += 1
+                    self.assertEqual(game_state.zobrist_key, zobrist.compute_key(game_state), name)
+                for _ in range(played):
+                    game_state.unmake_move()
+                    self.assertEqual(game_state.zobrist_key, zobrist.compute_key(game_state), name)
+                self.assertEqual(game_state.zobrist_key, chessEngine.game_state(backend, fen).zobrist_key)
+
+    # Two move orders to the same position give the same key
+    def test_transposition(self):
+        for backend in chessEngine.BACKENDS:
+            keys = []
+            for line in (["g1f3", "b8c6", "b1c3"], ["b1c3", "b8c6", "g1f3"]):
+                game_state = chessEngine.game_state(backend)
+                for notation in line:
+                    game_state.make_move(game_state.get_uci_move(notation))
+                keys.append(game_state.zobrist_key)
+            self.assertEqual(keys[0], keys[1])
+
+    # The en passant square is only part of the key when a pawn can take en passant
+    def test_en_passant(self):
+        without_capturer = chessEngine.game_state("board", "4k3/8/8/8/4P3/8/8/4K3 b - e3 0 1")
+        no_square = chessEngine.game_state("board", "4k3/8/8/8/4P3/8/8/4K3 b - - 0 1")
+        self.assertEqual(without_capturer.zobrist_key, no_square.zobrist_key)
+        with_capturer = chessEngine.game_state("board", "4k3/8/8/8/3pP3/8/8/4K3 b - e3 0 1")
+        no_square = chessEngine.game_state("board", "4k3/8/8/8/3pP3/8/8/4K3 b - - 0 1")
+        self.assertNotEqual(with_capturer.zobrist_key, no_square.zobrist_key)
+
+
+if __name__ == "__main__":
+    unittest.main()
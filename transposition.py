@@ -0,0 +1,136 @@
+# Transposition table: remembers search results by Zobrist key, so a position reached
+# again through another move order does not have to be searched again.
+
+from array import array
+from multiprocessing import shared_memory
+
+# Bound type of a stored score
+EXACT, LOWER_BOUND, UPPER_BOUND = 1, 2, 3
+
+# Every entry is two unsigned 64-bit numbers: the key (XOR the data) and the packed data
+ENTRY_SIZE = 16
+
+"""_Packed entry data_
+
+bits  0-15  best move (Move.move_id, 0 = no move)
+bits 16-37  score + SCORE_OFFSET
+bits 38-45  depth
+bits 46-47  bound type (0 = empty entry)
+bits 48-55  generation (age of the search that stored it)
+"""
+SCORE_OFFSET = 1 << 21
+MOVE_MASK = (1 << 16) - 1
+SCORE_MASK = (1 << 22) - 1
+
+
+def pack(move_id, score, depth, bound, generation):
+    return move_id | (score + SCORE_OFFSET) << 16 | depth << 38 | bound << 46 | generation << 48
+
+
+# Returns (move_id, score, depth, bound)
+def unpack(data):
+    return data & MOVE_MASK, (data >> 16 & SCORE_MASK) - SCORE_OFFSET, data >> 38 & 0xFF, data >> 46 & 3
+
+
+"""_Shared table_
+
+With shared=True the entries live in a multiprocessing.shared_memory block instead of
+an array, so the search processes of Lazy SMP all read and write the same table. Other
+processes attach to it by name (transposition_table(name=...)), the process that
+created it frees it with close().
+
+There are no locks: a key and its data are two separate writes, and another process
+can read between them (or two processes can write the same slot at once). So the key
+slot stores key XOR data. A torn entry then doesn't match its key, and probe treats it
+as empty instead of returning the data of another position.
+"""
+
+
+class transposition_table():
+    # shared: keep the table in shared memory, name: attach to the shared table of another process
+    def __init__(self, size_mb=16, shared=False, name=None):
+        self.shared = shared or name is not None
+        self.shared_memory = None
+        self.owner = name is None
+        if name is not None:
+            self.shared_memory = shared_memory.SharedMemory(name=name)
+            self.size = self.shared_memory.size // ENTRY_SIZE
+            self.mask = self.size - 1
+            self.size_mb = self.size * ENTRY_SIZE // (1024 * 1024)
+            self.table = self.shared_memory.buf.cast("Q")
+            self.generation = 0
+        else:
+            self.resize(size_mb)
+
+    # Allocate the table: the biggest power of two number of entries that fits in size_mb
+    def resize(self, size_mb):
+        self.close()
+        self.size_mb = size_mb
+        entries = max(1, size_mb * 1024 * 1024 // ENTRY_SIZE)
+        self.size = 1 << (entries.bit_length() - 1)
+        self.mask = self.size - 1
+        if self.shared:
+            self.shared_memory = shared_memory.SharedMemory(create=True, size=self.size * ENTRY_SIZE)
+            self.shared_memory.buf[:self.size * ENTRY_SIZE] = bytes(self.size * ENTRY_SIZE)
+            self.table = self.shared_memory.buf.cast("Q")
+        else:
+            self.table = array("Q", bytes(self.size * ENTRY_SIZE))
+        self.generation = 0
+
+    # Name of the shared memory block, for other processes to attach to
+    def get_name(self):
+        return self.shared_memory.name if self.shared_memory is not None else None
+
+    def clear(self):
+        if self.shared:
+            self.shared_memory.buf[:self.size * ENTRY_SIZE] = bytes(self.size * ENTRY_SIZE)
+        else:
+            self.table = array("Q", bytes(self.size * ENTRY_SIZE))
+        self.generation = 0
+
+    # Free the shared memory block (only detach from it if another process created it)
+    def close(self):
+        if self.shared_memory is not None:
+            self.table.release()
+            self.shared_memory.close()
+            if self.owner:
+                self.shared_memory.unlink()
+            self.shared_memory = None
+
+    # Call at the start of every search, so entries of older searches get replaced first
+    def new_search(self):
+        self.generation = (self.generation + 1) & 0xFF
+
+    # Returns (move_id, score, depth, bound) of the position, or None
+    def probe(self, key):
+        index = (key & self.mask) << 1
+        data = self.table[index + 1]
+        if data and self.table[index] ^ data == key:
+            return unpack(data)
+        return None
+
+    """_Replacement policy_
+
+    One entry per slot. A new result replaces the stored one if the slot is empty, holds
+    the same position, was written by an older search, or was searched less deep. So
+    deep results of the current search survive, and the table never grows.
+    """
+
+    def store(self, key, move_id, score, depth, bound):
+        index = (key & self.mask) << 1
+        old_data = self.table[index + 1]
+        same_key = self.table[index] ^ old_data == key
+        if old_data and not same_key and old_data >> 48 == self.generation and old_data >> 38 & 0xFF > depth:
+            return
+        # Keep the old best move if we don't have one
+        if move_id == 0 and same_key:
+            move_id = old_data & MOVE_MASK
+        data = pack(move_id, score, max(depth, 0), bound, self.generation)
+        self.table[index] = key ^ data
+        self.table[index + 1] = data
+
+    # How full the table is in permille, from the first 1000 entries (like UCI hashfull)
+    def hashfull(self):
+        sample = min(1000, self.size)
+        used = sum(1 for i in range(sample) if self.table[2 * i + 1] and self.table[2 * i + 1] >> 48 == self.generation)
+        return used * 1000 // sample
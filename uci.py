@@ -0,0 +1,274 @@
+import sys
+import threading
+
+import chessEngine
+import evaluation
+import opening_book
+import smp
+
+ENGINE_NAME = "Chess_Engine"
+ENGINE_AUTHOR = "Kiet-2004"
+
+# go parameters with an integer value
+GO_INT_PARAMETERS = ("depth", "movetime", "wtime", "btime", "winc", "binc", "movestogo", "nodes")
+
+"""_How the UCI loop works_
+
+The main thread only reads commands from stdin and answers them. A "go" starts the
+search on its own thread, so "isready", "stop" and "ponderhit" are answered while the
+engine is thinking. The search thread prints the info lines and the bestmove.
+
+For "go infinite" and "go ponder" UCI does not allow a bestmove before "stop" (or
+"ponderhit"), so when the search ends on its own, the thread waits for it.
+"""
+
+
+class uci_engine():
+    def __init__(self, input_stream=sys.stdin, output_stream=sys.stdout):
+        self.input_stream = input_stream
+        self.output_stream = output_stream
+        self.output_lock = threading.Lock()
+        
+        # Options
+        self.backend = "bitboard"
+        self.hash_mb = 16
+        self.threads = 1
+        
+        # Polyglot opening book (None = no book), used when OwnBook is on
+        self.own_book = False
+        self.book = None
+        self.book_mode = "weighted"
+        
+        self.engine = smp.smp_search_engine(self.hash_mb, self.threads)
+        self.game_state = chessEngine.game_state(self.backend)
+        
+        self.search_thread = None
+        # Set when a search waiting for stop / ponderhit may print its bestmove
+        self.release_bestmove = threading.Event()
+        self.pondering = False
+        self.ponder_limits = {}
+    
+    def send(self, line):
+        with self.output_lock:
+            self.output_stream.write(line + "\n")
+            self.output_stream.flush()
+    
+    # Read commands until "quit" or the end of the input
+    def run(self):
+        for line in self.input_stream:
+            if not self.handle_command(line.strip()):
+                break
+        self.stop_search()
+        self.engine.close()
+        self.load_book("")
+    
+    # Handle one command, return False to quit
+    def handle_command(self, line):
+        tokens = line.split()
+        if len(tokens) == 0:
+            return True
+        command = tokens[0]
+        
+        if command == "uci":
+            self.send("id name " + ENGINE_NAME)
+            self.send("id author " + ENGINE_AUTHOR)
+            self.send("option name Hash type spin default 16 min 1 max 4096")
+            self.send("option name Threads type spin default 1 min 1 max 256")
+            self.send("option name Backend type combo default bitboard var bitboard var board")
+            self.send("option name Ponder type check default false")
+            self.send("option name Clear Hash type button")
+            self.send("option name OwnBook type check default false")
+            self.send("option name Book File type string default <empty>")
+            self.send("option name Book Mode type combo default weighted var weighted var best")
+            self.send("uciok")
+        elif command == "isready":
+            self.send("readyok")
+        elif command == "setoption":
+            self.set_option(tokens)
+        elif command == "ucinewgame":
+            self.stop_search()
+            self.engine.transposition_table.clear()
+            self.game_state = chessEngine.game_state(self.backend)
+        elif command == "position":
+            self.stop_search()
+            self.set_position(tokens)
+        elif command == "go":
+            self.stop_search()
+            self.go(tokens)
+        elif command == "stop":
+            self.stop_search()
+        elif command == "ponderhit":
+            self.ponder_hit()
+        elif command == "quit":
+            return False
+        elif command == "debug":
+            # debug on: cross-check the incremental evaluation at every leaf
+            evaluation.DEBUG = len(tokens) > 1 and tokens[1] == "on"
+        else:
+            self.send("info string unknown command " + command)
+        return True
+    
+    # setoption name <name> [value <value>], the name can have spaces
+    def set_option(self, tokens):
+        if "name" not in tokens:
+            return
+        name_index = tokens.index("name") + 1
+        value_index = tokens.index("value") if "value" in tokens else len(tokens)
+        name = " ".join(tokens[name_index:value_index]).lower()
+        value = " ".join(tokens[value_index + 1:])
+        if name in ("hash", "threads"):
+            try:
+                number = max(1, int(value))
+            except ValueError:
+                self.send("info string option " + name + " needs a number, got " + value)
+                return
+        self.stop_search()
+        if name == "hash":
+            self.hash_mb = number
+            self.engine.transposition_table.resize(self.hash_mb)
+        elif name == "threads":
+            self.threads = number
+            self.engine.set_threads(self.threads)
+        elif name == "backend" and value in chessEngine.BACKENDS:
+            self.backend = value
+            self.game_state = chessEngine.game_state(self.backend)
+        elif name == "clear hash":
+            self.engine.transposition_table.clear()
+        elif name == "ownbook":
+            self.own_book = value == "true"
+        elif name == "book file":
+            self.load_book(value)
+        elif name == "book mode" and value in opening_book.SELECTION_MODES:
+            self.book_mode = value
+            if self.book is not None:
+                self.book.mode = value
+    
+    def load_book(self, path):
+        if self.book is not None:
+            self.book.close()
+            self.book = None
+        if path in ("", "<empty>"):
+            return
+        try:
+            self.book = opening_book.opening_book(path, self.book_mode)
+        except OSError as error:
+            self.send("info string cannot open book " + path + ": " + str(error))
+    
+    # position startpos [moves ...] / position fen <fen> [moves ...]
+    def set_position(self, tokens):
+        if "moves" in tokens:
+            moves_index = tokens.index("moves")
+        else:
+            moves_index = len(tokens)
+        if len(tokens) > 1 and tokens[1] == "fen":
+            fen = " ".join(tokens[2:moves_index])
+        else:
+            fen = chessEngine.START_FEN
+        game_state = chessEngine.game_state(self.backend)
+        try:
+            game_state.load_fen(fen)
+        except ValueError as error:
+            self.send("info string " + str(error))
+            return
+        for notation in tokens[moves_index + 1:]:
+            move = game_state.get_uci_move(notation)
+            if move is None:
+                self.send("info string illegal move " + notation)
+                break
+            game_state.make_move(move)
+        self.game_state = game_state
+    
+    def go(self, tokens):
+        limits = {}
+        infinite = False
+        self.pondering = False
+        for i in range(1, len(tokens)):
+            if tokens[i] in GO_INT_PARAMETERS and i + 1 < len(tokens):
+                # A parameter that is not a number is left out, the search still runs
+                try:
+                    limits[tokens[i]] = int(tokens[i + 1])
+                except ValueError:
+                    self.send("info string " + tokens[i] + " needs a number, got " + tokens[i + 1])
+            elif tokens[i] == "infinite":
+                infinite = True
+            elif tokens[i] == "ponder":
+                self.pondering = True
+            elif tokens[i] == "perft" and i + 1 < len(tokens):
+                try:
+                    depth = int(tokens[i + 1])
+                except ValueError:
+                    self.send("info string perft needs a number, got " + tokens[i + 1])
+                    return
+                self.perft(depth)
+                return
+        
+        # A book move is played right away (not when asked to analyse or ponder)
+        if self.own_book and self.book is not None and not infinite and not self.pondering:
+            move = self.book.get_move(self.game_state)
+            if move is not None:
+                self.send("info string book move")
+                self.send("bestmove " + move.get_uci_notation())
+                return
+        
+        # While pondering we search without limits, the clock starts at ponderhit
+        if self.pondering:
+            self.ponder_limits = {key: value for key, value in limits.items() if key not in ("depth", "nodes")}
+            limits = {key: value for key, value in limits.items() if key in ("depth", "nodes")}
+        wait_for_stop = infinite or self.pondering
+        
+        self.release_bestmove.clear()
+        self.search_thread = threading.Thread(target=self.search, args=(limits, wait_for_stop), daemon=True)
+        self.search_thread.start()
+    
+    # Runs on the search thread
+    def search(self, limits, wait_for_stop):
+        best_move = self.engine.search(self.game_state, infinite=wait_for_stop, info_callback=self.send_info, **limits)
+        if wait_for_stop:
+            self.release_bestmove.wait()
+        if best_move is None:
+            self.send("bestmove 0000")
+        elif len(self.engine.pv) > 1:
+            self.send("bestmove " + best_move.get_uci_notation() + " ponder " + self.engine.pv[1].get_uci_notation())
+        else:
+            self.send("bestmove " + best_move.get_uci_notation())
+    
+    def send_info(self, info):
+        if info["mate"] is not None:
+            score = "mate " + str(info["mate"])
+        else:
+            score = "cp " + str(info["score"])
+        self.send("info depth {} score {} nodes {} nps {} time {} hashfull {} pv {}".format(
+            info["depth"], score, info["nodes"], info["nps"], info["time"],
+            self.engine.transposition_table.hashfull(), " ".join(move.get_uci_notation() for move in info["pv"])))
+    
+    # The opponent played the move we pondered on: the search goes on with the normal time limits
+    def ponder_hit(self):
+        if not self.pondering:
+            return
+        self.pondering = False
+        self.engine.set_time_limits(self.game_state.turn, **self.ponder_limits)
+        self.release_bestmove.set()
+    
+    # Stop the running search (if any) and wait until it printed its bestmove
+    def stop_search(self):
+        if self.search_thread is not None:
+            self.engine.stop()
+            self.release_bestmove.set()
+            self.search_thread.join()
+            self.search_thread = None
+        self.pondering = False
+    
+    def perft(self, depth):
+        result = self.game_state.perft_divide(depth)
+        for move in sorted(result):
+            self.send(move + ": " + str(result[move]))
+        self.send("")
+        self.send("Nodes searched: " + str(sum(result.values())))
+
+
+def main():
+    uci_engine().run()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+# Zobrist hashing: every (piece, square), the side to move, every castling state and every
+# en passant file get a random 64-bit number. The key of a position is the XOR of the numbers
+# of everything in it, so make_move can update it by XOR-ing only what the move changed.
+
+import random
+
+# Fixed seed: keys must be the same in every process (worker pools, shared hash tables)
+_generator = random.Random(20230521)
+
+
+def _random_key():
+    return _generator.getrandbits(64)
+
+
+PIECES = ["wp", "wN", "wB", "wR", "wQ", "wK", "bp", "bN", "bB", "bR", "bQ", "bK"]
+
+# PIECE_KEYS[piece][row * 8 + col]
+PIECE_KEYS = {piece: [_random_key() for _ in range(64)] for piece in PIECES}
+
+BLACK_TO_MOVE = _random_key()
+
+# One key for each castling right (white king side, white queen side, black king side,
+# black queen side). CASTLING_KEYS maps the 6 castling flags of game_state (in
+# get_castling_flags order) to the XOR of the rights that are left, so positions with the
+# same rights get the same key however the flags got there (same as FEN)
+_CASTLING_RIGHT_KEYS = [_random_key() for _ in range(4)]
+CASTLING_KEYS = {}
+for _mask in range(64):
+    _flags = tuple(bool(_mask >> i & 1) for i in range(6))
+    _rights = (not _flags[0] and not _flags[1], not _flags[0] and not _flags[2],
+               not _flags[3] and not _flags[4], not _flags[3] and not _flags[5])
+    _key = 0
+    for i in range(4):
+        if _rights[i]:
+            _key ^= _CASTLING_RIGHT_KEYS[i]
+    CASTLING_KEYS[_flags] = _key
+
+EN_PASSANT_KEYS = [_random_key() for _ in range(8)]
+
+
+# Key of the en passant state, only hashed when a pawn can really capture en passant,
+# otherwise the same position would get two keys (bad for repetition detection)
+def en_passant_key(board, en_passant):
+    if not en_passant[0]:
+        return 0
+    row, col = en_passant[2]
+    capturer = ("b" if board[row][col][0] == "w" else "w") + "p"
+    if (col > 0 and board[row][col - 1] == capturer) or (col < 7 and board[row][col + 1] == capturer):
+        return EN_PASSANT_KEYS[col]
+    return 0
+
+
+# Compute the key of a game_state from scratch
+def compute_key(game_state):
+    key = 0
+    for row in range(8):
+        for col in range(8):
+            piece = game_state.board[row][col]
+            if piece != "--":
+                key ^= PIECE_KEYS[piece][row * 8 + col]
+    if game_state.turn == "b":
+        key ^= BLACK_TO_MOVE
+    key ^= CASTLING_KEYS[game_state.get_castling_flags()]
+    key ^= en_passant_key(game_state.board, game_state.en_passant)
+    return key